@@ -23,13 +23,11 @@ const CreateComplaintModal = ({ show, handleClose, machineId, onSuccess }) => {
     useEffect(() => {
         const fetchCatalogs = async () => {
             try {
-                const [nodesRes, methodsRes] = await Promise.all([
-                    api.get('failure_nodes/'),
-                    api.get('recovery_methods/')
-                ]);
+                // Все справочники одним запросом (кэшируется браузером по ETag)
+                const response = await api.get('handbooks/');
 
-                const nodes = nodesRes.data.results || nodesRes.data;
-                const methods = methodsRes.data.results || methodsRes.data;
+                const nodes = response.data.failure_nodes;
+                const methods = response.data.recovery_methods;
 
                 setFailureNodes(nodes);
                 setRecoveryMethods(methods);
@@ -16,9 +16,9 @@ const CreateMaintenanceModal = ({ show, handleClose, machineId, onSuccess }) =>
         useEffect(() => {
         const fetchTypes = async () => {
             try {
-                const response = await api.get('service_types/');
+                const response = await api.get('handbooks/');
 
-                const types = response.data.results || response.data;
+                const types = response.data.service_types;
 
                 setServiceTypes(types);
 
@@ -12,7 +12,8 @@ const Dashboard = () => {
     // Пагинация и счетчик
     const [nextPage, setNextPage] = useState(null);
     const [prevPage, setPrevPage] = useState(null);
-    const [count, setCount] = useState(0);
+    // Оценка общего числа машин: сервер не считает COUNT(*) на каждую страницу
+    const [count, setCount] = useState(null);
 
     // Начальное состояние фильтров
     const initialFilters = {
@@ -41,7 +42,9 @@ const Dashboard = () => {
             const config = isFullUrl ? {} : {
                 params: {
                     ...paramsToSend,
-                    ordering: currentOrdering
+                    ordering: currentOrdering,
+                    pagination: 'nocount',
+                    count: 'estimate'
                 }
             };
 
@@ -50,7 +53,8 @@ const Dashboard = () => {
             setMachines(response.data.results);
             setNextPage(response.data.next);
             setPrevPage(response.data.previous);
-            setCount(response.data.count);
+            // Ссылки next/previous сохраняют параметры — оценка приходит и на следующих страницах
+            setCount(response.data.estimated_count);
 
         } catch (err) {
             console.error(err);
@@ -104,7 +108,7 @@ const Dashboard = () => {
     return (
         <Container>
             <div className="d-flex justify-content-between align-items-center mb-3">
-                <h2>Ваша техника (Всего: {count})</h2>
+                <h2>Ваша техника{count !== null && count !== undefined ? ` (Всего: ${count})` : ''}</h2>
             </div>
 
             <Form className="mb-4 p-3 bg-light border rounded" onSubmit={handleApplyFilters}>
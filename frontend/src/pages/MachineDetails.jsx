@@ -24,17 +24,13 @@ const MachineDetails = () => {
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const machineRes = await api.get(`machines/${id}/`);
-                setMachine(machineRes.data);
-                const serial = machineRes.data.serial_number;
+                // Машина вместе с полной историей ТО и рекламаций одним запросом
+                const response = await api.get(`machines/${id}/passport/`);
+                const { maintenances, complaints, ...machineData } = response.data;
 
-                const [toRes, claimsRes] = await Promise.all([
-                    api.get(`maintenances/?machine__serial_number=${serial}`),
-                    api.get(`complaints/?machine__serial_number=${serial}`)
-                ]);
-
-                setMaintenances(toRes.data.results || toRes.data);
-                setComplaints(claimsRes.data.results || claimsRes.data);
+                setMachine(machineData);
+                setMaintenances(maintenances);
+                setComplaints(complaints);
 
             } catch (err) {
                 console.error(err);
@@ -34,8 +34,14 @@ class MaintenanceAdmin(admin.ModelAdmin):
 # 4. Настройка Рекламации
 @admin.register(Complaint)
 class ComplaintAdmin(admin.ModelAdmin):
-    list_display = ('machine', 'failure_node', 'failure_date', 'restoration_date', 'downtime')
+    list_display = ('machine', 'failure_node', 'failure_date', 'restoration_date', 'downtime_days')
     list_filter = ('failure_node', 'service_company')
+    # machine__technique_model — для Machine.__str__
+    list_select_related = ('machine__technique_model', 'failure_node')
+
+    @admin.display(description='Время простоя, дней', ordering='downtime_days')
+    def downtime_days(self, obj):
+        return obj.downtime_days
 
 
 # 5. Регистрация справочников
@@ -0,0 +1,142 @@
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import Machine, Complaint, MachineReliability, FailureNodeReliability, User
+
+
+# -------------------------------------------------------------------------
+# 1. Поддержка сводок надежности
+# -------------------------------------------------------------------------
+#
+# Сводки пересчитываются целиком для затронутых машин: запросы идут только
+# по рекламациям этих машин (индекс по machine_id), а не по всей таблице.
+
+MACHINE_DIMENSIONS = ('technique_model_id', 'engine_model_id', 'client_id', 'service_company_id')
+
+
+def refresh_reliability(machine_ids):
+    """Пересчитывает сводки для указанных машин (после создания/изменения/удаления рекламаций)."""
+    machine_ids = set(machine_ids)
+    if not machine_ids:
+        return
+    machines = {
+        row['id']: row
+        for row in Machine.objects.filter(id__in=machine_ids).values('id', *MACHINE_DIMENSIONS)
+    }
+    complaints = Complaint.objects.filter(machine_id__in=machine_ids).order_by()
+
+    with transaction.atomic():
+        MachineReliability.objects.filter(machine_id__in=machine_ids).delete()
+        FailureNodeReliability.objects.filter(machine_id__in=machine_ids).delete()
+        _insert_summaries(machines, complaints)
+
+
+def rebuild_reliability(batch_size=1000):
+    """Полная пересборка сводок пачками по машинам. Возвращает число машин со сводкой."""
+    with transaction.atomic():
+        MachineReliability.objects.all().delete()
+        FailureNodeReliability.objects.all().delete()
+
+    total = 0
+    last_id = 0
+    while True:
+        machines = {
+            row['id']: row
+            for row in Machine.objects.filter(id__gt=last_id).order_by('id')
+            .values('id', *MACHINE_DIMENSIONS)[:batch_size]
+        }
+        if not machines:
+            return total
+        last_id = max(machines)
+        with transaction.atomic():
+            total += _insert_summaries(machines, Complaint.objects.filter(machine_id__in=machines).order_by())
+
+
+def _insert_summaries(machines, complaints):
+    per_machine = [
+        MachineReliability(
+            machine_id=row['machine_id'],
+            failures=row['failures'],
+            total_downtime=row['total_downtime'] or 0,
+            operating_hours=row['operating_hours'] or 0,
+            **_dimensions(machines[row['machine_id']], MACHINE_DIMENSIONS),
+        )
+        for row in complaints.values('machine_id').annotate(
+            failures=Count('id'), total_downtime=Sum('downtime'), operating_hours=Max('operating_hours')
+        )
+        if row['machine_id'] in machines
+    ]
+    per_node = [
+        FailureNodeReliability(
+            machine_id=row['machine_id'],
+            failure_node_id=row['failure_node_id'],
+            failures=row['failures'],
+            total_downtime=row['total_downtime'] or 0,
+            **_dimensions(machines[row['machine_id']], ('client_id', 'service_company_id')),
+        )
+        for row in complaints.values('machine_id', 'failure_node_id').annotate(
+            failures=Count('id'), total_downtime=Sum('downtime')
+        )
+        if row['machine_id'] in machines
+    ]
+    MachineReliability.objects.bulk_create(per_machine)
+    FailureNodeReliability.objects.bulk_create(per_node)
+    return len(per_machine)
+
+
+def _dimensions(machine, names):
+    return {name: machine[name] for name in names}
+
+
+# -------------------------------------------------------------------------
+# 2. Отчет
+# -------------------------------------------------------------------------
+
+GROUPINGS = ('failure_node', 'technique_model', 'engine_model', 'service_company')
+
+
+def scope_for(user):
+    """Фильтр сводок по роли — та же видимость, что и у ComplaintViewSet."""
+    if user.role == User.Role.MANAGER:
+        return {}
+    if user.role == User.Role.CLIENT:
+        return {'client': user}
+    if user.role == User.Role.SERVICE:
+        return {'service_company': user}
+    return None
+
+
+def reliability_report(user, group_by):
+    """
+    Показатели надежности в разрезе group_by.
+
+    - failures: число отказов;
+    - mean_downtime: средний простой на отказ, дней;
+    - mtbf: средняя наработка на отказ, м/час — суммарная наработка машин группы
+      (последнее показание в рекламациях) / число отказов. Для узлов отказа
+      наработка берется по всем машинам в зоне видимости пользователя.
+    """
+    scope = scope_for(user)
+    if scope is None:
+        return []
+
+    machines = MachineReliability.objects.filter(**scope)
+    if group_by == 'failure_node':
+        rows = FailureNodeReliability.objects.filter(**scope).values('failure_node_id').annotate(
+            machines=Count('machine_id'), failures=Sum('failures'), total_downtime=Sum('total_downtime')
+        )
+        exposure = machines.aggregate(hours=Sum('operating_hours'))['hours'] or 0
+        rows = [dict(row, id=row.pop('failure_node_id'), operating_hours=exposure) for row in rows]
+    else:
+        key = f'{group_by}_id'
+        rows = machines.values(key).annotate(
+            machines=Count('machine_id'), failures=Sum('failures'),
+            total_downtime=Sum('total_downtime'), operating_hours=Sum('operating_hours'),
+        )
+        rows = [dict(row, id=row.pop(key)) for row in rows]
+
+    for row in rows:
+        failures = row['failures'] or 0
+        row['mean_downtime'] = round(row['total_downtime'] / failures, 2) if failures else None
+        row['mtbf'] = round(row['operating_hours'] / failures, 1) if failures else None
+    return sorted(rows, key=lambda row: (-row['failures'], row['id']))
@@ -0,0 +1,151 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import guest_search_cache
+from .conditional import build_validators, etag_matches, is_not_modified, validator_headers
+from .models import Machine, ServiceType, FailureNode, RecoveryMethod
+from .pagination import HybridPagination
+from .renderers import dumps
+from .serializers import MachineShortSerializer
+from .views import GuestMachineSearchView
+
+
+# -------------------------------------------------------------------------
+# 1. Общие помощники
+# -------------------------------------------------------------------------
+#
+# Асинхронные версии самых частых чтений для запуска под ASGI (uvicorn).
+# Синхронные DRF-представления остаются: маршрут выбирается настройкой
+# ASYNC_READ_VIEWS (см. silantservice/urls.py). Ответы совпадают по содержимому.
+
+
+def json_response(data, status=200, headers=None):
+    # Тот же JSON, что у ORJSONRenderer синхронных представлений
+    return HttpResponse(dumps(data), status=status, headers=headers, content_type='application/json')
+
+
+def authenticate(request):
+    """
+    Аутентификация теми же классами, что и в DRF (токен из кэша, Basic, сессия).
+    Возвращает (пользователь, None) или (None, ответ 401).
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.AuthenticationFailed as exc:
+        return None, json_response({'detail': str(exc.detail)}, 401, {'WWW-Authenticate': 'Token'})
+    if not user.is_authenticated:
+        detail = str(exceptions.NotAuthenticated.default_detail)
+        return None, json_response({'detail': detail}, 401, {'WWW-Authenticate': 'Token'})
+    return user, None
+
+
+# -------------------------------------------------------------------------
+# 2. Поиск для гостя
+# -------------------------------------------------------------------------
+
+class AsyncGuestMachineSearchView(View):
+    """Асинхронный GuestMachineSearchView: тот же кэш, ETag и формат ответа."""
+    not_found_message = GuestMachineSearchView.not_found_message
+
+    async def get(self, request):
+        serial_number = request.GET.get('serial_number')
+        if not serial_number:
+            return json_response({"error": "Введите заводской номер"}, 400)
+
+        entry = await guest_search_cache.aget(serial_number)
+        if entry is not None:
+            if not entry['found']:
+                return json_response({'detail': self.not_found_message}, 404)
+            return self.found(request, entry, 'HIT')
+
+        try:
+            machine = await Machine.objects.select_related(
+                'technique_model', 'engine_model', 'transmission_model',
+                'drive_axle_model', 'steering_axle_model'
+            ).aget(serial_number=serial_number)
+        except Machine.DoesNotExist:
+            await guest_search_cache.aset_missing(serial_number)
+            return json_response({'detail': self.not_found_message}, 404)
+
+        # Связи уже загружены select_related — сериализация к БД не обращается
+        data = MachineShortSerializer(machine).data
+        entry = await guest_search_cache.aset(serial_number, data)
+        return self.found(request, entry, 'MISS')
+
+    def found(self, request, entry, cache_status):
+        headers = {'X-Cache': cache_status, 'ETag': entry['etag']}
+        if etag_matches(request, entry['etag']):
+            response = HttpResponseNotModified()
+            for name, value in headers.items():
+                response[name] = value
+            return response
+        return json_response(entry['data'], headers=headers)
+
+
+# -------------------------------------------------------------------------
+# 3. Справочники
+# -------------------------------------------------------------------------
+
+class AsyncHandbookView(View):
+    """
+    Асинхронные list/retrieve справочника (как ServiceTypeViewSet и др.):
+    страница — тем же HybridPagination (все режимы ?pagination= и ?count=, apaginate_queryset),
+    ETag по общей версии справочников.
+    """
+    model = None
+    fields = ('id', 'name', 'description')
+    pagination_class = HybridPagination
+    # Как у HandbookConditionalMixin: версия справочников одна для всех ролей
+    conditional_resource = 'handbooks'
+
+    def get_version_scope(self):
+        return 'all'
+
+    async def get(self, request, pk=None):
+        user, error = await sync_to_async(authenticate)(request)
+        if error is not None:
+            return error
+
+        headers = None
+        if settings.CONDITIONAL_GET:
+            etag, last_modified = await sync_to_async(build_validators)(
+                self.conditional_resource, self.get_version_scope(), 'json', request.get_full_path()
+            )
+            headers = validator_headers(etag, last_modified)
+            if is_not_modified(request, etag, last_modified):
+                response = HttpResponseNotModified()
+                for name, value in headers.items():
+                    response[name] = value
+                return response
+
+        queryset = self.model.objects.order_by('id').values(*self.fields)
+        if pk is not None:
+            try:
+                return json_response(await queryset.aget(pk=pk), headers=headers)
+            except self.model.DoesNotExist:
+                return json_response({'detail': f'No {self.model._meta.object_name} matches the given query.'}, 404)
+        # Строки страницы читает async-ORM (acount, async for); пагинатор только собирает ссылки и ответ
+        paginator = self.pagination_class()
+        try:
+            page = await paginator.apaginate_queryset(queryset, Request(request), view=self)
+        except exceptions.NotFound as exc:
+            return json_response({'detail': str(exc.detail)}, 404)
+        return json_response(paginator.get_paginated_response(page).data, headers=headers)
+
+
+class AsyncServiceTypeView(AsyncHandbookView):
+    model = ServiceType
+
+
+class AsyncFailureNodeView(AsyncHandbookView):
+    model = FailureNode
+
+
+class AsyncRecoveryMethodView(AsyncHandbookView):
+    model = RecoveryMethod
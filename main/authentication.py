@@ -0,0 +1,85 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, BasicAuthentication
+
+from .metrics import count_cache
+
+
+# -------------------------------------------------------------------------
+# 1. Токен с кэшем
+# -------------------------------------------------------------------------
+
+class TokenCache:
+    """
+    Кэш token -> (пользователь, токен) для CachedTokenAuthentication.
+
+    В ключе — sha256 токена, а не сам токен. Записи живут не дольше AUTH_TOKEN_CACHE_TTL
+    и сбрасываются сигналами (main/signals.py) при удалении токена и изменении
+    пользователя (деактивация, смена роли и т.д.).
+    """
+    prefix = 'auth_token'
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 5 * 60)
+
+    def _key(self, key):
+        return f'{self.prefix}:{hashlib.sha256(key.encode("utf-8")).hexdigest()}'
+
+    def get(self, key):
+        return cache.get(self._key(key))
+
+    def set(self, key, user, token):
+        if self.ttl:
+            cache.set(self._key(key), (user, token), self.ttl)
+
+    def invalidate(self, *keys):
+        cache.delete_many([self._key(key) for key in keys])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который берет пользователя (вместе с ролью) из кэша:
+    повторные запросы с тем же токеном не обращаются к БД.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        count_cache('auth_token', cached is not None)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+# -------------------------------------------------------------------------
+# 2. Basic-авторизация
+# -------------------------------------------------------------------------
+
+class ApiBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication, которую можно отключить для API (API_BASIC_AUTH=False):
+    проверка пароля — это хэширование на каждый запрос, поэтому клиенты API
+    должны получать токен через /api/auth/token/. Остальные адреса не затрагиваются.
+    """
+    api_prefix = '/api/'
+
+    def authenticate(self, request):
+        if not getattr(settings, 'API_BASIC_AUTH', True) and request.path.startswith(self.api_prefix):
+            if self.has_basic_header(request):
+                raise exceptions.AuthenticationFailed(
+                    'Basic-авторизация для API отключена, используйте токен (Authorization: Token ...)'
+                )
+            return None
+        return super().authenticate(request)
+
+    def has_basic_header(self, request):
+        auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+        return bool(auth) and auth[0].lower() == 'basic'
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import BaseCache
+
+
+# -------------------------------------------------------------------------
+# 1. Кэш публичного поиска машины по заводскому номеру
+# -------------------------------------------------------------------------
+
+class GuestSearchCache:
+    """
+    Кэш результата GuestMachineSearchView.
+
+    Хранит уже сериализованный MachineShortSerializer, а также "промахи" (404)
+    с коротким TTL, чтобы перебор несуществующих номеров не доходил до БД.
+
+    Ключи содержат номер поколения: изменение справочника меняет названия
+    во всех ответах сразу, поэтому вместо поиска затронутых ключей
+    поколение просто увеличивается.
+    """
+    prefix = 'guest_search'
+    missing_entry = {'found': False, 'data': None, 'etag': None}
+
+    def __init__(self, backend=cache):
+        self.backend = backend
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'GUEST_SEARCH_CACHE_TTL', 60 * 60)
+
+    @property
+    def miss_ttl(self):
+        return getattr(settings, 'GUEST_SEARCH_MISS_TTL', 60)
+
+    def _generation(self):
+        # Как и версия справочников: после потери ключа поколение не повторяет прежние
+        return self.backend.get_or_set(f'{self.prefix}:generation', time.time_ns, None)
+
+    def _key(self, serial_number):
+        digest = hashlib.md5(serial_number.encode('utf-8')).hexdigest()
+        return f'{self.prefix}:{self._generation()}:{digest}'
+
+    def get(self, serial_number):
+        """
+        Возвращает {'found': bool, 'data': dict | None, 'etag': str | None} или None, если в кэше пусто.
+        """
+        entry = self.backend.get(self._key(serial_number))
+        self._count('hits' if entry is not None else 'misses')
+        return entry
+
+    def set(self, serial_number, data):
+        entry = self._entry(data)
+        self.backend.set(self._key(serial_number), entry, self.ttl)
+        return entry
+
+    def set_missing(self, serial_number):
+        self.backend.set(self._key(serial_number), self.missing_entry, self.miss_ttl)
+
+    @staticmethod
+    def _entry(data):
+        data = dict(data)
+        content = json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return {'found': True, 'data': data, 'etag': '"%s"' % hashlib.md5(content).hexdigest()}
+
+    # Асинхронные get/set/set_missing для main/async_views.py.
+    # Встроенные бэкенды Django (LocMem, Redis) своего асинхронного API не имеют: их aget/aset —
+    # sync_to_async(thread_sensitive=True), то есть очередь в единственный поток async ORM.
+    # Такому бэкенду синхронные методы отдаются в общий пул потоков, а бэкенд с собственными
+    # aget/aset (переопределенными) вызывается напрямую.
+
+    @property
+    def native_async(self):
+        # Через __func__: default cache — прокси, метод берется у настоящего бэкенда
+        return getattr(self.backend.aget, '__func__', None) is not BaseCache.aget
+
+    async def aget(self, serial_number):
+        if not self.native_async:
+            return await sync_to_async(self.get, thread_sensitive=False)(serial_number)
+        entry = await self.backend.aget(await self._akey(serial_number))
+        await self._acount('hits' if entry is not None else 'misses')
+        return entry
+
+    async def aset(self, serial_number, data):
+        if not self.native_async:
+            return await sync_to_async(self.set, thread_sensitive=False)(serial_number, data)
+        entry = self._entry(data)
+        await self.backend.aset(await self._akey(serial_number), entry, self.ttl)
+        return entry
+
+    async def aset_missing(self, serial_number):
+        if not self.native_async:
+            return await sync_to_async(self.set_missing, thread_sensitive=False)(serial_number)
+        await self.backend.aset(await self._akey(serial_number), self.missing_entry, self.miss_ttl)
+
+    async def _akey(self, serial_number):
+        digest = hashlib.md5(serial_number.encode('utf-8')).hexdigest()
+        generation = await self.backend.aget_or_set(f'{self.prefix}:generation', time.time_ns, None)
+        return f'{self.prefix}:{generation}:{digest}'
+
+    async def _acount(self, name):
+        key = f'{self.prefix}:stats:{name}'
+        await self.backend.aadd(key, 0, None)
+        try:
+            await self.backend.aincr(key)
+        except ValueError:
+            pass
+
+    def invalidate(self, *serial_numbers):
+        self.backend.delete_many([self._key(serial) for serial in serial_numbers if serial])
+
+    def invalidate_all(self):
+        key = f'{self.prefix}:generation'
+        self.backend.add(key, time.time_ns(), None)
+        self.backend.incr(key)
+
+    def _count(self, name):
+        key = f'{self.prefix}:stats:{name}'
+        self.backend.add(key, 0, None)
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            # Ключ вытеснен между add и incr — счетчик потеряет одно значение
+            pass
+
+    def stats(self):
+        values = self.backend.get_many([f'{self.prefix}:stats:hits', f'{self.prefix}:stats:misses'])
+        hits = values.get(f'{self.prefix}:stats:hits', 0)
+        misses = values.get(f'{self.prefix}:stats:misses', 0)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+guest_search_cache = GuestSearchCache()
@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен — остается только gzip
+    brotli = None
+
+
+# -------------------------------------------------------------------------
+# 1. Выбор кодировки по Accept-Encoding
+# -------------------------------------------------------------------------
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/', 'application/javascript')
+
+
+def accepted_encodings(header):
+    """{кодировка: q} из Accept-Encoding."""
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        encodings[coding.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    """br или gzip (при равном q — br), None — без сжатия."""
+    encodings = accepted_encodings(header)
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = encodings.get(coding, encodings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+# -------------------------------------------------------------------------
+# 2. Middleware
+# -------------------------------------------------------------------------
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Сжатие ответов brotli или gzip (по Accept-Encoding) начиная с COMPRESSION_MIN_SIZE байт.
+
+    Как и GZipMiddleware Django: Vary: Accept-Encoding, сильный ETag становится слабым,
+    gzip добавляет случайные байты в заголовок (защита от BREACH), потоковые ответы
+    (выгрузки) сжимаются по частям. Сжатый ответ отдается, только если он короче.
+    """
+    max_random_bytes = 100
+
+    @property
+    def min_size(self):
+        return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+    @property
+    def brotli_quality(self):
+        # Для динамических ответов: 4 сжимает не хуже gzip -6 и быстрее старших уровней
+        return getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not self.is_compressible(response):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        # Асинхронные потоки сжимает только gzip — как GZipMiddleware
+        if response.streaming and response.is_async and encoding == 'br':
+            encoding = 'gzip'
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, response):
+        content_type = response.get('Content-Type', '')
+        return response.status_code not in (204, 304) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content, max_random_bytes=self.max_random_bytes)
+
+    def compress_stream(self, response, encoding):
+        if encoding == 'br':
+            return self.brotli_sequence(response.streaming_content)
+        if response.is_async:
+            return self.gzip_async(response.streaming_content)
+        return compress_sequence(response.streaming_content, max_random_bytes=self.max_random_bytes)
+
+    def brotli_sequence(self, sequence):
+        compressor = brotli.Compressor(quality=self.brotli_quality)
+        for chunk in sequence:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def gzip_async(self, sequence):
+        async for chunk in sequence:
+            yield compress_string(chunk, max_random_bytes=self.max_random_bytes)
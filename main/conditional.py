@@ -0,0 +1,207 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Machine, User
+
+
+# -------------------------------------------------------------------------
+# 1. Версии данных по областям видимости
+# -------------------------------------------------------------------------
+
+def version_scope(user):
+    """Область видимости пользователя: у всех пользователей одной области одинаковые списки."""
+    if user.role == User.Role.MANAGER:
+        return 'all'
+    if user.role == User.Role.CLIENT:
+        return f'client:{user.pk}'
+    if user.role == User.Role.SERVICE:
+        return f'service:{user.pk}'
+    return None
+
+
+class ChangeVersions:
+    """
+    Версии ресурсов (machine, maintenance, complaint, handbooks) в разрезе областей видимости.
+
+    Версия — момент последнего изменения в наносекундах: она же дает Last-Modified.
+    Хранится в общем кэше; если ключ пропал (вытеснение, перезапуск),
+    создается заново с текущим временем — это лишь лишний 200, но не устаревший 304.
+    Кроме того, есть общая версия: ее увеличение (справочники, пользователи,
+    массовый импорт) сбрасывает все ETag сразу.
+
+    Изменения через QuerySet.update() сигналов не отправляют — после них нужно
+    вызвать bump_machines() или bump_all() вручную.
+
+    Версии сбрасывает тот процесс, который изменил данные, поэтому условные GET
+    включаются (CONDITIONAL_GET) только при общем кэше: с LocMemCache изменения
+    из другого воркера или команды (import_machines, generate_fleet) не сбросили бы ETag.
+    Методы bump* возвращают сброшенные ключи — их можно обновить еще раз через touch().
+    """
+    prefix = 'versions'
+    resources = ('machine', 'maintenance', 'complaint')
+
+    @property
+    def ttl(self):
+        # Ограниченный срок жизни — страховка для не общего кэша (LocMemCache в нескольких процессах)
+        return getattr(settings, 'CONDITIONAL_VERSION_TTL', 60 * 60)
+
+    def _key(self, resource, scope):
+        return f'{self.prefix}:{resource}:{scope}'
+
+    def get(self, resource, scope):
+        """Пара (версия ресурса в области, общая версия)."""
+        keys = [self._key(resource, scope), self._key('*', '*')]
+        values = cache.get_many(keys)
+        missing = {key: time.time_ns() for key in keys if key not in values}
+        if missing:
+            cache.set_many(missing, self.ttl)
+            values.update(missing)
+        return values[keys[0]], values[keys[1]]
+
+    def bump(self, resource, scopes):
+        return self.touch([self._key(resource, scope) for scope in scopes])
+
+    def bump_all(self):
+        return self.touch([self._key('*', '*')])
+
+    def touch(self, keys):
+        """Новая версия (текущее время) для уже известных ключей — без запросов к БД."""
+        now = time.time_ns()
+        cache.set_many({key: now for key in keys}, self.ttl)
+        return keys
+
+    def bump_machines(self, machine_ids, resources=None, owners=()):
+        """
+        Изменились данные, привязанные к машинам: сбрасываем версии менеджеров
+        и владельцев машин (клиент, сервисная организация).
+        owners — дополнительные пары (client_id, service_company_id), например прежние.
+        """
+        machine_ids = {pk for pk in machine_ids if pk is not None}
+        owners = set(owners)
+        if machine_ids:
+            owners.update(Machine.objects.filter(pk__in=machine_ids).values_list('client_id', 'service_company_id'))
+        scopes = {'all'}
+        for client_id, service_id in owners:
+            scopes.update((f'client:{client_id}', f'service:{service_id}'))
+        return self.touch([self._key(resource, scope) for resource in resources or self.resources for scope in scopes])
+
+
+change_versions = ChangeVersions()
+
+
+def bump_after_commit(func, *args, **kwargs):
+    """
+    Как и реестр справочников: сразу и после коммита, чтобы ETag, выданный
+    по незакоммиченному состоянию, не пережил коммит. После коммита ключи,
+    выбранные первым вызовом, только получают новую версию — без запросов к БД.
+    """
+    keys = func(*args, **kwargs)
+    transaction.on_commit(lambda: change_versions.touch(keys))
+
+
+# -------------------------------------------------------------------------
+# 2. Условные GET-запросы
+# -------------------------------------------------------------------------
+
+def build_validators(resource, scope, renderer_format, full_path):
+    """ETag и Last-Modified (секунды) для ответа ресурса в области видимости."""
+    version, generation = change_versions.get(resource, scope)
+    source = ':'.join(str(part) for part in (resource, scope, version, generation, renderer_format, full_path))
+    return 'W/"%s"' % hashlib.md5(source.encode('utf-8')).hexdigest(), max(version, generation) / 1e9
+
+
+def etag_matches(request, etag):
+    """Слабое сравнение If-None-Match (W/ и сжатие на ответ не влияют)."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+
+def not_modified_since(request, last_modified):
+    # Версия должна быть строго старше заголовка: на равной секунде могла быть еще одна запись
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and last_modified < since
+
+
+def is_not_modified(request, etag, last_modified):
+    # ETag точнее: If-Modified-Since проверяется, только если нет If-None-Match (RFC 9110)
+    if 'HTTP_IF_NONE_MATCH' in request.META:
+        return etag_matches(request, etag)
+    return not_modified_since(request, last_modified)
+
+
+def last_modified_header(last_modified):
+    """
+    Last-Modified с точностью HTTP-даты: время изменения, округленное вверх до секунды.
+    Пока эта секунда не прошла, заголовок не отдается: запись в ту же секунду оказалась бы
+    старше выданного Last-Modified, и If-Modified-Since вернул бы 304 на измененные данные.
+    """
+    seconds = math.ceil(last_modified)
+    return http_date(seconds) if time.time() >= seconds else None
+
+
+def validator_headers(etag, last_modified):
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    header = last_modified_header(last_modified)
+    if header is not None:
+        headers['Last-Modified'] = header
+    return headers
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified для list и retrieve.
+
+    Работает при CONDITIONAL_GET (по умолчанию — только с общим кэшем, см. ChangeVersions).
+    ETag строится из версии ресурса в области видимости пользователя (ChangeVersions),
+    адреса запроса и формата ответа, поэтому 304 отдается после проверки прав,
+    но без основного запроса к БД и без сериализации.
+    Карточка использует версию всей области: любое изменение в ней сбрасывает и карточки.
+    """
+    conditional_resource = None
+    conditional_actions = ('list', 'retrieve')
+
+    def get_version_scope(self):
+        return version_scope(self.request.user)
+
+    def get_validators(self, request):
+        scope = self.get_version_scope()
+        if scope is None:
+            return None, None
+        renderer = getattr(request, 'accepted_renderer', None)
+        return build_validators(
+            self.conditional_resource, scope, getattr(renderer, 'format', ''), request.get_full_path()
+        )
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        if not settings.CONDITIONAL_GET or self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        if etag is None:
+            return handler(request, *args, **kwargs)
+
+        headers = validator_headers(etag, last_modified)
+        if is_not_modified(request, etag, last_modified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for name, value in headers.items():
+                response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,29 @@
+from django.db import connections
+
+
+# -------------------------------------------------------------------------
+# 1. Состояние соединений с БД
+# -------------------------------------------------------------------------
+
+def connection_stats(alias='default'):
+    """
+    Настройки соединений и метрики пула psycopg текущего процесса (у каждого воркера свой пул).
+
+    pool — None без пула, иначе статистика psycopg_pool: размер, свободные соединения,
+    ожидающие запросы, время ожидания и т.д. (см. ConnectionPool.get_stats()).
+    """
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    stats = {
+        'alias': alias,
+        'vendor': connection.vendor,
+        'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+        'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+        'server_side_cursors': not settings_dict.get('DISABLE_SERVER_SIDE_CURSORS', False),
+        'pool': None,
+    }
+    # Пул есть только у PostgreSQL с OPTIONS['pool'] (Django 5.1+)
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        stats['pool'] = pool.get_stats()
+    return stats
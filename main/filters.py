@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
+
+from .handbooks import handbook_registry
+from .models import Machine, Complaint, MaintenanceForecast
+
+
+# -------------------------------------------------------------------------
+# 1. Фильтры по названию справочника без JOIN
+# -------------------------------------------------------------------------
+
+class HandbookNameFilter(filters.CharFilter):
+    """
+    Фильтр вида technique_model__name=... / technique_model__name__icontains=...
+
+    Название переводится в список id через реестр справочников,
+    а в SQL уходит условие по внешнему ключу (technique_model_id IN (...)).
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        related_model = self.model._meta.get_field(self.field_name).related_model
+        ids = handbook_registry.ids_matching(related_model, value, self.lookup_expr)
+        if not ids:
+            return qs.none()
+        return qs.filter(**{f'{self.field_name}__in': ids})
+
+
+class MachineFilter(filters.FilterSet):
+    technique_model__name = HandbookNameFilter(field_name='technique_model', lookup_expr='exact')
+    technique_model__name__icontains = HandbookNameFilter(field_name='technique_model', lookup_expr='icontains')
+    engine_model__name = HandbookNameFilter(field_name='engine_model', lookup_expr='exact')
+    engine_model__name__icontains = HandbookNameFilter(field_name='engine_model', lookup_expr='icontains')
+    transmission_model__name = HandbookNameFilter(field_name='transmission_model', lookup_expr='exact')
+    transmission_model__name__icontains = HandbookNameFilter(field_name='transmission_model',
+                                                             lookup_expr='icontains')
+    drive_axle_model__name = HandbookNameFilter(field_name='drive_axle_model', lookup_expr='exact')
+    drive_axle_model__name__icontains = HandbookNameFilter(field_name='drive_axle_model', lookup_expr='icontains')
+    steering_axle_model__name = HandbookNameFilter(field_name='steering_axle_model', lookup_expr='exact')
+    steering_axle_model__name__icontains = HandbookNameFilter(field_name='steering_axle_model',
+                                                              lookup_expr='icontains')
+
+    class Meta:
+        model = Machine
+        fields = []
+
+
+class ComplaintFilter(filters.FilterSet):
+    # ?downtime_min=&downtime_max= — по аннотации downtime (дни простоя)
+    downtime = filters.RangeFilter()
+
+    class Meta:
+        model = Complaint
+        fields = ['failure_node', 'recovery_method', 'service_company']
+
+
+class MaintenanceForecastFilter(filters.FilterSet):
+    service_type__name = HandbookNameFilter(field_name='service_type', lookup_expr='exact')
+    # ?due_date_after=&due_date_before=
+    due_date = filters.DateFromToRangeFilter()
+    # ?overdue=true — срок прошел, ?due_within=30 — срок в ближайшие 30 дней (включая просроченные)
+    overdue = filters.BooleanFilter(method='filter_overdue')
+    due_within = filters.NumberFilter(method='filter_due_within', min_value=0)
+
+    class Meta:
+        model = MaintenanceForecast
+        fields = ['service_type', 'machine__serial_number']
+
+    def filter_overdue(self, qs, name, value):
+        if value:
+            return qs.filter(due_date__lt=date.today())
+        return qs.filter(due_date__gte=date.today())
+
+    def filter_due_within(self, qs, name, value):
+        return qs.filter(due_date__lte=date.today() + timedelta(days=int(value)))
@@ -0,0 +1,267 @@
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Machine, Maintenance, Complaint, ServiceType, MaintenanceForecast
+
+
+# -------------------------------------------------------------------------
+# 1. Колонки из БД
+# -------------------------------------------------------------------------
+#
+# Прогноз считается по колонкам (values_list -> массивы NumPy), без объектов моделей:
+# весь парк — это три запроса и несколько векторных операций.
+
+EPOCH = date(1970, 1, 1)
+
+
+def _columns(queryset, *fields):
+    """Колонки запроса как массивы int64; даты — в днях от 1970-01-01."""
+    rows = list(queryset.values_list(*fields))
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    return [
+        np.array(column, dtype='datetime64[D]').astype(np.int64) if field.endswith('_date')
+        else np.array(column, dtype=np.int64)
+        for field, column in zip(fields, columns)
+    ]
+
+
+def load_columns(machine_ids=None):
+    """Машины и показания счетчика (ТО и рекламации) — всего парка или указанных машин."""
+    machines = Machine.objects.order_by('id')
+    maintenances = Maintenance.objects.order_by()
+    complaints = Complaint.objects.order_by()
+    if machine_ids is not None:
+        machines = machines.filter(id__in=machine_ids)
+        maintenances = maintenances.filter(machine_id__in=machine_ids)
+        complaints = complaints.filter(machine_id__in=machine_ids)
+    return {
+        'machines': _columns(machines, 'id', 'shipment_date', 'client_id', 'service_company_id'),
+        'maintenances': _columns(maintenances, 'machine_id', 'event_date', 'operating_hours', 'service_type_id'),
+        'complaints': _columns(complaints, 'machine_id', 'failure_date', 'operating_hours'),
+    }
+
+
+# -------------------------------------------------------------------------
+# 2. Расчет
+# -------------------------------------------------------------------------
+
+# Срок дальше 100 лет от последнего показания не имеет смысла (и не помещается в date)
+MAX_OFFSET_DAYS = 36500
+
+
+def _machine_index(machine_ids, ids):
+    """Позиция каждой записи в отсортированном массиве машин и маска записей, машина которых загружена."""
+    if not len(machine_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    index = np.minimum(np.searchsorted(machine_ids, ids), len(machine_ids) - 1)
+    return index, machine_ids[index] == ids
+
+
+def _readings(columns):
+    """
+    Показания (индекс машины, день, м/час) всех машин. Первое показание каждой машины —
+    отгрузка с завода с нулевой наработкой, поэтому у любой машины есть хотя бы одна точка.
+    """
+    machine_ids, shipment = columns['machines'][:2]
+    maintenance_machine, maintenance_day, maintenance_hours, _ = columns['maintenances']
+    complaint_machine, complaint_day, complaint_hours = columns['complaints']
+
+    ids = np.concatenate([machine_ids, maintenance_machine, complaint_machine])
+    day = np.concatenate([shipment, maintenance_day, complaint_day])
+    hours = np.concatenate([np.zeros(len(machine_ids), dtype=np.int64), maintenance_hours, complaint_hours])
+    index, known = _machine_index(machine_ids, ids)
+    return index[known], day[known], hours[known]
+
+
+def hours_per_day(index, day, hours, shipment):
+    """
+    Наработка в сутки каждой машины — наклон прямой МНК по ее показаниям
+    (суммы по группам через bincount). NaN — если оценить нельзя (одна дата, наработка не растет).
+    """
+    n = len(shipment)
+    x = (day - shipment[index]).astype(np.float64)
+    y = hours.astype(np.float64)
+    count = np.bincount(index, minlength=n)
+    sum_x = np.bincount(index, x, minlength=n)
+    sum_y = np.bincount(index, y, minlength=n)
+    sum_xx = np.bincount(index, x * x, minlength=n)
+    sum_xy = np.bincount(index, x * y, minlength=n)
+    denominator = count * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count * sum_xy - sum_x * sum_y) / denominator
+    return np.where((denominator > 0) & (slope > 0), slope, np.nan), count - 1
+
+
+def _last_in_groups(keys, *sort_keys):
+    """Позиции последней записи каждой группы keys (по возрастанию sort_keys) и ключи групп."""
+    order = np.lexsort(tuple(reversed(sort_keys)) + (keys,))
+    sorted_keys = keys[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = sorted_keys[1:] != sorted_keys[:-1]
+    return order[last], sorted_keys[last]
+
+
+def infer_intervals(machine_ids, service_type_ids, hours):
+    """Медиана прироста наработки между соседними ТО одного вида на одной машине — по виду ТО."""
+    order = np.lexsort((hours, machine_ids, service_type_ids))
+    types, machines, hours = service_type_ids[order], machine_ids[order], hours[order]
+    same = (types[1:] == types[:-1]) & (machines[1:] == machines[:-1])
+    gaps = np.diff(hours)[same]
+    gap_types = types[1:][same]
+    positive = gaps > 0
+    gaps, gap_types = gaps[positive], gap_types[positive]
+    if not len(gaps):
+        return {}
+    # gap_types уже упорядочены: делим на группы по виду ТО
+    unique_types, starts = np.unique(gap_types, return_index=True)
+    return {
+        int(service_type): int(round(float(np.median(group))))
+        for service_type, group in zip(unique_types, np.split(gaps, starts[1:]))
+    }
+
+
+def compute_parameters(columns):
+    """
+    Параметры парка для прогноза:
+    - intervals: периодичность по видам ТО (заданная в справочнике или выведенная из истории);
+    - hours_per_day: медианная наработка в сутки — для машин, у которых своей оценки нет.
+    """
+    maintenance_machine, _, maintenance_hours, maintenance_type = columns['maintenances']
+    inferred = infer_intervals(maintenance_machine, maintenance_type, maintenance_hours)
+    intervals = {}
+    for service_type, interval in ServiceType.objects.values_list('id', 'interval_hours'):
+        interval = interval or inferred.get(service_type)
+        if interval:
+            intervals[service_type] = interval
+
+    index, day, hours = _readings(columns)
+    rates, _ = hours_per_day(index, day, hours, columns['machines'][1])
+    rates = rates[~np.isnan(rates)]
+    rate = float(np.median(rates)) if len(rates) else settings.FORECAST_DEFAULT_HOURS_PER_DAY
+    return {'intervals': intervals, 'hours_per_day': rate}
+
+
+def build_forecasts(columns, parameters):
+    """Прогнозы MaintenanceForecast (еще не сохраненные) для всех пар машина x вид ТО с периодичностью."""
+    machine_ids, shipment, clients, services = columns['machines']
+    intervals = parameters['intervals']
+    if not len(machine_ids) or not intervals:
+        return []
+    n = len(machine_ids)
+    types = np.array(sorted(intervals), dtype=np.int64)
+    interval = np.array([intervals[service_type] for service_type in types.tolist()], dtype=np.int64)
+
+    # Наработка в сутки и последнее показание каждой машины
+    index, day, hours = _readings(columns)
+    rates, readings = hours_per_day(index, day, hours, shipment)
+    rates = np.where(np.isnan(rates), parameters['hours_per_day'], rates)
+    last, _ = _last_in_groups(index, day, hours)
+    last_day, last_hours = day[last], hours[last]
+
+    # Последнее ТО каждого вида: ключ группы — (машина, вид ТО) в сетке n x T
+    maintenance_machine, maintenance_day, maintenance_hours, maintenance_type = columns['maintenances']
+    machine_index, known = _machine_index(machine_ids, maintenance_machine)
+    type_index = np.minimum(np.searchsorted(types, maintenance_type), len(types) - 1)
+    known &= types[type_index] == maintenance_type
+    service_day = np.full(n * len(types), -1, dtype=np.int64)
+    service_hours = np.full(n * len(types), -1, dtype=np.int64)
+    if known.any():
+        keys = machine_index[known] * len(types) + type_index[known]
+        positions, groups = _last_in_groups(keys, maintenance_day[known], maintenance_hours[known])
+        service_day[groups] = maintenance_day[known][positions]
+        service_hours[groups] = maintenance_hours[known][positions]
+    service_day = service_day.reshape(n, len(types))
+    service_hours = service_hours.reshape(n, len(types))
+
+    # Следующее ТО: через интервал после последнего такого ТО (если его не было — на отметке интервала);
+    # дата — от последнего показания с наработкой в сутки
+    due_hours = np.where(service_hours >= 0, service_hours + interval, interval)
+    remaining = due_hours - last_hours[:, None]
+    offset = np.clip(np.ceil(remaining / rates[:, None]), -MAX_OFFSET_DAYS, MAX_OFFSET_DAYS).astype(np.int64)
+    due_day = last_day[:, None] + offset
+
+    forecasts = []
+    rows = zip(machine_ids.tolist(), clients.tolist(), services.tolist(), np.round(rates, 2).tolist(),
+               readings.tolist(), last_day.tolist(), last_hours.tolist(),
+               service_day.tolist(), service_hours.tolist(), due_hours.tolist(), due_day.tolist())
+    for machine, client, service, rate, count, reading_day, reading_hours, *grid in rows:
+        for service_type, period, last_service_day, last_service_hours, due, due_at in zip(
+                types.tolist(), interval.tolist(), *grid):
+            forecasts.append(MaintenanceForecast(
+                machine_id=machine, service_type_id=service_type, client_id=client, service_company_id=service,
+                hours_per_day=rate, readings=count,
+                last_reading_date=_date(reading_day), last_reading_hours=reading_hours,
+                last_service_date=_date(last_service_day) if last_service_hours >= 0 else None,
+                last_service_hours=last_service_hours if last_service_hours >= 0 else None,
+                interval_hours=period, due_hours=due, due_date=_date(due_at),
+            ))
+    return forecasts
+
+
+def _date(days):
+    return EPOCH + timedelta(days=days)
+
+
+# -------------------------------------------------------------------------
+# 3. Поддержка таблицы прогнозов
+# -------------------------------------------------------------------------
+
+PARAMETERS_KEY = 'forecast:parameters'
+
+
+def fleet_parameters():
+    """
+    Параметры парка для пересчета отдельных машин. Считает их только полная пересборка
+    (rebuild_forecasts), в запросе весь парк не читается. Если в кэше их нет — до следующей
+    пересборки периодичность берется только из справочника, наработка в сутки — по умолчанию.
+    """
+    parameters = cache.get(PARAMETERS_KEY)
+    if parameters is None:
+        parameters = default_parameters()
+    return parameters
+
+
+def default_parameters():
+    intervals = {
+        service_type: interval
+        for service_type, interval in ServiceType.objects.values_list('id', 'interval_hours') if interval
+    }
+    return {'intervals': intervals, 'hours_per_day': settings.FORECAST_DEFAULT_HOURS_PER_DAY}
+
+
+def refresh_forecasts(machine_ids):
+    """Пересчитывает прогнозы указанных машин (после ТО, рекламаций, изменения машины)."""
+    machine_ids = set(machine_ids)
+    if not machine_ids:
+        return
+    forecasts = build_forecasts(load_columns(machine_ids), fleet_parameters())
+    with transaction.atomic():
+        MaintenanceForecast.objects.filter(machine_id__in=machine_ids).delete()
+        MaintenanceForecast.objects.bulk_create(forecasts)
+
+
+def refresh_after_commit(machine_ids):
+    """
+    Пересчет после коммита: прогноз читает уже записанные показания, а при удалении машины
+    каскадом (ТО и рекламации удаляются раньше нее) не вставляет прогнозы удаляемой машины.
+    """
+    machine_ids = set(machine_ids) - {None}
+    if machine_ids:
+        transaction.on_commit(lambda: refresh_forecasts(machine_ids))
+
+
+def rebuild_forecasts(batch_size=1000):
+    """Полная пересборка одним расчетом по всему парку. Возвращает число прогнозов."""
+    columns = load_columns()
+    parameters = compute_parameters(columns)
+    forecasts = build_forecasts(columns, parameters)
+    with transaction.atomic():
+        MaintenanceForecast.objects.all().delete()
+        MaintenanceForecast.objects.bulk_create(forecasts, batch_size=batch_size)
+    # Без срока: параметры живут до следующей пересборки
+    cache.set(PARAMETERS_KEY, parameters, None)
+    return len(forecasts)
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+
+from .models import (
+    TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel,
+    SteeringAxleModel, ServiceType, FailureNode, RecoveryMethod
+)
+
+
+# Все справочники (ключ совпадает с именем в объединенном ответе /api/handbooks/)
+HANDBOOKS = OrderedDict([
+    ('technique_models', TechniqueModel),
+    ('engine_models', EngineModel),
+    ('transmission_models', TransmissionModel),
+    ('drive_axle_models', DriveAxleModel),
+    ('steering_axle_models', SteeringAxleModel),
+    ('service_types', ServiceType),
+    ('failure_nodes', FailureNode),
+    ('recovery_methods', RecoveryMethod),
+])
+
+
+# -------------------------------------------------------------------------
+# 1. Реестр справочников в памяти процесса
+# -------------------------------------------------------------------------
+
+class HandbookRegistry:
+    """
+    Снимок всех справочников (id <-> название) в памяти процесса.
+
+    Версия хранится в общем кэше и увеличивается при любом изменении справочника,
+    после чего каждый процесс перечитывает снимок при следующем обращении.
+    Если кэш не общий (LocMemCache), снимок дополнительно живет не дольше
+    HANDBOOK_REGISTRY_TTL секунд.
+    """
+    version_key = 'handbooks:version'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._loaded_at = 0.0
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'HANDBOOK_REGISTRY_TTL', 60)
+
+    def invalidate(self):
+        cache.add(self.version_key, time.time_ns(), None)
+        cache.incr(self.version_key)
+
+    def snapshot(self):
+        # Начальная версия — текущее время: если ключ пропал из кэша (очистка, перезапуск Redis),
+        # новая версия не совпадет со снимком, загруженным при прежней
+        version = cache.get_or_set(self.version_key, time.time_ns, None)
+        snapshot = self._snapshot
+        if snapshot is None or self._version != version or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                snapshot = self._load()
+                self._snapshot, self._version, self._loaded_at = snapshot, version, time.monotonic()
+        return snapshot
+
+    def _load(self):
+        rows = OrderedDict()
+        by_name = {}
+        by_id = {}
+        for key, model in HANDBOOKS.items():
+            items = list(model.objects.order_by('id').values('id', 'name', 'description'))
+            rows[key] = items
+            by_id[model] = {item['id']: item for item in items}
+            names = by_name[model] = {}
+            for item in items:
+                names.setdefault(item['name'], []).append(item['id'])
+        content = json.dumps(rows, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return {
+            'rows': rows,
+            'by_name': by_name,
+            'by_id': by_id,
+            'etag': '"%s"' % hashlib.md5(content).hexdigest(),
+        }
+
+    # ---------------------------------------------------------------------
+    # Поиск
+    # ---------------------------------------------------------------------
+
+    def name_for(self, model, pk):
+        item = self.snapshot()['by_id'][model].get(pk)
+        return item['name'] if item else None
+
+    def ids_for_name(self, model, name):
+        return self.snapshot()['by_name'][model].get(name, [])
+
+    def ids_matching(self, model, value, lookup='exact'):
+        """
+        Список id записей справочника, подходящих под фильтр по названию.
+        Поддерживаются lookup 'exact' и 'icontains'.
+        """
+        if lookup == 'exact':
+            return list(self.ids_for_name(model, value))
+        if lookup == 'icontains':
+            needle = value.casefold()
+            return [
+                pk
+                for name, ids in self.snapshot()['by_name'][model].items()
+                if needle in name.casefold()
+                for pk in ids
+            ]
+        raise ValueError(f'Неподдерживаемый lookup: {lookup}')
+
+    def get_instance(self, model, name):
+        """
+        Экземпляр справочника по названию без запроса к БД.
+        Бросает ObjectDoesNotExist / MultipleObjectsReturned, как и queryset.get().
+        """
+        snapshot = self.snapshot()
+        ids = snapshot['by_name'][model].get(name, [])
+        if not ids:
+            raise ObjectDoesNotExist(name)
+        if len(ids) > 1:
+            raise MultipleObjectsReturned(name)
+        instance = model(**snapshot['by_id'][model][ids[0]])
+        instance._state.adding = False
+        instance._state.db = model.objects.db
+        return instance
+
+    # ---------------------------------------------------------------------
+    # Объединенный ответ
+    # ---------------------------------------------------------------------
+
+    def bundle(self):
+        return self.snapshot()['rows']
+
+    def etag(self):
+        return self.snapshot()['etag']
+
+
+handbook_registry = HandbookRegistry()
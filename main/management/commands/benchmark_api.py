@@ -0,0 +1,279 @@
+import json
+import re
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from main.management.commands.benchmark_read_endpoints import Command as HttpBenchmark
+from main.models import User, Machine, Maintenance, Complaint
+from silantservice.urls import router
+
+
+ROLES = {
+    'manager': User.Role.MANAGER,
+    'client': User.Role.CLIENT,
+    'service': User.Role.SERVICE,
+}
+# Параметры действий, без которых они отвечают 400
+ACTION_PARAMS = {
+    'search': {'q': '000'},
+}
+# Поля, которые должны отличаться у новой записи
+UNIQUE_FIELDS = {
+    'machine': ('serial_number',),
+    'maintenance': ('order_number',),
+}
+
+
+class QueryCounter:
+    """connection.execute_wrapper: число запросов к БД без DEBUG-журнала CaptureQueriesContext."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный набор по всем действиям API для каждой роли (in-process, без сети): '
+        'запросов в секунду, p50/p99 и число запросов к БД. Отчет JSON содержит коммит и размер '
+        'данных, --baseline сравнивает с прошлым отчетом. Данные — generate_fleet.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30, help='Замеров на сценарий')
+        parser.add_argument('--warmup', type=int, default=2, help='Прогревочных запросов на сценарий')
+        parser.add_argument('--roles', default='guest,manager,client,service')
+        parser.add_argument('--only', default=None, help='Регулярное выражение по имени сценария')
+        parser.add_argument('--writes', action='store_true',
+                            help='Также create/update/destroy/bulk (каждый запрос откатывается)')
+        parser.add_argument('--user', action='append', default=[],
+                            help='роль=логин, например client=syn_client_1 (по умолчанию — владелец данных)')
+        parser.add_argument('--json', dest='json_path', default=None, help='Сохранить отчет в JSON')
+        parser.add_argument('--baseline', default=None, help='Прошлый отчет для сравнения')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests должен быть положительным')
+        if not Machine.objects.exists():
+            raise CommandError('В БД нет машин: сначала запустите generate_fleet')
+        only = re.compile(options['only']) if options['only'] else None
+        usernames = dict(value.partition('=')[::2] for value in options['user'])
+
+        results = []
+        for role in options['roles'].split(','):
+            client = self.client_for(role, usernames.get(role))
+            for scenario in self.scenarios(role, client, options['writes']):
+                if only and not only.search(scenario['name']):
+                    continue
+                row = self.run(client, scenario, options['warmup'], options['requests'])
+                row.update(role=role, scenario=scenario['name'])
+                results.append(row)
+                self.stdout.write(
+                    f'{role:<8} {scenario["name"]:<30} {row["status"]:<4} {row["rps"]:>8.0f} rps  '
+                    f'p50 {row["p50_ms"]:>7.1f} ms  p99 {row["p99_ms"]:>7.1f} ms  запросов к БД {row["queries"]}'
+                )
+
+        report = {'meta': self.meta(options['requests']), 'results': results}
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.compare(options['baseline'], results)
+
+    # ---------------------------------------------------------------------
+    # Пользователи и сценарии
+    # ---------------------------------------------------------------------
+
+    def client_for(self, role, username):
+        client = Client(HTTP_HOST='localhost')
+        if role == 'guest':
+            return client
+        if role not in ROLES:
+            raise CommandError(f'Неизвестная роль "{role}", ожидается guest или {", ".join(ROLES)}')
+        users = User.objects.filter(role=ROLES[role])
+        if username:
+            users = users.filter(username=username)
+        elif role == 'client':
+            users = users.filter(client_machines__isnull=False)
+        elif role == 'service':
+            users = users.filter(service_machines__isnull=False)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError(f'Нет пользователя для роли {role}')
+        token, _ = Token.objects.get_or_create(user=user)
+        client.defaults['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        return client
+
+    def scenarios(self, role, client, writes):
+        """Сценарии: каждый маршрут роутера (list, retrieve, дополнительные действия) и отдельные представления."""
+        machine = Machine.objects.order_by('id').only('serial_number').first()
+        scenarios = [{
+            'name': 'guest_search', 'method': 'get', 'path': reverse('guest_search'),
+            'data': {'serial_number': machine.serial_number},
+        }]
+        if role == 'guest':
+            return scenarios
+
+        scenarios += [
+            {'name': 'handbooks', 'method': 'get', 'path': reverse('handbooks')},
+            {'name': 'reliability', 'method': 'get', 'path': reverse('reliability')},
+        ]
+        for _, viewset, basename in router.registry:
+            list_path = reverse(f'{basename}-list')
+            scenarios += [
+                {'name': f'{basename}.list', 'method': 'get', 'path': list_path},
+                {'name': f'{basename}.list_cursor', 'method': 'get', 'path': list_path,
+                 'data': {'pagination': 'cursor'}},
+            ]
+            # Первая видимая роли запись
+            listing = client.get(list_path, {'pagination': 'cursor', 'page_size': 1})
+            rows = listing.json()['results'] if listing.status_code == 200 else []
+            pk = rows[0]['id'] if rows else None
+            if pk is not None:
+                scenarios.append({'name': f'{basename}.retrieve', 'method': 'get',
+                                  'path': reverse(f'{basename}-detail', args=[pk])})
+
+            for extra in viewset.get_extra_actions():
+                if 'get' not in extra.mapping:
+                    continue
+                name = f'{basename}-{extra.url_name}'
+                if extra.detail:
+                    if pk is None:
+                        continue
+                    path = reverse(name, args=[pk])
+                else:
+                    path = reverse(name)
+                scenarios.append({'name': f'{basename}.{extra.__name__}', 'method': 'get', 'path': path,
+                                  'data': ACTION_PARAMS.get(extra.__name__, {})})
+
+            # Справочники только читаются (ReadOnlyModelViewSet)
+            if writes and pk is not None and hasattr(viewset, 'create'):
+                scenarios += self.write_scenarios(client, viewset, basename, list_path, pk)
+        return scenarios
+
+    def write_scenarios(self, client, viewset, basename, list_path, pk):
+        detail_path = reverse(f'{basename}-detail', args=[pk])
+        payload = client.get(detail_path).json()
+        for field in ('id', 'downtime'):
+            payload.pop(field, None)
+        for field in UNIQUE_FIELDS.get(basename, ()):
+            payload[field] = f'{payload[field]}-bench'
+
+        scenarios = [
+            {'name': f'{basename}.create', 'method': 'post', 'path': list_path, 'data': payload, 'rollback': True},
+            {'name': f'{basename}.partial_update', 'method': 'patch', 'path': detail_path, 'data': {},
+             'rollback': True},
+            {'name': f'{basename}.destroy', 'method': 'delete', 'path': detail_path, 'rollback': True},
+        ]
+        if any(extra.__name__ == 'bulk' for extra in viewset.get_extra_actions()):
+            scenarios.append({'name': f'{basename}.bulk', 'method': 'post', 'path': reverse(f'{basename}-bulk'),
+                              'data': [payload], 'rollback': True})
+        return scenarios
+
+    # ---------------------------------------------------------------------
+    # Замер
+    # ---------------------------------------------------------------------
+
+    def request(self, client, scenario):
+        method = getattr(client, scenario['method'])
+        data = scenario.get('data')
+        if scenario['method'] == 'get':
+            response = method(scenario['path'], data or {})
+        else:
+            response = method(scenario['path'], data, content_type='application/json')
+        if response.streaming:
+            # Выгрузка: время включает формирование всего файла
+            b''.join(response.streaming_content)
+        return response
+
+    def perform(self, client, scenario):
+        if not scenario.get('rollback'):
+            return self.request(client, scenario)
+        # Запись не меняет данные: следующий замер идет по тому же состоянию
+        with transaction.atomic():
+            response = self.request(client, scenario)
+            transaction.set_rollback(True)
+        return response
+
+    def run(self, client, scenario, warmup, total):
+        for _ in range(warmup):
+            self.perform(client, scenario)
+
+        latencies = []
+        queries = []
+        statuses = set()
+        for _ in range(total):
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = self.perform(client, scenario)
+            latencies.append(time.perf_counter() - started)
+            queries.append(counter.count)
+            statuses.add(response.status_code)
+
+        duration = sum(latencies)
+        latencies.sort()
+        queries.sort()
+        return {
+            'method': scenario['method'].upper(),
+            'path': scenario['path'],
+            'status': ','.join(str(code) for code in sorted(statuses)),
+            'requests': total,
+            'rps': total / duration if duration else 0.0,
+            'p50_ms': HttpBenchmark.percentile(latencies, 50) * 1000,
+            'p99_ms': HttpBenchmark.percentile(latencies, 99) * 1000,
+            'queries': queries[len(queries) // 2],
+            'queries_max': queries[-1],
+        }
+
+    # ---------------------------------------------------------------------
+    # Отчет
+    # ---------------------------------------------------------------------
+
+    def meta(self, requests):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'requests_per_scenario': requests,
+            'dataset': {
+                'machines': Machine.objects.count(),
+                'maintenances': Maintenance.objects.count(),
+                'complaints': Complaint.objects.count(),
+                'users': User.objects.count(),
+            },
+        }
+
+    def compare(self, path, results):
+        with open(path) as f:
+            baseline = json.load(f)
+        previous = {(row['role'], row['scenario']): row for row in baseline['results']}
+        self.stdout.write(f'\nСравнение с {path} (коммит {baseline["meta"].get("commit")}):')
+        for row in results:
+            old = previous.get((row['role'], row['scenario']))
+            if old is None:
+                continue
+            change = (row['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 if old['p50_ms'] else 0.0
+            queries = row['queries'] - old['queries']
+            self.stdout.write(
+                f'{row["role"]:<8} {row["scenario"]:<30} p50 {change:+6.1f}%  '
+                f'запросов к БД {queries:+d}' + ('  <-- больше запросов' if queries > 0 else '')
+            )
@@ -0,0 +1,102 @@
+import http.client
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное сравнение развертываний (WSGI / ASGI) на гостевом поиске и справочниках: '
+        'запросов в секунду и задержки p50/p99 при разной конкурентности. '
+        'Серверы запускаются отдельно, например: '
+        '"gunicorn silantservice.wsgi -w 4 -b 127.0.0.1:8000" и '
+        '"ASYNC_READ_VIEWS=1 uvicorn silantservice.asgi:application --workers 4 --port 8001".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True,
+                            help='имя=адрес, например wsgi=http://127.0.0.1:8000 (можно несколько)')
+        parser.add_argument('--concurrency', default='1,10,50', help='Уровни конкурентности через запятую')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на каждый уровень')
+        parser.add_argument('--serial', default='0001', help='Заводской номер для гостевого поиска')
+        parser.add_argument('--token', default=None, help='Токен для справочников (без него — только поиск)')
+        parser.add_argument('--json', dest='json_path', default=None, help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        targets = []
+        for value in options['target']:
+            name, sep, url = value.partition('=')
+            if not sep or not url.startswith('http'):
+                raise CommandError(f'--target: ожидается имя=http://хост:порт, получено "{value}"')
+            targets.append((name, url.rstrip('/')))
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        endpoints = [('guest_search', f'/api/machines/search/?serial_number={options["serial"]}', {})]
+        if options['token']:
+            endpoints.append(('service_types', '/api/service_types/',
+                              {'Authorization': f'Token {options["token"]}'}))
+
+        results = []
+        for endpoint, path, headers in endpoints:
+            for concurrency in levels:
+                for name, url in targets:
+                    row = self.run(url, path, headers, concurrency, options['requests'])
+                    row.update(target=name, endpoint=endpoint, concurrency=concurrency)
+                    results.append(row)
+                    self.stdout.write(
+                        f'{endpoint:<14} c={concurrency:<4} {name:<8} {row["rps"]:>8.0f} rps  '
+                        f'p50 {row["p50_ms"]:>7.1f} ms  p99 {row["p99_ms"]:>7.1f} ms  ошибок {row["errors"]}'
+                    )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    def run(self, base_url, path, headers, concurrency, total):
+        """
+        total запросов от concurrency потоков.
+        Соединение на каждый запрос: sync-воркеры gunicorn не держат keep-alive,
+        а на keep-alive замеры под uvicorn искажает задержка Nagle/delayed ACK.
+        """
+        parts = urlsplit(base_url)
+        latencies = []
+        errors = []
+
+        def request(_):
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=dict(headers, Connection='close'))
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                ok = False
+            finally:
+                conn.close()
+            elapsed = time.perf_counter() - started
+            (latencies if ok else errors).append(elapsed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(request, range(total)))
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': total,
+            'errors': len(errors),
+            'rps': len(latencies) / duration if duration else 0.0,
+            'p50_ms': self.percentile(latencies, 50) * 1000,
+            'p99_ms': self.percentile(latencies, 99) * 1000,
+        }
+
+    @staticmethod
+    def percentile(values, percent):
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+        return values[index]
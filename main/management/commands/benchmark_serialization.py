@@ -0,0 +1,84 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from main.compression import brotli
+from main.models import Machine, Complaint
+from main.renderers import ORJSONRenderer
+from main.serializers import MachineSerializer, ComplaintSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Время сериализации (JSONRenderer DRF и ORJSONRenderer) и размер ответа на проводе '
+        '(без сжатия, gzip, brotli) для больших списков машин и рекламаций. Данные — generate_fleet.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Строк в списке')
+        parser.add_argument('--repeat', type=int, default=10, help='Повторов для медианы')
+        parser.add_argument('--brotli-quality', type=int, default=4)
+        parser.add_argument('--json', dest='json_path', default=None, help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        lists = {
+            'machines': MachineSerializer(
+                Machine.objects.select_related(
+                    'technique_model', 'engine_model', 'transmission_model', 'drive_axle_model',
+                    'steering_axle_model', 'client', 'service_company'
+                ).order_by('id')[:options['rows']], many=True
+            ).data,
+            'complaints': ComplaintSerializer(
+                Complaint.objects.select_related(
+                    'machine', 'failure_node', 'recovery_method', 'service_company'
+                ).order_by('id')[:options['rows']], many=True
+            ).data,
+        }
+        if not any(lists.values()):
+            raise CommandError('В БД нет данных: сначала запустите generate_fleet')
+
+        results = []
+        for name, data in lists.items():
+            renderers = {'drf_json': JSONRenderer(), 'orjson': ORJSONRenderer()}
+            timings = {key: self.median(lambda r=renderer: r.render(data), options['repeat'])
+                       for key, renderer in renderers.items()}
+            content = renderers['orjson'].render(data)
+
+            row = {
+                'list': name,
+                'rows': len(data),
+                'render_ms': {key: value * 1000 for key, value in timings.items()},
+                'bytes': {'identity': len(content)},
+                'compress_ms': {},
+            }
+            compressors = {'gzip': lambda c: gzip.compress(c, compresslevel=6)}
+            if brotli is not None:
+                compressors['br'] = lambda c: brotli.compress(c, quality=options['brotli_quality'])
+            for key, compress in compressors.items():
+                row['bytes'][key] = len(compress(content))
+                row['compress_ms'][key] = self.median(lambda f=compress: f(content), options['repeat']) * 1000
+            results.append(row)
+
+            self.stdout.write(
+                f'{name:<10} строк {row["rows"]:>6}  '
+                f'рендер DRF {row["render_ms"]["drf_json"]:>7.1f} мс, orjson {row["render_ms"]["orjson"]:>6.1f} мс  '
+                + '  '.join(f'{key} {size / 1024:>8.1f} КБ' for key, size in row['bytes'].items())
+                + '  ' + '  '.join(f'сжатие {key} {ms:.1f} мс' for key, ms in row['compress_ms'].items())
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def median(func, repeat):
+        timings = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,211 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.analytics import rebuild_reliability
+from main.forecast import rebuild_forecasts
+from main.cache import guest_search_cache
+from main.conditional import change_versions
+from main.handbooks import handbook_registry
+from main.models import (
+    User, Machine, Maintenance, Complaint, TechniqueModel, EngineModel, TransmissionModel,
+    DriveAxleModel, SteeringAxleModel, ServiceType, FailureNode, RecoveryMethod
+)
+from main.sync import log_changes
+
+
+# Справочники и шаблоны названий записей
+HANDBOOKS = {
+    TechniqueModel: 'ПГ',
+    EngineModel: 'Д',
+    TransmissionModel: 'КПП',
+    DriveAxleModel: 'ВМ',
+    SteeringAxleModel: 'УМ',
+    ServiceType: 'ТО',
+    FailureNode: 'Узел',
+    RecoveryMethod: 'Ремонт',
+}
+CITIES = ('Москва', 'Челябинск', 'Екатеринбург', 'Казань', 'Новосибирск', 'Пермь', 'Омск', 'Самара')
+FAILURES = ('Течь масла', 'Перегрев', 'Нет давления', 'Посторонний шум', 'Не запускается', 'Износ')
+SPARE_PARTS = ('', 'Прокладка', 'Фильтр', 'Подшипник', 'Ремкомплект', 'Датчик')
+
+
+class Command(BaseCommand):
+    help = (
+        'Синтетический парк для нагрузочных замеров: машины, справочники, клиенты, сервисные '
+        'организации, ТО и рекламации с согласованной наработкой. Данные детерминированы --seed, '
+        'повторный запуск досоздает только недостающие машины.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--machines', type=int, default=1000, help='Число машин')
+        parser.add_argument('--maintenances', type=int, default=5, help='ТО на машину')
+        parser.add_argument('--complaints', type=int, default=2, help='Рекламаций на машину')
+        parser.add_argument('--clients', type=int, default=20, help='Число клиентов')
+        parser.add_argument('--service-companies', type=int, default=5, help='Число сервисных организаций')
+        parser.add_argument('--handbook-size', type=int, default=10, help='Записей в каждом справочнике')
+        parser.add_argument('--prefix', default='SYN', help='Префикс заводских номеров и логинов')
+        parser.add_argument('--password', default='bench', help='Пароль создаваемых пользователей')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Машин в одной транзакции')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить машины и пользователей с этим префиксом и выйти')
+
+    def handle(self, *args, **options):
+        for name in ('machines', 'clients', 'service_companies', 'handbook_size', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+        self.prefix = options['prefix']
+        self.seed = options['seed']
+
+        if options['clear']:
+            self.clear()
+            return
+
+        started = time.monotonic()
+        self.handbooks = self.create_handbooks(options['handbook_size'])
+        clients, services = self.create_users(options['clients'], options['service_companies'], options['password'])
+
+        serials = [f'{self.prefix}{index:07d}' for index in range(1, options['machines'] + 1)]
+        existing = set(
+            Machine.objects.filter(serial_number__startswith=self.prefix).values_list('serial_number', flat=True)
+        )
+        todo = [(index, serial) for index, serial in enumerate(serials, start=1) if serial not in existing]
+
+        # Крупные клиенты встречаются чаще: вес клиента k — 1 / k
+        client_weights = [1 / k for k in range(1, len(clients) + 1)]
+        counts = {'machines': 0, 'maintenances': 0, 'complaints': 0}
+        for offset in range(0, len(todo), options['batch_size']):
+            chunk = todo[offset:offset + options['batch_size']]
+            with transaction.atomic():
+                created = self.create_chunk(chunk, clients, client_weights, services,
+                                            options['maintenances'], options['complaints'])
+            for key, value in created.items():
+                counts[key] += value
+            self.stdout.write(f'Машин: {offset + len(chunk)} из {len(todo)}')
+
+        # bulk_create не отправляет сигналы — сводки и кэши обновляем явно
+        rebuild_reliability()
+        rebuild_forecasts()
+        handbook_registry.invalidate()
+        guest_search_cache.invalidate_all()
+        change_versions.bump_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с: машин {counts["machines"]} '
+            f'(уже было {len(existing)}), ТО {counts["maintenances"]}, рекламаций {counts["complaints"]}. '
+            f'Пользователи: {self.prefix.lower()}_manager, {clients[0].username}, {services[0].username} '
+            f'(пароль "{options["password"]}")'
+        ))
+
+    # ---------------------------------------------------------------------
+    # Справочники и пользователи
+    # ---------------------------------------------------------------------
+
+    def create_handbooks(self, size):
+        handbooks = {}
+        for model, label in HANDBOOKS.items():
+            names = [f'{label}-{self.prefix}-{index}' for index in range(1, size + 1)]
+            existing = set(model.objects.filter(name__in=names).values_list('name', flat=True))
+            model.objects.bulk_create([model(name=name) for name in names if name not in existing])
+            handbooks[model] = list(model.objects.filter(name__in=names).order_by('id').values_list('id', flat=True))
+        return handbooks
+
+    def create_users(self, clients, services, password):
+        password = make_password(password)
+        login = self.prefix.lower()
+        wanted = {f'{login}_manager': (User.Role.MANAGER, 'Менеджер')}
+        wanted.update({f'{login}_client_{i}': (User.Role.CLIENT, f'Клиент {i}') for i in range(1, clients + 1)})
+        wanted.update({f'{login}_service_{i}': (User.Role.SERVICE, f'Сервис {i}') for i in range(1, services + 1)})
+
+        existing = set(User.objects.filter(username__in=wanted).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=username, role=role, first_name=first_name, password=password)
+            for username, (role, first_name) in wanted.items() if username not in existing
+        ])
+        users = {user.username: user for user in User.objects.filter(username__in=wanted).only('id', 'username', 'role')}
+        return (
+            [users[f'{login}_client_{i}'] for i in range(1, clients + 1)],
+            [users[f'{login}_service_{i}'] for i in range(1, services + 1)],
+        )
+
+    # ---------------------------------------------------------------------
+    # Машины, ТО и рекламации
+    # ---------------------------------------------------------------------
+
+    def create_chunk(self, chunk, clients, client_weights, services, maintenances, complaints):
+        today = date.today()
+        machines = []
+        plans = []
+        for index, serial in chunk:
+            # Свой генератор на машину: данные не зависят от размера пачки и повторных запусков
+            rng = random.Random(f'{self.seed}:{serial}')
+            shipment_date = today - timedelta(days=rng.randint(60, 5 * 365))
+            machines.append(Machine(
+                serial_number=serial,
+                technique_model_id=rng.choice(self.handbooks[TechniqueModel]),
+                engine_model_id=rng.choice(self.handbooks[EngineModel]),
+                engine_number=f'E{index:07d}',
+                transmission_model_id=rng.choice(self.handbooks[TransmissionModel]),
+                transmission_number=f'T{index:07d}',
+                drive_axle_model_id=rng.choice(self.handbooks[DriveAxleModel]),
+                drive_axle_number=f'D{index:07d}',
+                steering_axle_model_id=rng.choice(self.handbooks[SteeringAxleModel]),
+                steering_axle_number=f'S{index:07d}',
+                supply_contract_num_date=f'№{index} от {shipment_date:%d.%m.%Y}',
+                shipment_date=shipment_date,
+                consignee=f'ООО "Грузополучатель {rng.randint(1, 500)}"',
+                delivery_address=f'г. {rng.choice(CITIES)}',
+                equipment_options=rng.choice(('', 'Стандарт', 'Кабина с отоплением', 'Боковое смещение')),
+                client=rng.choices(clients, client_weights)[0],
+                service_company=rng.choice(services),
+            ))
+            # Наработка растет с постоянной для машины интенсивностью (м/час в сутки)
+            plans.append((rng, shipment_date, rng.uniform(3, 14)))
+        Machine.objects.bulk_create(machines)
+
+        maintenance_rows = []
+        complaint_rows = []
+        for machine, (rng, shipment_date, rate) in zip(machines, plans):
+            days = (today - shipment_date).days
+            for number, offset in enumerate(sorted(rng.sample(range(1, days), min(maintenances, days - 1))), 1):
+                event_date = shipment_date + timedelta(days=offset)
+                maintenance_rows.append(Maintenance(
+                    machine=machine,
+                    service_type_id=rng.choice(self.handbooks[ServiceType]),
+                    event_date=event_date,
+                    operating_hours=int(offset * rate),
+                    order_number=f'{machine.serial_number}-{number}',
+                    order_date=max(shipment_date, event_date - timedelta(days=rng.randint(0, 5))),
+                    service_company_id=machine.service_company_id,
+                ))
+            for offset in sorted(rng.sample(range(1, days), min(complaints, days - 1))):
+                failure_date = shipment_date + timedelta(days=offset)
+                complaint_rows.append(Complaint(
+                    machine=machine,
+                    failure_date=failure_date,
+                    operating_hours=int(offset * rate),
+                    failure_node_id=rng.choice(self.handbooks[FailureNode]),
+                    failure_description=rng.choice(FAILURES),
+                    recovery_method_id=rng.choice(self.handbooks[RecoveryMethod]),
+                    spare_parts_used=rng.choice(SPARE_PARTS),
+                    restoration_date=min(today, failure_date + timedelta(days=rng.randint(0, 20))),
+                    service_company_id=machine.service_company_id,
+                ))
+        Maintenance.objects.bulk_create(maintenance_rows)
+        Complaint.objects.bulk_create(complaint_rows)
+        log_changes(machines + maintenance_rows + complaint_rows)
+        return {'machines': len(machines), 'maintenances': len(maintenance_rows), 'complaints': len(complaint_rows)}
+
+    def clear(self):
+        with transaction.atomic():
+            machines, _ = Machine.objects.filter(serial_number__startswith=self.prefix).delete()
+            users, _ = User.objects.filter(username__startswith=f'{self.prefix.lower()}_').delete()
+        handbook_registry.invalidate()
+        guest_search_cache.invalidate_all()
+        change_versions.bump_all()
+        self.stdout.write(self.style.SUCCESS(f'Удалено объектов: машины с ТО и рекламациями {machines}, пользователи {users}'))
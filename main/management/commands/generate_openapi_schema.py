@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.openapi import schema_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация схемы OpenAPI в файл OPENAPI_SCHEMA_PATH (запускается при деплое): '
+        'воркеры отдают готовый файл, а не строят схему по запросу.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        version = schema_artifact.write()
+        self.stdout.write(self.style.SUCCESS(
+            f'Схема записана в {schema_artifact.path}: версия {version}, '
+            f'{len(schema_artifact.content) / 1024:.1f} КБ за {time.monotonic() - started:.1f} с'
+        ))
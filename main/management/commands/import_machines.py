@@ -0,0 +1,313 @@
+import csv
+import json
+import time
+from datetime import date, datetime
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.cache import guest_search_cache
+from main.conditional import change_versions
+from main.forecast import refresh_forecasts
+from main.handbooks import handbook_registry
+from main.models import (
+    Machine, User, TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel
+)
+from main.sync import log_changes
+
+
+# Поля-справочники машины: при импорте недостающие записи создаются автоматически
+HANDBOOK_FIELDS = {
+    'technique_model': TechniqueModel,
+    'engine_model': EngineModel,
+    'transmission_model': TransmissionModel,
+    'drive_axle_model': DriveAxleModel,
+    'steering_axle_model': SteeringAxleModel,
+}
+USER_FIELDS = {
+    'client': User.Role.CLIENT,
+    'service_company': User.Role.SERVICE,
+}
+TEXT_FIELDS = [
+    'serial_number', 'engine_number', 'transmission_number', 'drive_axle_number',
+    'steering_axle_number', 'supply_contract_num_date', 'consignee', 'delivery_address',
+    'equipment_options',
+]
+OPTIONAL_FIELDS = {'equipment_options'}
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y')
+
+
+class RowError(ValueError):
+    pass
+
+
+def clean_value(model, name, value, label):
+    """
+    Проверки поля модели, как в full_clean() (max_length, choices), до записи: в PostgreSQL
+    одно слишком длинное значение (DataError) откатило бы всю пачку, и --resume упирался бы в нее снова.
+    """
+    try:
+        return model._meta.get_field(name).clean(value, None)
+    except ValidationError as exc:
+        raise RowError(f'поле {label}: {" ".join(exc.messages)}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт машин из CSV/XLSX выгрузки завода. '
+        'Заголовки — имена полей Machine или их verbose_name. '
+        'Справочники создаются автоматически, client/service_company — логины пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к .csv или .xlsx файлу')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одной транзакции')
+        parser.add_argument('--delimiter', default=None, help='Разделитель CSV (по умолчанию определяется)')
+        parser.add_argument('--dry-run', action='store_true', help='Проверить файл без записи в БД')
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить с последней закоммиченной пачки (файл <path>.import-state)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        self.dry_run = options['dry_run']
+        self.state_path = path.with_name(path.name + '.import-state')
+        self.handbook_ids = {field: {} for field in HANDBOOK_FIELDS}
+        self.new_handbooks = {field: set() for field in HANDBOOK_FIELDS}
+        self.users = {}
+        self.stats = {'rows': 0, 'created': 0, 'skipped': 0, 'errors': 0}
+
+        start_row = self.load_state() if options['resume'] else 0
+        rows = self.read_rows(path, options['delimiter'])
+        if start_row:
+            self.stdout.write(f'Продолжение со строки {start_row + 1}')
+            rows = islice(rows, start_row, None)
+
+        started = time.monotonic()
+        row_number = start_row
+        while True:
+            chunk = list(islice(rows, options['batch_size']))
+            if not chunk:
+                break
+            first_row = row_number + 1
+            row_number += len(chunk)
+            self.import_chunk(chunk, first_row)
+            if not self.dry_run:
+                self.save_state(row_number)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Строк: {self.stats["rows"]}, создано: {self.stats["created"]}, '
+                f'пропущено: {self.stats["skipped"]}, ошибок: {self.stats["errors"]} '
+                f'({self.stats["rows"] / elapsed if elapsed else 0:.0f} строк/с)'
+            )
+
+        if not self.dry_run and self.state_path.exists():
+            self.state_path.unlink()
+
+        elapsed = time.monotonic() - started
+        prefix = '[dry-run] ' if self.dry_run else ''
+        new_handbooks = sum(len(names) for names in self.new_handbooks.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Готово за {elapsed:.1f} с: создано машин {self.stats["created"]}, '
+            f'новых записей справочников {new_handbooks}, пропущено {self.stats["skipped"]}, '
+            f'ошибок {self.stats["errors"]}'
+        ))
+
+    # ---------------------------------------------------------------------
+    # Чтение файла
+    # ---------------------------------------------------------------------
+
+    def read_rows(self, path, delimiter):
+        """Построчный генератор словарей {поле Machine: значение}."""
+        if path.suffix.lower() == '.xlsx':
+            rows = self.read_xlsx(path)
+        else:
+            rows = self.read_csv(path, delimiter)
+        header = [self.resolve_header(value) for value in next(rows, [])]
+        missing = set(HANDBOOK_FIELDS) | set(USER_FIELDS) | set(TEXT_FIELDS) | {'shipment_date'}
+        missing -= set(header) | OPTIONAL_FIELDS
+        if missing:
+            raise CommandError(f'В файле нет колонок: {", ".join(sorted(missing))}')
+        for values in rows:
+            if not any(value not in (None, '') for value in values):
+                continue
+            yield dict(zip(header, values))
+
+    def read_csv(self, path, delimiter):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            if delimiter is None:
+                sample = f.read(4096)
+                f.seek(0)
+                try:
+                    delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+                except csv.Error:
+                    delimiter = ','
+            yield from csv.reader(f, delimiter=delimiter)
+
+    def read_xlsx(self, path):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise CommandError('Для импорта XLSX установите openpyxl')
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def resolve_header(value):
+        value = str(value or '').strip()
+        for field in Machine._meta.concrete_fields:
+            if value in (field.name, str(field.verbose_name)):
+                return field.name
+        return value
+
+    # ---------------------------------------------------------------------
+    # Обработка пачки
+    # ---------------------------------------------------------------------
+
+    def import_chunk(self, chunk, first_row):
+        self.stats['rows'] += len(chunk)
+        self.load_users(chunk)
+
+        serials = {str(row.get('serial_number') or '').strip() for row in chunk}
+        existing = set(Machine.objects.filter(serial_number__in=serials).values_list('serial_number', flat=True))
+
+        parsed = []
+        seen = set()
+        for row_number, row in enumerate(chunk, start=first_row):
+            try:
+                values = self.parse_row(row)
+            except RowError as exc:
+                self.stats['errors'] += 1
+                self.stderr.write(f'Строка {row_number}: {exc}')
+                continue
+            # Уже импортированные машины пропускаются: повторный запуск безопасен
+            if values['serial_number'] in existing or values['serial_number'] in seen:
+                self.stats['skipped'] += 1
+                continue
+            seen.add(values['serial_number'])
+            parsed.append(values)
+
+        if self.dry_run:
+            for values in parsed:
+                self.collect_handbooks(values)
+            self.stats['created'] += len(parsed)
+            return
+
+        with transaction.atomic():
+            created_handbooks = self.create_handbooks(parsed)
+            machines = [self.build_machine(values) for values in parsed]
+            Machine.objects.bulk_create(machines)
+            log_changes(machines)
+
+        # bulk_create не отправляет сигналы — сбрасываем кэши вручную
+        if created_handbooks:
+            handbook_registry.invalidate()
+            guest_search_cache.invalidate_all()
+        guest_search_cache.invalidate(*(machine.serial_number for machine in machines))
+        change_versions.bump_machines(
+            [], ['machine'], owners={(machine.client_id, machine.service_company_id) for machine in machines}
+        )
+        refresh_forecasts(machine.pk for machine in machines)
+        self.stats['created'] += len(machines)
+
+    def parse_row(self, row):
+        values = {}
+        for field in TEXT_FIELDS:
+            value = str(row.get(field) or '').strip()
+            if not value and field not in OPTIONAL_FIELDS:
+                raise RowError(f'не заполнено поле {field}')
+            values[field] = clean_value(Machine, field, value, field)
+        for field, model in HANDBOOK_FIELDS.items():
+            value = str(row.get(field) or '').strip()
+            if not value:
+                raise RowError(f'не заполнено поле {field}')
+            values[field] = clean_value(model, 'name', value, field)
+        for field, role in USER_FIELDS.items():
+            username = str(row.get(field) or '').strip()
+            user = self.users.get(username)
+            if user is None:
+                raise RowError(f'пользователь "{username}" не найден')
+            if user.role != role:
+                raise RowError(f'у пользователя "{username}" роль {user.role}, ожидается {role}')
+            values[field] = user
+        values['shipment_date'] = self.parse_date(row.get('shipment_date'))
+        return values
+
+    @staticmethod
+    def parse_date(value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        value = str(value or '').strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+        raise RowError(f'неверная дата отгрузки "{value}"')
+
+    def load_users(self, chunk):
+        """Один запрос на пачку: подгружаем только еще не известные логины."""
+        usernames = {
+            str(row.get(field) or '').strip() for row in chunk for field in USER_FIELDS
+        } - set(self.users)
+        for user in User.objects.filter(username__in=usernames).only('id', 'username', 'role'):
+            self.users[user.username] = user
+
+    def collect_handbooks(self, values):
+        """dry-run: запоминаем, какие записи справочников были бы созданы."""
+        for field, model in HANDBOOK_FIELDS.items():
+            name = values[field]
+            if not handbook_registry.ids_for_name(model, name):
+                self.new_handbooks[field].add(name)
+
+    def create_handbooks(self, parsed):
+        created = False
+        for field, model in HANDBOOK_FIELDS.items():
+            ids = self.handbook_ids[field]
+            missing = set()
+            for values in parsed:
+                name = values[field]
+                if name in ids:
+                    continue
+                known = handbook_registry.ids_for_name(model, name)
+                if known:
+                    ids[name] = known[0]
+                else:
+                    missing.add(name)
+            if missing:
+                for obj in model.objects.bulk_create([model(name=name) for name in sorted(missing)]):
+                    ids[obj.name] = obj.pk
+                self.new_handbooks[field].update(missing)
+                created = True
+        return created
+
+    def build_machine(self, values):
+        attrs = dict(values)
+        for field in HANDBOOK_FIELDS:
+            attrs[f'{field}_id'] = self.handbook_ids[field][attrs.pop(field)]
+        return Machine(**attrs)
+
+    # ---------------------------------------------------------------------
+    # Состояние для --resume
+    # ---------------------------------------------------------------------
+
+    def load_state(self):
+        if not self.state_path.exists():
+            return 0
+        return json.loads(self.state_path.read_text())['rows_done']
+
+    def save_state(self, rows_done):
+        self.state_path.write_text(json.dumps({'rows_done': rows_done}))
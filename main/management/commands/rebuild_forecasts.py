@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.forecast import rebuild_forecasts
+
+
+class Command(BaseCommand):
+    help = (
+        'Полная пересборка прогнозов ТО (MaintenanceForecast) одним расчетом по всему парку. '
+        'Между пересборками прогнозы машин обновляются сигналами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одном INSERT')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = rebuild_forecasts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогнозы пересобраны: {total} за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,327 @@
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.renderers import BaseRenderer
+
+slow_query_logger = logging.getLogger('main.slow_queries')
+
+
+# -------------------------------------------------------------------------
+# 1. Реестр метрик процесса
+# -------------------------------------------------------------------------
+#
+# Свой небольшой реестр вместо prometheus_client: нужны только счетчики и гистограммы,
+# а запись в них — словарь под блокировкой, без выделения объектов на каждый запрос.
+
+COUNTERS = {
+    'silant_http_requests_total': 'Запросы по представлению, методу и статусу',
+    'silant_slow_queries_total': 'Запросы к БД дольше SLOW_QUERY_MS',
+    'silant_cache_requests_total': 'Обращения к кэшам процесса (result = hit / miss)',
+}
+
+HISTOGRAMS = {
+    'silant_http_request_duration_seconds': (
+        'Время ответа', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'silant_http_response_size_bytes': (
+        'Размер тела ответа', (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    ),
+    'silant_db_queries_per_request': (
+        'Число запросов к БД за один HTTP-запрос', (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    ),
+    'silant_db_time_seconds': (
+        'Суммарное время запросов к БД за один HTTP-запрос', (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    ),
+}
+
+
+class MetricsRegistry:
+    """
+    Счетчики и гистограммы текущего процесса.
+
+    Метки — кортеж пар (имя, значение). Гистограмма хранит число наблюдений
+    в каждом интервале (не накопительно) и сумму; накопление делается при выводе.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        index = bisect_left(buckets, value)
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {key: [list(counts), total] for key, (counts, total) in self.histograms.items()},
+            }
+
+
+def merge_snapshots(snapshots):
+    """Сумма снимков нескольких процессов."""
+    merged = {'counters': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for key, value in snapshot['counters'].items():
+            merged['counters'][key] = merged['counters'].get(key, 0) + value
+        for key, (counts, total) in snapshot['histograms'].items():
+            series = merged['histograms'].setdefault(key, [[0] * len(counts), 0.0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+    return merged
+
+
+metrics_registry = MetricsRegistry()
+
+
+def count_cache(name, hit):
+    """Попадание или промах кэша name (для silant_cache_requests_total)."""
+    metrics_registry.inc('silant_cache_requests_total', (('cache', name), ('result', 'hit' if hit else 'miss')))
+
+
+# -------------------------------------------------------------------------
+# 2. Сбор снимков воркеров
+# -------------------------------------------------------------------------
+#
+# У каждого воркера gunicorn/uvicorn свой реестр. Раз в METRICS_FLUSH_INTERVAL секунд
+# воркер кладет снимок в общий кэш, а /metrics суммирует снимки всех живых воркеров,
+# поэтому ответ не зависит от того, какой воркер его отдал. С LocMemCache виден только
+# текущий процесс. Снимок перезапущенного воркера пропадает по TTL — для Prometheus
+# это обычный сброс счетчика.
+
+class WorkerSnapshots:
+    prefix = 'metrics'
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.flushed_at = 0.0
+
+    @property
+    def interval(self):
+        return getattr(settings, 'METRICS_FLUSH_INTERVAL', 15)
+
+    @property
+    def ttl(self):
+        return self.interval * 4
+
+    def worker_key(self):
+        # pid вычисляется каждый раз: после fork у воркера он другой
+        return f'{self.prefix}:worker:{socket.gethostname()}:{os.getpid()}'
+
+    def maybe_flush(self):
+        now = time.monotonic()
+        if now - self.flushed_at < self.interval:
+            return
+        self.flushed_at = now
+        self.flush()
+
+    def flush(self):
+        key = self.worker_key()
+        cache.set(key, self.registry.snapshot(), self.ttl)
+        # Список воркеров: гонка при записи лишь откладывает появление воркера до следующего сброса
+        now = time.time()
+        workers = {
+            worker: seen for worker, seen in cache.get(f'{self.prefix}:workers', {}).items()
+            if now - seen < self.ttl
+        }
+        workers[key] = now
+        cache.set(f'{self.prefix}:workers', workers, None)
+
+    def collect(self):
+        """Сумма снимков всех воркеров (текущий — по живому реестру) и число воркеров."""
+        own = self.worker_key()
+        others = [key for key in cache.get(f'{self.prefix}:workers', {}) if key != own]
+        snapshots = [snapshot for snapshot in cache.get_many(others).values()]
+        snapshots.append(self.registry.snapshot())
+        return merge_snapshots(snapshots), len(snapshots)
+
+
+worker_snapshots = WorkerSnapshots(metrics_registry)
+
+
+# -------------------------------------------------------------------------
+# 3. Middleware
+# -------------------------------------------------------------------------
+
+class QueryTimer:
+    """
+    Обертка connection.execute_wrapper: число и время запросов к БД,
+    а также журнал медленных запросов с именем представления.
+    """
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed * 1000 >= self.threshold:
+                self.log_slow(sql, elapsed, context)
+
+    def log_slow(self, sql, elapsed, context):
+        view = view_name(self.request)
+        metrics_registry.inc('silant_slow_queries_total', (('view', view),))
+        slow_query_logger.warning(
+            'Медленный запрос %.1f мс (%s %s, представление %s, БД %s): %s',
+            elapsed * 1000, self.request.method, self.request.path, view,
+            context['connection'].alias, sql[:1000],
+        )
+
+
+def view_name(request):
+    """Имя маршрута (machine-list, guest_search...) — ограниченный набор значений для меток."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов: время ответа, размер ответа, число и время запросов к БД
+    по представлениям. Стоимость — пара perf_counter() на запрос к БД и одна запись
+    в реестр под блокировкой на HTTP-запрос.
+
+    Запросы к БД считаются в потоке запроса: у асинхронных представлений ORM работает
+    в другом потоке, поэтому для них учитываются только время и размер ответа.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer(request, getattr(settings, 'SLOW_QUERY_MS', 500))
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, None)
+        return response
+
+    def record(self, request, response, elapsed, timer):
+        view = view_name(request)
+        metrics_registry.inc(
+            'silant_http_requests_total',
+            (('view', view), ('method', request.method), ('status', str(response.status_code))),
+        )
+        metrics_registry.observe(
+            'silant_http_request_duration_seconds', (('view', view), ('method', request.method)), elapsed
+        )
+        # У потоковых ответов (выгрузка) размер заранее неизвестен
+        if not response.streaming:
+            metrics_registry.observe('silant_http_response_size_bytes', (('view', view),), len(response.content))
+        if timer is not None:
+            metrics_registry.observe('silant_db_queries_per_request', (('view', view),), timer.count)
+            metrics_registry.observe('silant_db_time_seconds', (('view', view),), timer.duration)
+        worker_snapshots.maybe_flush()
+
+
+# -------------------------------------------------------------------------
+# 4. Текстовый формат Prometheus
+# -------------------------------------------------------------------------
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Ошибки DRF (403 и т.п.)
+        return ''.join(f'# {key}: {value}\n' for key, value in (data or {}).items()).encode(self.charset)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+def render_prometheus(snapshot, gauges=()):
+    """
+    Снимок реестра и дополнительные показатели в текстовом формате Prometheus 0.0.4.
+    gauges — список (имя, описание, [(метки, значение), ...]).
+    """
+    lines = []
+    for name, description in COUNTERS.items():
+        series = sorted((labels, value) for (metric, labels), value in snapshot['counters'].items() if metric == name)
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in series]
+
+    for name, (description, buckets) in HISTOGRAMS.items():
+        series = sorted((labels, data) for (metric, labels), data in snapshot['histograms'].items() if metric == name)
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+    for name, description, series in gauges:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+        lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in series]
+    return '\n'.join(lines) + '\n'
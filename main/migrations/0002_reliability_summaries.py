@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MachineReliability',
+            fields=[
+                ('machine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reliability', serialize=False, to='main.machine', verbose_name='Машина')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Количество отказов')),
+                ('total_downtime', models.IntegerField(default=0, verbose_name='Суммарный простой, дней')),
+                ('operating_hours', models.PositiveIntegerField(default=0, verbose_name='Наработка на последний отказ, м/час')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('engine_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.enginemodel')),
+                ('service_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('technique_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.techniquemodel')),
+            ],
+            options={
+                'verbose_name': 'Сводка надежности машины',
+                'verbose_name_plural': 'Сводки надежности машин',
+            },
+        ),
+        migrations.CreateModel(
+            name='FailureNodeReliability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Количество отказов')),
+                ('total_downtime', models.IntegerField(default=0, verbose_name='Суммарный простой, дней')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('failure_node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.failurenode')),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.machine')),
+                ('service_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Сводка надежности узла',
+                'verbose_name_plural': 'Сводки надежности узлов',
+                'constraints': [models.UniqueConstraint(fields=('machine', 'failure_node'), name='unique_machine_failure_node')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+SEARCH_FIELDS = (
+    'serial_number', 'engine_number', 'transmission_number', 'drive_axle_number',
+    'steering_axle_number', 'consignee', 'delivery_address',
+)
+FTS_COLUMNS = ', '.join(SEARCH_FIELDS + ('client_id', 'service_company_id'))
+
+
+def create_fts_triggers(schema_editor):
+    """
+    Триггеры, которые ведут FTS5-таблицу (SQLite).
+    SQLite пересоздает main_machine при многих изменениях схемы и теряет триггеры,
+    поэтому после каждого migrate их восстанавливает обработчик post_migrate (main/signals.py).
+    """
+    new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS.split(', '))
+    for trigger in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS main_machine_search_{trigger}')
+    schema_editor.execute(
+        f'CREATE TRIGGER main_machine_search_ai AFTER INSERT ON main_machine BEGIN '
+        f'INSERT INTO main_machine_search(rowid, {FTS_COLUMNS}) VALUES (new.id, {new_values}); END'
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER main_machine_search_ad AFTER DELETE ON main_machine BEGIN '
+        'DELETE FROM main_machine_search WHERE rowid = old.id; END'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER main_machine_search_au AFTER UPDATE ON main_machine BEGIN '
+        f'DELETE FROM main_machine_search WHERE rowid = old.id; '
+        f'INSERT INTO main_machine_search(rowid, {FTS_COLUMNS}) VALUES (new.id, {new_values}); END'
+    )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        document = " || ' ' || ".join(SEARCH_FIELDS)
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS machine_search_trgm_idx ON main_machine '
+            f'USING gin (({document}) gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE main_machine_search USING fts5('
+            f'{", ".join(SEARCH_FIELDS)}, client_id UNINDEXED, service_company_id UNINDEXED, '
+            f"tokenize='trigram')"
+        )
+        create_fts_triggers(schema_editor)
+        schema_editor.execute(
+            f'INSERT INTO main_machine_search(rowid, {FTS_COLUMNS}) SELECT id, {FTS_COLUMNS} FROM main_machine'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS machine_search_trgm_idx')
+    elif vendor == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS main_machine_search_{trigger}')
+        schema_editor.execute('DROP TABLE IF EXISTS main_machine_search')
+
+
+class Migration(migrations.Migration):
+    """
+    Поисковые индексы по номерам агрегатов, грузополучателю и адресу (см. main/search.py).
+    PostgreSQL — pg_trgm GIN, SQLite — FTS5 (trigram) с триггерами.
+    """
+
+    dependencies = [
+        ('main', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
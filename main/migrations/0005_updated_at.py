@@ -0,0 +1,41 @@
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+create_fts_triggers = import_module('main.migrations.0004_machine_search').create_fts_triggers
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite пересоздал main_machine при добавлении колонки — триггеры поиска пропали
+    if schema_editor.connection.vendor == 'sqlite':
+        create_fts_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_machine_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='machine',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='maintenance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
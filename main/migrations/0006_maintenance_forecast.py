@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicetype',
+            name='interval_hours',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Периодичность, м/час'),
+        ),
+        migrations.CreateModel(
+            name='MaintenanceForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hours_per_day', models.FloatField(verbose_name='Наработка в сутки, м/час')),
+                ('readings', models.PositiveIntegerField(default=0, verbose_name='Показаний счетчика')),
+                ('last_reading_date', models.DateField(verbose_name='Дата последнего показания')),
+                ('last_reading_hours', models.PositiveIntegerField(default=0, verbose_name='Последнее показание, м/час')),
+                ('last_service_date', models.DateField(blank=True, null=True, verbose_name='Дата последнего такого ТО')),
+                ('last_service_hours', models.PositiveIntegerField(blank=True, null=True, verbose_name='Наработка на последнем таком ТО, м/час')),
+                ('interval_hours', models.PositiveIntegerField(verbose_name='Периодичность, м/час')),
+                ('due_hours', models.PositiveIntegerField(verbose_name='Наработка к следующему ТО, м/час')),
+                ('due_date', models.DateField(verbose_name='Прогноз даты следующего ТО')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='forecasts', to='main.machine', verbose_name='Машина')),
+                ('service_company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main.servicetype', verbose_name='Вид ТО')),
+            ],
+            options={
+                'verbose_name': 'Прогноз ТО',
+                'verbose_name_plural': 'Прогнозы ТО',
+                'ordering': ['due_date'],
+                'indexes': [models.Index(fields=['due_date', 'id'], name='forecast_due_idx'), models.Index(fields=['client', 'due_date', 'id'], name='forecast_client_due_idx'), models.Index(fields=['service_company', 'due_date', 'id'], name='forecast_service_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('machine', 'service_type'), name='unique_machine_service_type')],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+SEED_BATCH = 5000
+
+
+def seed_journal(apps, schema_editor):
+    """Уже существующие машины, ТО и рекламации попадают в журнал как upsert: первая синхронизация отдает всё."""
+    Change = apps.get_model('main', 'Change')
+    sources = {
+        'machine': apps.get_model('main', 'Machine').objects.values_list('id', 'client_id', 'service_company_id'),
+        'maintenance': apps.get_model('main', 'Maintenance').objects.values_list(
+            'id', 'machine__client_id', 'machine__service_company_id'),
+        'complaint': apps.get_model('main', 'Complaint').objects.values_list(
+            'id', 'machine__client_id', 'machine__service_company_id'),
+    }
+    for resource, rows in sources.items():
+        batch = []
+        for object_id, client_id, service_id in rows.order_by('id').iterator(chunk_size=SEED_BATCH):
+            batch.append(Change(resource=resource, object_id=object_id, action='upsert',
+                                client_id=client_id, service_company_id=service_id))
+            if len(batch) >= SEED_BATCH:
+                Change.objects.bulk_create(batch)
+                batch = []
+        Change.objects.bulk_create(batch)
+    # Номера — в порядке вставки
+    Change.objects.update(seq=F('id'))
+    last = Change.objects.aggregate(last=Max('seq'))['last'] or 0
+    apps.get_model('main', 'ChangeSequence').objects.create(pk=1, value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_maintenance_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='Номер изменения')),
+                ('resource', models.CharField(max_length=20, verbose_name='Ресурс')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('action', models.CharField(choices=[('upsert', 'Создание или изменение'), ('delete', 'Удаление'), ('revoke', 'Потеря доступа')], max_length=10, verbose_name='Действие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service_company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'indexes': [models.Index(fields=['client', 'seq'], name='change_client_seq_idx'), models.Index(fields=['service_company', 'seq'], name='change_service_seq_idx')],
+            },
+        ),
+        migrations.RunPython(seed_journal, migrations.RunPython.noop),
+    ]
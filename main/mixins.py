@@ -0,0 +1,264 @@
+import csv
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+
+# -------------------------------------------------------------------------
+# 1. Пакетное создание записей
+# -------------------------------------------------------------------------
+
+class BulkCreateMixin:
+    """
+    POST <list>/bulk/ — пакетное создание записей списком.
+
+    Строки проверяются тем же сериализатором, что и обычный POST.
+    Если хоть одна строка невалидна, ничего не записывается и возвращаются
+    ошибки по номерам строк (с 0, только строки с ошибками): {"1": {...}, "5": {...}}.
+    Тот же формат — у повторов ключа при ?upsert=1.
+    ?upsert=1 — обновлять существующие записи по ключу list-сериализатора; обновляются только
+    записи из get_queryset() (видимые роли), ключ чужой записи — ошибка строки.
+    """
+    bulk_max_rows = 1000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        context = self.get_serializer_context()
+        context['upsert'] = request.query_params.get('upsert') in ('1', 'true')
+        context['scoped_queryset'] = self.get_queryset()
+        serializer = self.get_serializer_class()(
+            data=request.data, many=True, max_length=self.bulk_max_rows, context=context
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+# -------------------------------------------------------------------------
+# 2. Потоковая выгрузка списков
+# -------------------------------------------------------------------------
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class ExportMixin:
+    """
+    GET <list>/export/?output=csv|ndjson — полная выгрузка списка.
+
+    Учитывает ту же ролевую видимость (get_queryset) и фильтры/сортировку,
+    что и обычный список, но без пагинации. Строки читаются через
+    values_list().iterator(chunk_size) (серверный курсор на PostgreSQL)
+    и сразу отдаются клиенту, поэтому память не растет с размером выгрузки.
+
+    export_fields: {имя колонки: lookup в queryset}.
+    """
+    export_fields = {}
+    export_chunk_size = 2000
+    export_formats = ('csv', 'ndjson')
+
+    def get_export_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in self.export_formats:
+            return Response(
+                {"error": f"Поддерживаемые форматы: {', '.join(self.export_formats)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        columns = list(self.export_fields)
+        rows = self.get_export_queryset().values_list(*self.export_fields.values()).iterator(
+            chunk_size=self.export_chunk_size
+        )
+        if output == 'csv':
+            content, content_type = self.stream_csv(columns, rows), 'text/csv; charset=utf-8'
+        else:
+            content, content_type = self.stream_ndjson(columns, rows), 'application/x-ndjson; charset=utf-8'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}s.{output}"'
+        return response
+
+    @staticmethod
+    def stream_csv(columns, rows):
+        writer = csv.writer(Echo())
+        # BOM — чтобы Excel сразу открыл кириллицу в UTF-8
+        yield '\ufeff' + writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    @staticmethod
+    def stream_ndjson(columns, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+
+# -------------------------------------------------------------------------
+# 3. Чтение списков без сериализатора
+# -------------------------------------------------------------------------
+
+class ValuesReadMixin:
+    """
+    list/retrieve без сериализатора: строки читаются через values() сразу
+    в нужные колонки (включая названия справочников и логины через JOIN)
+    и отдаются обычными словарями. Запись по-прежнему идет через serializer_class.
+
+    read_fields: {ключ ответа: lookup в queryset} в том же порядке и с теми же
+    значениями, что и у serializer_class. По умолчанию — export_fields: во вьюсетах
+    это общие колонки выгрузки и чтения, поэтому они повторяют serializer_class.
+    Совпадение ответа байт в байт проверяется тестами (ValuesReadTests).
+
+    Параметры запроса:
+    - ?fields=id,serial_number — только перечисленные поля; в SELECT попадают
+      только их колонки, JOIN — только для запрошенных связей;
+    - ?expand=technique_model — вместо названия справочника объект
+      {id, name, description} (ключи из expandable_fields).
+    """
+    read_fields = None
+    values_read_actions = ('list', 'retrieve')
+
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    # {ключ ответа: путь к справочнику}
+    expandable_fields = {}
+    expanded_columns = ('id', 'name', 'description')
+
+    def get_read_fields(self):
+        return self.read_fields or self.export_fields
+
+    def get_read_columns(self):
+        """[(ключ ответа, lookup или None, раскрывается ли)] с учетом ?fields= и ?expand=."""
+        read_fields = self.get_read_fields()
+        fields = self.get_list_param(self.fields_query_param, read_fields) or list(read_fields)
+        expand = self.get_list_param(self.expand_query_param, self.expandable_fields)
+        # Раскрытое поле попадает в ответ, даже если его нет в ?fields=
+        keys = set(fields) | set(expand)
+        return [(key, read_fields[key], key in expand) for key in read_fields if key in keys]
+
+    def get_list_param(self, name, allowed):
+        value = self.request.query_params.get(name, '')
+        items = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = [item for item in items if item not in allowed]
+        if unknown:
+            raise ValidationError({name: [f'Неизвестные поля: {", ".join(unknown)}']})
+        return items
+
+    def get_read_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        self.read_columns = self.get_read_columns()
+
+        lookups = []
+        for key, lookup, expanded in self.read_columns:
+            if expanded:
+                path = self.expandable_fields[key]
+                lookups.extend(f'{path}__{column}' for column in self.expanded_columns)
+            else:
+                lookups.append(lookup)
+        # Пагинатору (keyset-курсору) нужны id и поле сортировки, даже если их не запросили
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        lookups.append('id')
+        lookups.extend(name.lstrip('-') for name in ordering if isinstance(name, str))
+        lookups = list(dict.fromkeys(lookups))
+        # Псевдонимы (alias) выбираются только выражением: values(downtime=F('downtime'))
+        aliases = {
+            name: F(name) for name in lookups
+            if name in queryset.query.annotations and name not in queryset.query.annotation_select
+        }
+        return queryset.values(*(name for name in lookups if name not in aliases), **aliases)
+
+    def represent_rows(self, rows):
+        return [self.represent_row(row) for row in rows]
+
+    def represent_row(self, row):
+        data = {}
+        for key, lookup, expanded in self.read_columns:
+            if expanded:
+                path = self.expandable_fields[key]
+                data[key] = {column: row[f'{path}__{column}'] for column in self.expanded_columns}
+            else:
+                data[key] = self.represent_value(row[lookup])
+        return data
+
+    @staticmethod
+    def represent_value(value):
+        # DateField сериализатора отдает ISO 8601
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def list(self, request, *args, **kwargs):
+        if self.action not in self.values_read_actions:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_read_queryset()
+        # Пагинатор получает «сырые» строки: keyset-курсор берет позицию из них
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.represent_rows(page))
+        return Response(self.represent_rows(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.action not in self.values_read_actions:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(self.get_read_queryset(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(self.represent_row(row))
+
+
+# -------------------------------------------------------------------------
+# 4. Видимость по роли и генерация схемы OpenAPI
+# -------------------------------------------------------------------------
+
+class ScopedQuerysetMixin:
+    """
+    get_queryset вьюсетов с видимостью по роли: строки отдает get_scoped_queryset().
+    Генерация схемы OpenAPI (generate_openapi_schema) идет без запроса и пользователя —
+    тогда возвращается пустой queryset модели serializer_class.
+    """
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return self.serializer_class.Meta.model.objects.none()
+        return self.get_scoped_queryset()
+
+    def get_scoped_queryset(self):
+        raise NotImplementedError
+
+
+# -------------------------------------------------------------------------
+# 5. Запись вместе с журналом изменений
+# -------------------------------------------------------------------------
+
+class AtomicWriteMixin:
+    """
+    POST / PUT / PATCH одной транзакцией: post_save пишет журнал изменений (main/sync.py) уже после
+    UPDATE/INSERT, и в режиме autocommit строка данных и строки журнала коммитились бы по отдельности —
+    сбой между ними оставил бы изменение, которого нет в ленте /api/sync/.
+    delete() сам идет в транзакции (вместе с каскадом и post_delete), пакетная запись (BulkCreateMixin) —
+    в транзакции list-сериализатора.
+    """
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
@@ -2,6 +2,8 @@ from django.db import models
 
 from django.contrib.auth.models import AbstractUser
 
+from .expressions import DaysBetween
+
 
 # -------------------------------------------------------------------------
 # 1. Пользователи и Роли
@@ -85,6 +87,9 @@ class SteeringAxleModel(BaseHandbook):
 
 
 class ServiceType(BaseHandbook):
+    # Если не задана, прогноз ТО берет медиану интервалов между такими ТО по парку (main/forecast.py)
+    interval_hours = models.PositiveIntegerField(null=True, blank=True, verbose_name='Периодичность, м/час')
+
     class Meta:
         verbose_name = 'Вид ТО'
         verbose_name_plural = 'Справочник: Виды ТО'
@@ -149,10 +154,18 @@ class Machine(models.Model):
         verbose_name='Сервисная компания'
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+
     class Meta:
         verbose_name = 'Машина'
         verbose_name_plural = 'Машины'
         ordering = ['shipment_date']  # Сортировка по умолчанию (из ТЗ)
+        # Списки по ролям: фильтр по владельцу + сортировка по дате отгрузки (id — для курсора)
+        indexes = [
+            models.Index(fields=['shipment_date', 'id'], name='machine_shipment_idx'),
+            models.Index(fields=['client', 'shipment_date', 'id'], name='machine_client_shipment_idx'),
+            models.Index(fields=['service_company', 'shipment_date', 'id'], name='machine_service_shipment_idx'),
+        ]
 
     def __str__(self):
         return f"{self.technique_model} - {self.serial_number}"
@@ -177,18 +190,44 @@ class Maintenance(models.Model):
         verbose_name='Организация, проводившая ТО'
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+
     class Meta:
         verbose_name = 'ТО'
         verbose_name_plural = 'ТО'
         ordering = ['event_date']  # Сортировка по умолчанию
+        indexes = [
+            models.Index(fields=['event_date', 'id'], name='maintenance_event_idx'),
+            models.Index(fields=['machine', 'event_date', 'id'], name='maintenance_machine_event_idx'),
+        ]
 
     def __str__(self):
         return f"{self.service_type} - {self.machine.serial_number}"
 
 
+class ComplaintQuerySet(models.QuerySet):
+
+    def with_downtime(self):
+        """
+        Время простоя (дни) считается в SQL: по нему можно сортировать, фильтровать и агрегировать.
+        downtime_days — колонка в выборке; downtime — псевдоним для фильтров, сортировки и агрегатов
+        (alias не записывается в экземпляр и не конфликтует со свойством Complaint.downtime).
+        """
+        return self.annotate(downtime_days=DaysBetween('restoration_date', 'failure_date')).alias(
+            downtime=models.F('downtime_days')
+        )
+
+
+class ComplaintManager(models.Manager.from_queryset(ComplaintQuerySet)):
+
+    def get_queryset(self):
+        return super().get_queryset().with_downtime()
+
+
 class Complaint(models.Model):
     """
     Рекламация.
+    Менеджер по умолчанию добавляет аннотацию downtime_days (см. ComplaintQuerySet.with_downtime).
     """
     machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='complaints', verbose_name='Машина')
     failure_date = models.DateField(verbose_name='Дата отказа')
@@ -207,6 +246,8 @@ class Complaint(models.Model):
         verbose_name='Сервисная компания'
     )
 
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+
     @property
     def downtime(self):
         """
@@ -218,10 +259,147 @@ class Complaint(models.Model):
             return delta.days
         return 0
 
+    objects = ComplaintManager()
+
     class Meta:
         verbose_name = 'Рекламация'
         verbose_name_plural = 'Рекламации'
         ordering = ['failure_date']  # Сортировка по умолчанию
+        indexes = [
+            models.Index(fields=['failure_date', 'id'], name='complaint_failure_idx'),
+            models.Index(fields=['machine', 'failure_date', 'id'], name='complaint_machine_failure_idx'),
+        ]
 
     def __str__(self):
         return f"Отказ {self.failure_node} - {self.machine.serial_number}"
+
+
+# -------------------------------------------------------------------------
+# 5. Сводки надежности (аналитика по рекламациям)
+# -------------------------------------------------------------------------
+
+class MachineReliability(models.Model):
+    """
+    Сводка по рекламациям одной машины.
+    Поля машины продублированы, чтобы отчеты группировались и фильтровались по роли без JOIN.
+    Поддерживается сигналами (см. main/analytics.py), пересобирается командой rebuild_reliability.
+    """
+    machine = models.OneToOneField(Machine, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='reliability', verbose_name='Машина')
+    technique_model = models.ForeignKey(TechniqueModel, on_delete=models.CASCADE, related_name='+')
+    engine_model = models.ForeignKey(EngineModel, on_delete=models.CASCADE, related_name='+')
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service_company = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    failures = models.PositiveIntegerField(default=0, verbose_name='Количество отказов')
+    total_downtime = models.IntegerField(default=0, verbose_name='Суммарный простой, дней')
+    operating_hours = models.PositiveIntegerField(default=0, verbose_name='Наработка на последний отказ, м/час')
+
+    class Meta:
+        verbose_name = 'Сводка надежности машины'
+        verbose_name_plural = 'Сводки надежности машин'
+
+
+class FailureNodeReliability(models.Model):
+    """
+    Сводка по рекламациям машины в разрезе узла отказа.
+    """
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='+')
+    failure_node = models.ForeignKey(FailureNode, on_delete=models.CASCADE, related_name='+')
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service_company = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    failures = models.PositiveIntegerField(default=0, verbose_name='Количество отказов')
+    total_downtime = models.IntegerField(default=0, verbose_name='Суммарный простой, дней')
+
+    class Meta:
+        verbose_name = 'Сводка надежности узла'
+        verbose_name_plural = 'Сводки надежности узлов'
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'failure_node'], name='unique_machine_failure_node'),
+        ]
+
+
+# -------------------------------------------------------------------------
+# 6. Прогноз ТО
+# -------------------------------------------------------------------------
+
+class MaintenanceForecast(models.Model):
+    """
+    Прогноз следующего ТО машины по виду ТО.
+    Считается для всего парка одним проходом NumPy (см. main/forecast.py): наработка в сутки —
+    по показаниям счетчика в ТО и рекламациях, срок — по периодичности вида ТО.
+    Поддерживается сигналами, пересобирается командой rebuild_forecasts.
+    """
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='forecasts', verbose_name='Машина')
+    service_type = models.ForeignKey(ServiceType, on_delete=models.CASCADE, related_name='+', verbose_name='Вид ТО')
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    service_company = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    hours_per_day = models.FloatField(verbose_name='Наработка в сутки, м/час')
+    readings = models.PositiveIntegerField(default=0, verbose_name='Показаний счетчика')
+    last_reading_date = models.DateField(verbose_name='Дата последнего показания')
+    last_reading_hours = models.PositiveIntegerField(default=0, verbose_name='Последнее показание, м/час')
+    last_service_date = models.DateField(null=True, blank=True, verbose_name='Дата последнего такого ТО')
+    last_service_hours = models.PositiveIntegerField(null=True, blank=True,
+                                                     verbose_name='Наработка на последнем таком ТО, м/час')
+    interval_hours = models.PositiveIntegerField(verbose_name='Периодичность, м/час')
+    due_hours = models.PositiveIntegerField(verbose_name='Наработка к следующему ТО, м/час')
+    due_date = models.DateField(verbose_name='Прогноз даты следующего ТО')
+
+    class Meta:
+        verbose_name = 'Прогноз ТО'
+        verbose_name_plural = 'Прогнозы ТО'
+        ordering = ['due_date']
+        constraints = [
+            models.UniqueConstraint(fields=['machine', 'service_type'], name='unique_machine_service_type'),
+        ]
+        # Сортировка по сроку в области видимости роли (keyset-курсор по (due_date, id))
+        indexes = [
+            models.Index(fields=['due_date', 'id'], name='forecast_due_idx'),
+            models.Index(fields=['client', 'due_date', 'id'], name='forecast_client_due_idx'),
+            models.Index(fields=['service_company', 'due_date', 'id'], name='forecast_service_due_idx'),
+        ]
+
+
+# -------------------------------------------------------------------------
+# 7. Журнал изменений для синхронизации
+# -------------------------------------------------------------------------
+
+class Change(models.Model):
+    """
+    Запись журнала изменений машин, ТО и рекламаций (ленту отдает /api/sync/, см. main/sync.py).
+
+    Пишется сигналами в транзакции изменения данных (запись через API — AtomicWriteMixin, пакеты,
+    админка и команды — в своих transaction.atomic()); номер seq присваивается после коммита,
+    строго по возрастанию — клиент, получивший seq N, уже не увидит новых записей с номером меньше N.
+    client / service_company — стороны, которым изменение видно (как видимость машины).
+    """
+    class Action(models.TextChoices):
+        UPSERT = 'upsert', 'Создание или изменение'
+        DELETE = 'delete', 'Удаление'
+        # Объект остался, но стал не виден стороне (машину передали другому клиенту или сервису)
+        REVOKE = 'revoke', 'Потеря доступа'
+
+    seq = models.BigIntegerField(null=True, blank=True, unique=True, verbose_name='Номер изменения')
+    resource = models.CharField(max_length=20, verbose_name='Ресурс')
+    object_id = models.BigIntegerField(verbose_name='ID объекта')
+    action = models.CharField(max_length=10, choices=Action.choices, verbose_name='Действие')
+    # SET_NULL: удаление пользователя не стирает delete/revoke из ленты остальных (менеджера)
+    client = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    service_company = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        # Лента роли — диапазон по (сторона, seq)
+        indexes = [
+            models.Index(fields=['client', 'seq'], name='change_client_seq_idx'),
+            models.Index(fields=['service_company', 'seq'], name='change_service_seq_idx'),
+        ]
+
+
+class ChangeSequence(models.Model):
+    """Последний присвоенный номер журнала изменений (одна строка; блокируется при публикации)."""
+    value = models.BigIntegerField(default=0)
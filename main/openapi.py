@@ -0,0 +1,150 @@
+import hashlib
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect
+from django.urls import reverse
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.renderers import SwaggerUIRenderer
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from .conditional import etag_matches
+
+
+# -------------------------------------------------------------------------
+# 1. Описание API
+# -------------------------------------------------------------------------
+
+# Настройка мета-данных Swagger
+API_INFO = openapi.Info(
+    title="Service Poguze API",
+    default_version='v1',
+    description="API для сервиса обслуживания погрузчиков",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+
+# -------------------------------------------------------------------------
+# 2. Готовая схема
+# -------------------------------------------------------------------------
+
+class SchemaArtifact:
+    """
+    Схема OpenAPI, сгенерированная один раз.
+
+    При деплое ее записывает команда generate_openapi_schema (файл OPENAPI_SCHEMA_PATH);
+    если файла нет, схема генерируется при первом запросе и хранится в памяти процесса.
+    Версия — хэш содержимого: она же ETag и часть адреса, который можно кэшировать навсегда.
+    В DEBUG файл не используется — схема всегда соответствует текущему коду.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.content = None
+        self.version = None
+
+    @property
+    def path(self):
+        return Path(settings.OPENAPI_SCHEMA_PATH)
+
+    @staticmethod
+    def build():
+        """Схема всех эндпоинтов без привязки к запросу (хост и схема — из адреса страницы Swagger UI)."""
+        generator = schema_view.generator_class(API_INFO)
+        return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+    def write(self):
+        content = self.build()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_bytes(content)
+        # Атомарная замена: воркеры не прочитают наполовину записанный файл
+        tmp_path.replace(self.path)
+        self.set(content)
+        return self.version
+
+    def load(self):
+        if self.content is None:
+            with self.lock:
+                if self.content is None:
+                    if not settings.DEBUG and self.path.exists():
+                        self.set(self.path.read_bytes())
+                    else:
+                        self.set(self.build())
+        return self.content, self.version
+
+    def set(self, content):
+        self.version = hashlib.sha256(content).hexdigest()[:16]
+        self.content = content
+
+    def reset(self):
+        self.content = self.version = None
+
+
+schema_artifact = SchemaArtifact()
+
+
+# -------------------------------------------------------------------------
+# 3. Представления
+# -------------------------------------------------------------------------
+
+def schema_response(request, immutable):
+    content, version = schema_artifact.load()
+    etag = f'"{version}"'
+    if immutable:
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = f"public, max-age={settings.OPENAPI_SCHEMA_MAX_AGE}"
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def openapi_schema(request, version=None):
+    """
+    GET swagger/schema.json — текущая схема (короткий max-age + ETag);
+    GET swagger/schema.<версия>.json — неизменяемая версия (кэшируется на год).
+    Устаревшая версия перенаправляет на актуальную.
+    """
+    if version is None:
+        return schema_response(request, immutable=False)
+    _, current = schema_artifact.load()
+    if version != current:
+        return HttpResponseRedirect(reverse('openapi_schema_version', args=[current]))
+    return schema_response(request, immutable=True)
+
+
+class CachedSwaggerUIRenderer(SwaggerUIRenderer):
+    """Swagger UI загружает схему по версионированному адресу, а не через ?format=openapi."""
+
+    def get_swagger_ui_settings(self):
+        data = super().get_swagger_ui_settings()
+        _, version = schema_artifact.load()
+        data['url'] = reverse('openapi_schema_version', args=[version])
+        return data
+
+
+# Страница без схемы: drf-yasg для HTML строит лишь заголовок (patterns=[])
+swagger_ui_view = schema_view.as_cached_view(renderer_classes=[CachedSwaggerUIRenderer])
+
+
+def swagger_ui(request):
+    # Старые ссылки swagger/?format=openapi
+    if request.GET.get('format') in ('openapi', 'json'):
+        return openapi_schema(request)
+    return swagger_ui_view(request)
@@ -0,0 +1,324 @@
+import base64
+import json
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage, Page
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination, replace_query_param, remove_query_param
+from rest_framework.response import Response
+
+from .conditional import change_versions
+
+
+# -------------------------------------------------------------------------
+# 1. Постраничная пагинация с выбором режима
+# -------------------------------------------------------------------------
+
+class HybridPagination(PageNumberPagination):
+    """
+    Пагинация по умолчанию для API.
+
+    - Без параметров работает как обычная PageNumberPagination (page=N, count).
+    - С ?pagination=cursor (или ?cursor=...) переключается в keyset-режим:
+      страница выбирается условием WHERE по (поле сортировки, id),
+      без OFFSET и без COUNT(*), поэтому страница N стоит столько же, сколько первая.
+    - С ?pagination=nocount — номера страниц без COUNT(*): берется на одну строку больше,
+      ответ содержит has_next.
+
+    В режимах без подсчета общее число строк отдается только по запросу:
+    ?count=estimate — оценка (estimated_count), ?count=exact — точный COUNT(*) (count).
+
+    Размер страницы задается клиентом через ?page_size=, но не больше max_page_size.
+    Для async-представлений — apaginate_queryset: те же режимы, строки читаются через acount() и async for.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+    nocount_mode = 'nocount'
+    count_query_param = 'count'
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.mode_query_param)
+        self.cursor_mode = mode == 'cursor' or self.cursor_query_param in request.query_params
+        self.without_count = not self.cursor_mode and mode == self.nocount_mode
+        if not self.cursor_mode and not self.without_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.totals = totals(queryset, request, view, request.query_params.get(self.count_query_param))
+        if self.cursor_mode:
+            return self.paginate_keyset(queryset, request, view)
+        return self.paginate_without_count(queryset, request)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для async-представлений: запросы страницы — без синхронного потока."""
+        mode = request.query_params.get(self.mode_query_param)
+        self.cursor_mode = mode == 'cursor' or self.cursor_query_param in request.query_params
+        self.without_count = not self.cursor_mode and mode == self.nocount_mode
+        if not self.cursor_mode and not self.without_count:
+            return await self.apaginate_numbered(queryset, request)
+
+        self.totals = await atotals(queryset, request, view, request.query_params.get(self.count_query_param))
+        if self.cursor_mode:
+            queryset = self.get_keyset_queryset(queryset, request, view)
+            return self.keyset_page([item async for item in queryset])
+        return self.page_without_count([item async for item in queryset[self.without_count_slice(request)]])
+
+    async def apaginate_numbered(self, queryset, request):
+        """Номера страниц, как PageNumberPagination.paginate_queryset, но COUNT(*) — через acount()."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count у Paginator — cached_property: посчитанное значение он не запрашивает повторно
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        self.page = Page([item async for item in queryset[bottom:bottom + page_size]], number, paginator)
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode and not self.without_count:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('has_next', self.has_next),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            *self.totals.items(),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if self.without_count:
+            if not self.has_next:
+                return None
+            return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.number + 1)
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page_items[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.without_count:
+            url = self.request.build_absolute_uri()
+            if self.number == 1:
+                return None
+            if self.number == 2:
+                return remove_query_param(url, self.page_query_param)
+            return replace_query_param(url, self.page_query_param, self.number - 1)
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.page_items[0], reverse=True)
+
+    # ---------------------------------------------------------------------
+    # Номера страниц без COUNT(*)
+    # ---------------------------------------------------------------------
+
+    def paginate_without_count(self, queryset, request):
+        return self.page_without_count(list(queryset[self.without_count_slice(request)]))
+
+    def without_count_slice(self, request):
+        """OFFSET + LIMIT page_size + 1: лишняя строка показывает, есть ли следующая страница."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        try:
+            self.number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.number = 0
+        if self.number < 1:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.number - 1) * self.page_size
+        return slice(offset, offset + self.page_size + 1)
+
+    def page_without_count(self, items):
+        if not items and self.number > 1:
+            raise NotFound(self.invalid_page_message)
+        self.has_next = len(items) > self.page_size
+        return items[:self.page_size]
+
+    # ---------------------------------------------------------------------
+    # Keyset-режим
+    # ---------------------------------------------------------------------
+
+    def paginate_keyset(self, queryset, request, view):
+        return self.keyset_page(list(self.get_keyset_queryset(queryset, request, view)))
+
+    def keyset_page(self, items):
+        # Запрос берет на одну строку больше, чтобы узнать, есть ли следующая страница
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+
+        if self.reverse:
+            items.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page_items = items
+        return items
+
+    def get_keyset_queryset(self, queryset, request, view):
+        """Запрос одной страницы: WHERE по позиции курсора + ORDER BY + LIMIT page_size + 1."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_cursor_ordering(request, queryset, view)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+
+        self.position = position = self.decode_cursor(request, queryset)
+        self.reverse = bool(position and position['r'])
+
+        # Для движения назад разворачиваем направление и потом переворачиваем результат
+        scan_descending = descending != self.reverse
+        prefix = '-' if scan_descending else ''
+        queryset = queryset.order_by(prefix + field, prefix + self.tiebreaker)
+
+        if position is not None:
+            # (field, id) > (v, pk), записанное так, чтобы первое условие давало
+            # упорядоченный диапазон по составному индексу, а OR был лишь доп. фильтром
+            lookup = 'lt' if scan_descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}e': position['v']}),
+                Q(**{f'{field}__{lookup}': position['v']}) | Q(**{f'{self.tiebreaker}__{lookup}': position['pk']}),
+            )
+        return queryset[:self.page_size + 1]
+
+    def get_cursor_ordering(self, request, queryset, view):
+        """
+        Единственное поле сортировки для курсора.
+        Берется из OrderingFilter (?ordering=), иначе из Meta.ordering модели.
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = queryset.model._meta.ordering or [self.tiebreaker]
+        return ordering[0]
+
+    def get_position(self, item):
+        field = self.ordering.lstrip('-')
+        if isinstance(item, dict):
+            return item[field], item[self.tiebreaker]
+        return getattr(item, field), getattr(item, self.tiebreaker)
+
+    def encode_cursor(self, item, reverse):
+        value, pk = self.get_position(item)
+        payload = {
+            'o': self.ordering,
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'pk': pk,
+            'r': int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        url = remove_query_param(url, self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(force_str(encoded).encode('ascii')))
+            ordering = payload['o']
+            # Курсор, выданный для другой сортировки, применять нельзя
+            if ordering != self.ordering:
+                raise NotFound(self.invalid_cursor_message)
+            # Позиция приводится к типу поля: подделанное значение не должно дойти до WHERE
+            position = {
+                'v': cursor_field(queryset, ordering.lstrip('-')).to_python(payload['v']),
+                'pk': cursor_field(queryset, self.tiebreaker).to_python(payload['pk']),
+                'r': int(payload['r']),
+            }
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if position['v'] is None or position['pk'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+def cursor_field(queryset, name):
+    """Поле модели (или output_field аннотации) — по нему проверяется значение из курсора."""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    return queryset.model._meta.get_field(name)
+
+
+# -------------------------------------------------------------------------
+# 2. Общее число строк для режимов без подсчета
+# -------------------------------------------------------------------------
+
+# Параметры, не меняющие набор строк: с ними (и с пустыми фильтрами) список считается нефильтрованным
+COUNT_NEUTRAL_PARAMS = {'page', 'page_size', 'pagination', 'cursor', 'count', 'ordering', 'fields', 'expand', 'format'}
+
+
+def totals(queryset, request, view, requested):
+    """Поля ответа с общим числом строк: только по ?count=exact или ?count=estimate."""
+    if requested == 'exact':
+        return {'count': queryset.count()}
+    if requested == 'estimate':
+        return {'estimated_count': estimate_count(queryset, request, view)}
+    return {}
+
+
+async def atotals(queryset, request, view, requested):
+    """totals для async-представлений. Оценка (EXPLAIN, кэш счетчика) асинхронного API не имеет — идет в поток."""
+    if requested == 'exact':
+        return {'count': await queryset.acount()}
+    if requested == 'estimate':
+        return {'estimated_count': await sync_to_async(estimate_count)(queryset, request, view)}
+    return {}
+
+
+def estimate_count(queryset, request, view):
+    """
+    Оценка числа строк без точного COUNT(*) на каждый запрос.
+
+    - PostgreSQL: оценка планировщика (EXPLAIN) — с любыми фильтрами, точность зависит от ANALYZE;
+    - иначе без фильтров: точный COUNT(*), закэшированный на PAGINATION_COUNT_CACHE_TTL
+      по версии данных в области видимости (ChangeVersions) — изменения сбрасывают его сразу;
+    - иначе None.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    resource = getattr(view, 'conditional_resource', None)
+    scope = view.get_version_scope() if resource else None
+    if scope is None or is_filtered(request):
+        return None
+    version, generation = change_versions.get(resource, scope)
+    key = f'pagination_count:{resource}:{scope}:{version}:{generation}'
+    return cache.get_or_set(key, queryset.count, getattr(settings, 'PAGINATION_COUNT_CACHE_TTL', 5 * 60))
+
+
+def is_filtered(request):
+    return any(
+        value for name, value in request.query_params.items() if name not in COUNT_NEUTRAL_PARAMS
+    )
@@ -1,3 +1,6 @@
+import ipaddress
+
+from django.conf import settings
 from rest_framework import permissions
 from .models import User
 
@@ -22,3 +25,18 @@ class IsClient(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == User.Role.CLIENT
 
+
+class IsInternalNetwork(permissions.BasePermission):
+    """
+    Разрешает доступ с адресов из METRICS_ALLOWED_NETWORKS (служебные эндпоинты для мониторинга).
+    Проверяется REMOTE_ADDR, а не X-Forwarded-For: заголовок может подставить клиент.
+    """
+    def has_permission(self, request, view):
+        try:
+            address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+        except ValueError:
+            return False
+        return any(
+            address in ipaddress.ip_network(network, strict=False)
+            for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', ())
+        )
@@ -0,0 +1,51 @@
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# -------------------------------------------------------------------------
+# 1. JSON через orjson
+# -------------------------------------------------------------------------
+#
+# Вывод совпадает с JSONRenderer DRF в компактном режиме (UNICODE_JSON, COMPACT_JSON):
+# кириллица без \u-экранирования, разделители без пробелов.
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def dumps(data):
+    """Компактный JSON в байтах. Типы, которых orjson не знает (Decimal, ленивые строки...), — как у DRF."""
+    content = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+    # Как и DRF: U+2028/U+2029 экранируются, чтобы ответ можно было вставить в <script>
+    if b'\xe2\x80' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Ответы с отступами (Browsable API, Accept: ...; indent=4)
+    и нестандартные настройки JSON отдаются стандартным JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type or '', renderer_context or {}) or not self.compact_defaults():
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+    def compact_defaults(self):
+        return self.ensure_ascii is False and self.compact and self.strict and self.encoder_class is JSONEncoder
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser на orjson: тело запроса (в т.ч. пакеты bulk) разбирается без json.load."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,152 @@
+from importlib import import_module
+
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .analytics import scope_for
+from .handbooks import handbook_registry
+from .models import (
+    TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel
+)
+
+
+# -------------------------------------------------------------------------
+# 1. Поиск машин по заводским номерам, грузополучателю и адресу
+# -------------------------------------------------------------------------
+#
+# Индексы создаются миграцией 0004_machine_search:
+# - PostgreSQL: GIN-индекс pg_trgm по выражению SEARCH_DOCUMENT (ILIKE + similarity);
+# - SQLite: FTS5-таблица main_machine_search (tokenize=trigram), которую ведут триггеры
+#   (SQLite теряет их, когда миграция пересоздает main_machine, — после каждого migrate
+#   их восстанавливает обработчик post_migrate, см. restore_fts_triggers);
+# - другие БД и запросы короче 3 символов: обычный icontains.
+
+SEARCH_FIELDS = (
+    'serial_number', 'engine_number', 'transmission_number', 'drive_axle_number',
+    'steering_axle_number', 'consignee', 'delivery_address',
+)
+SEARCH_DOCUMENT = " || ' ' || ".join(f'"main_machine"."{field}"' for field in SEARCH_FIELDS)
+FTS_TABLE = 'main_machine_search'
+MIN_INDEXED_QUERY = 3  # триграммы
+
+HANDBOOK_FIELDS = {
+    'technique_model': TechniqueModel,
+    'engine_model': EngineModel,
+    'transmission_model': TransmissionModel,
+    'drive_axle_model': DriveAxleModel,
+    'steering_axle_model': SteeringAxleModel,
+}
+
+
+def handbook_match(query):
+    """Условие по моделям (название справочника содержит запрос) — через реестр, без JOIN."""
+    condition = Q(pk__in=[])
+    for field, model in HANDBOOK_FIELDS.items():
+        ids = handbook_registry.ids_matching(model, query, 'icontains')
+        if ids:
+            condition |= Q(**{f'{field}__in': ids})
+    return condition
+
+
+def search_machines(queryset, user, query, limit):
+    """
+    Машины из queryset (уже ограниченного ролью), подходящие под query,
+    в порядке релевантности. У каждой машины проставлен атрибут search_rank.
+    """
+    query = query.strip()
+    if len(query) >= MIN_INDEXED_QUERY:
+        if connection.vendor == 'postgresql':
+            return _search_postgresql(queryset, query, limit)
+        if connection.vendor == 'sqlite' and _fts_table_exists():
+            return _search_sqlite(queryset, user, query, limit)
+    return _search_fallback(queryset, query, limit)
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _search_postgresql(queryset, query, limit):
+    return list(
+        queryset
+        .filter(
+            RawSQL(f'({SEARCH_DOCUMENT}) ILIKE %s', [f'%{_escape_like(query)}%'], output_field=BooleanField())
+            | handbook_match(query)
+        )
+        .annotate(search_rank=RawSQL(f'word_similarity(%s, {SEARCH_DOCUMENT})', [query],
+                                     output_field=FloatField()))
+        .order_by('-search_rank', 'id')[:limit]
+    )
+
+
+def _search_sqlite(queryset, user, query, limit):
+    scope = scope_for(user)
+    if scope is None:
+        return []
+    where = [f'{FTS_TABLE} MATCH %s']
+    params = ['"%s"' % query.replace('"', '""')]
+    for field, value in scope.items():
+        where.append(f'{field}_id = %s')
+        params.append(value.pk)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, rank FROM {FTS_TABLE} WHERE {" AND ".join(where)} ORDER BY rank LIMIT %s',
+            params + [limit]
+        )
+        # bm25: чем меньше, тем релевантнее
+        ranks = {pk: -rank for pk, rank in cursor.fetchall()}
+
+    if len(ranks) < limit:
+        extra = queryset.filter(handbook_match(query)).exclude(pk__in=ranks)
+        for pk in extra.values_list('pk', flat=True)[:limit - len(ranks)]:
+            ranks[pk] = 0.0
+
+    machines = list(queryset.filter(pk__in=ranks))
+    for machine in machines:
+        machine.search_rank = ranks[machine.pk]
+    return sorted(machines, key=lambda machine: (-machine.search_rank, machine.pk))
+
+
+def _search_fallback(queryset, query, limit):
+    condition = handbook_match(query)
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    machines = list(queryset.filter(condition).order_by('serial_number')[:limit])
+    for machine in machines:
+        machine.search_rank = 0.0
+    return machines
+
+
+_fts_checked = None
+
+
+def _fts_table_exists():
+    global _fts_checked
+    if _fts_checked is None:
+        _fts_checked = FTS_TABLE in connection.introspection.table_names()
+    return _fts_checked
+
+
+def fts_triggers(using='default'):
+    """Имена триггеров FTS5-таблицы, которые есть в БД."""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%'])
+        return {name for name, in cursor.fetchall()}
+
+
+def restore_fts_triggers(using='default'):
+    """
+    Пересоздает триггеры FTS5 (SQLite), если таблица поиска есть.
+    Текст триггеров — из миграции 0004_machine_search, чтобы он был в одном месте.
+    """
+    global _fts_checked
+    db = connections[using]
+    if db.vendor != 'sqlite' or FTS_TABLE not in db.introspection.table_names():
+        return
+    create_fts_triggers = import_module('main.migrations.0004_machine_search').create_fts_triggers
+    with db.cursor() as cursor:
+        # create_fts_triggers ждет объект с execute(sql) — курсор подходит
+        create_fts_triggers(cursor)
+    _fts_checked = None
@@ -1,9 +1,17 @@
 from rest_framework import serializers
+from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db import transaction
+from django.utils import timezone
 from .models import (
-    User, Machine, Maintenance, Complaint,
+    User, Machine, Maintenance, Complaint, MaintenanceForecast,
     TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel,
     SteeringAxleModel, ServiceType, FailureNode, RecoveryMethod
 )
+from .analytics import refresh_reliability
+from .forecast import refresh_after_commit
+from .sync import log_changes
+from .conditional import change_versions, bump_after_commit
+from .handbooks import handbook_registry
 from datetime import date
 
 
@@ -58,6 +66,27 @@ class RecoveryMethodSerializer(BaseHandbookSerializer):
         model = RecoveryMethod
 
 
+class HandbookSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField по названию справочника.
+    При записи название ищется в handbook_registry, а не отдельным запросом на каждое поле.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('slug_field', 'name')
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (str, int, float)):
+            self.fail('invalid')
+        try:
+            return handbook_registry.get_instance(self.get_queryset().model, str(data))
+        except ObjectDoesNotExist:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=str(data))
+        except MultipleObjectsReturned:
+            self.fail('invalid')
+
+
 # -------------------------------------------------------------------------
 # 2. Сериализаторы Пользователя
 # -------------------------------------------------------------------------
@@ -70,16 +99,173 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 # -------------------------------------------------------------------------
-# 3. Основные Сериализаторы (Машина, ТО, Рекламация)
+# 3. Пакетная запись (bulk)
+# -------------------------------------------------------------------------
+
+class PrefetchedSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField, который при пакетной записи берет объект из словаря,
+    заранее загруженного BulkListSerializer одним запросом на весь пакет.
+    Вне пакета работает как обычный SlugRelatedField.
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched_slugs', {}).get(self.field_name)
+        if prefetched is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (str, int)):
+            self.fail('invalid')
+        try:
+            return prefetched[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=str(data))
+
+
+def row_errors(errors):
+    """{"номер строки": ошибки} из пар (номер, ошибки); строки без ошибок пропускаются."""
+    return {str(index): error for index, error in errors if error}
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    Список для пакетного создания записей.
+
+    - Значения PrefetchedSlugRelatedField (машины, пользователи) загружаются
+      одним запросом на поле; справочники берутся из handbook_registry.
+    - Каждая строка проверяется дочерним сериализатором. Ошибки строк (и повторы ключа
+      при upsert) возвращаются одним форматом — словарем {"номер строки с 0": ошибки},
+      строки без ошибок в него не попадают.
+    - Запись через bulk_create в одной транзакции.
+    - Если задан upsert_key и в контексте upsert=True, строки с уже существующим
+      ключом обновляются через bulk_update — только записи из scoped_queryset контекста
+      (видимость по роли); ключ чужой записи — ошибка строки.
+    """
+    upsert_key = None
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.prefetch_slugs(data)
+        try:
+            validated = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            # ListSerializer отдает список по всем строкам (пустые словари у валидных)
+            if isinstance(exc.detail, list):
+                raise serializers.ValidationError(row_errors(enumerate(exc.detail)))
+            raise
+        if self.upsert_key and self.context.get('upsert'):
+            self.check_duplicate_keys(validated)
+        return validated
+
+    def prefetch_slugs(self, data):
+        prefetched = {}
+        for name, field in self.child.fields.items():
+            if not isinstance(field, PrefetchedSlugRelatedField) or field.read_only:
+                continue
+            values = {
+                str(row[name]) for row in data
+                if isinstance(row, dict) and isinstance(row.get(name), (str, int))
+                and not isinstance(row.get(name), bool)
+            }
+            queryset = field.get_queryset().filter(**{f'{field.slug_field}__in': values})
+            prefetched[name] = {str(getattr(obj, field.slug_field)): obj for obj in queryset}
+        self.context['prefetched_slugs'] = prefetched
+
+    def upsert_values(self, attrs):
+        return tuple(
+            getattr(attrs[name], 'pk', attrs[name]) for name in self.upsert_key
+        )
+
+    def check_duplicate_keys(self, validated):
+        seen = set()
+        errors = []
+        for index, attrs in enumerate(validated):
+            key = self.upsert_values(attrs)
+            if key in seen:
+                errors.append((index, {self.upsert_key[-1]: ['Повторяющаяся запись в пакете.']}))
+            seen.add(key)
+        if errors:
+            raise serializers.ValidationError(row_errors(errors))
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            if self.upsert_key and self.context.get('upsert'):
+                self.match_existing(model, objs, validated_data)
+                fields = sorted(
+                    {name for attrs in validated_data for name in attrs} - set(self.upsert_key)
+                )
+                to_update = [obj for obj in objs if obj.pk is not None]
+                # bulk_update не заполняет auto_now — updated_at проставляем сами
+                now = timezone.now()
+                for obj in to_update:
+                    obj.updated_at = now
+                model.objects.bulk_update(to_update, fields + ['updated_at'], batch_size=self.batch_size)
+            to_create = [obj for obj in objs if obj.pk is None]
+            model.objects.bulk_create(to_create, batch_size=self.batch_size)
+            # Сигналов нет — версии для условных GET сбрасываем явно
+            bump_after_commit(change_versions.bump_machines, {obj.machine_id for obj in objs},
+                              [model._meta.model_name])
+            # ...и прогнозы ТО: в ТО и рекламациях новые показания счетчика
+            refresh_after_commit(obj.machine_id for obj in objs)
+            # Журнал для /api/sync/ пишется в той же транзакции
+            log_changes(objs)
+        return objs
+
+    def match_existing(self, model, objs, validated_data):
+        """
+        Проставляет pk объектам, ключ которых уже есть в БД.
+        Ключ ищется по всей таблице (иначе чужая запись получила бы дубль), а обновлять можно
+        только записи из scoped_queryset — остальные строки возвращаются ошибками.
+        """
+        attnames = [model._meta.get_field(name).attname for name in self.upsert_key]
+        keys = [self.upsert_values(attrs) for attrs in validated_data]
+        lookup = {
+            f'{attname}__in': {key[i] for key in keys}
+            for i, attname in enumerate(attnames)
+        }
+        existing = {
+            tuple(row[:-1]): row[-1]
+            for row in model.objects.select_for_update().filter(**lookup).values_list(*attnames, 'pk')
+        }
+        scoped = self.context.get('scoped_queryset')
+        visible = set(
+            scoped.filter(pk__in=existing.values()).order_by().values_list('pk', flat=True)
+        ) if scoped is not None and existing else set()
+        errors = []
+        for index, (obj, key) in enumerate(zip(objs, keys)):
+            obj.pk = existing.get(key)
+            if obj.pk is not None and obj.pk not in visible:
+                errors.append((index, {self.upsert_key[-1]: ['Нет доступа к записи с таким ключом.']}))
+        if errors:
+            raise serializers.ValidationError(row_errors(errors))
+
+
+class MaintenanceListSerializer(BulkListSerializer):
+    upsert_key = ('machine', 'order_number')
+
+
+class ComplaintListSerializer(BulkListSerializer):
+
+    def create(self, validated_data):
+        objs = super().create(validated_data)
+        # bulk_create не отправляет сигналы — сводки надежности обновляем явно
+        refresh_reliability(obj.machine_id for obj in objs)
+        return objs
+
+
+# -------------------------------------------------------------------------
+# 4. Основные Сериализаторы (Машина, ТО, Рекламация)
 # -------------------------------------------------------------------------
 
 class MachineSerializer(serializers.ModelSerializer):
 
-    technique_model = serializers.SlugRelatedField(slug_field='name', queryset=TechniqueModel.objects.all())
-    engine_model = serializers.SlugRelatedField(slug_field='name', queryset=EngineModel.objects.all())
-    transmission_model = serializers.SlugRelatedField(slug_field='name', queryset=TransmissionModel.objects.all())
-    drive_axle_model = serializers.SlugRelatedField(slug_field='name', queryset=DriveAxleModel.objects.all())
-    steering_axle_model = serializers.SlugRelatedField(slug_field='name', queryset=SteeringAxleModel.objects.all())
+    technique_model = HandbookSlugRelatedField(queryset=TechniqueModel.objects.all())
+    engine_model = HandbookSlugRelatedField(queryset=EngineModel.objects.all())
+    transmission_model = HandbookSlugRelatedField(queryset=TransmissionModel.objects.all())
+    drive_axle_model = HandbookSlugRelatedField(queryset=DriveAxleModel.objects.all())
+    steering_axle_model = HandbookSlugRelatedField(queryset=SteeringAxleModel.objects.all())
 
     client = serializers.SlugRelatedField(slug_field='username', queryset=User.objects.filter(role=User.Role.CLIENT))
     service_company = serializers.SlugRelatedField(slug_field='username',
@@ -97,11 +283,11 @@ class MachineSerializer(serializers.ModelSerializer):
 
 
 class MaintenanceSerializer(serializers.ModelSerializer):
-    service_type = serializers.SlugRelatedField(slug_field='name', queryset=ServiceType.objects.all())
-    service_company = serializers.SlugRelatedField(slug_field='username',
-                                                   queryset=User.objects.filter(role__in=[User.Role.SERVICE, User.Role.MANAGER]))
+    service_type = HandbookSlugRelatedField(queryset=ServiceType.objects.all())
+    service_company = PrefetchedSlugRelatedField(slug_field='username',
+                                                 queryset=User.objects.filter(role__in=[User.Role.SERVICE, User.Role.MANAGER]))
 
-    machine = serializers.SlugRelatedField(slug_field='serial_number', queryset=Machine.objects.all())
+    machine = PrefetchedSlugRelatedField(slug_field='serial_number', queryset=Machine.objects.all())
 
     def validate_event_date(self, value):
         if value > date.today():
@@ -114,14 +300,15 @@ class MaintenanceSerializer(serializers.ModelSerializer):
             'id', 'machine', 'service_type', 'event_date', 'operating_hours',
             'order_number', 'order_date', 'service_company'
         ]
+        list_serializer_class = MaintenanceListSerializer
 
 
 class ComplaintSerializer(serializers.ModelSerializer):
-    failure_node = serializers.SlugRelatedField(slug_field='name', queryset=FailureNode.objects.all())
-    recovery_method = serializers.SlugRelatedField(slug_field='name', queryset=RecoveryMethod.objects.all())
-    service_company = serializers.SlugRelatedField(slug_field='username',
-                                                   queryset=User.objects.filter(role__in=[User.Role.SERVICE, User.Role.MANAGER]))
-    machine = serializers.SlugRelatedField(slug_field='serial_number', queryset=Machine.objects.all())
+    failure_node = HandbookSlugRelatedField(queryset=FailureNode.objects.all())
+    recovery_method = HandbookSlugRelatedField(queryset=RecoveryMethod.objects.all())
+    service_company = PrefetchedSlugRelatedField(slug_field='username',
+                                                 queryset=User.objects.filter(role__in=[User.Role.SERVICE, User.Role.MANAGER]))
+    machine = PrefetchedSlugRelatedField(slug_field='serial_number', queryset=Machine.objects.all())
 
     downtime = serializers.IntegerField(read_only=True)
 
@@ -132,6 +319,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'failure_description', 'recovery_method', 'spare_parts_used',
             'restoration_date', 'service_company', 'downtime'
         ]
+        list_serializer_class = ComplaintListSerializer
 
     def validate_failure_date(self, value):
         if value > date.today():
@@ -168,4 +356,30 @@ class MachineShortSerializer(serializers.ModelSerializer):
             'serial_number', 'technique_model', 'engine_model', 'engine_number',
             'transmission_model', 'transmission_number', 'drive_axle_model', 'drive_axle_number',
             'steering_axle_model', 'steering_axle_number'
-        ]
\ No newline at end of file
+        ]
+
+
+# -------------------------------------------------------------------------
+# 5. Прогноз ТО
+# -------------------------------------------------------------------------
+
+class MaintenanceForecastSerializer(serializers.ModelSerializer):
+    """Прогноз следующего ТО (только чтение). days_left и overdue — на сегодняшнюю дату."""
+    machine = serializers.SlugRelatedField(slug_field='serial_number', read_only=True)
+    service_type = serializers.SlugRelatedField(slug_field='name', read_only=True)
+    days_left = serializers.SerializerMethodField()
+    overdue = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MaintenanceForecast
+        fields = [
+            'id', 'machine', 'service_type', 'hours_per_day', 'readings', 'last_reading_date',
+            'last_reading_hours', 'last_service_date', 'last_service_hours', 'interval_hours',
+            'due_hours', 'due_date', 'days_left', 'overdue'
+        ]
+
+    def get_days_left(self, obj):
+        return (obj.due_date - date.today()).days
+
+    def get_overdue(self, obj):
+        return obj.due_date < date.today()
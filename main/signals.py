@@ -0,0 +1,268 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .analytics import refresh_reliability
+from .authentication import token_cache
+from .cache import guest_search_cache
+from .conditional import change_versions, bump_after_commit
+from .forecast import PARAMETERS_KEY, refresh_after_commit, rebuild_forecasts
+from .sync import log_changes, owners_of
+from .search import restore_fts_triggers
+from .handbooks import HANDBOOKS, handbook_registry
+from .models import (
+    User, Machine, Maintenance, Complaint, ServiceType, Change,
+    TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel
+)
+
+
+# -------------------------------------------------------------------------
+# 1. Инвалидация кэша гостевого поиска
+# -------------------------------------------------------------------------
+
+# Справочники, названия которых попадают в MachineShortSerializer
+GUEST_HANDBOOKS = (TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel)
+
+
+@receiver(pre_save, sender=Machine)
+def remember_old_machine_state(sender, instance, **kwargs):
+    """
+    При смене заводского номера нужно сбросить и старый ключ,
+    при смене владельцев — версии прежних областей видимости (раздел 4).
+    """
+    instance._old_serial_number = None
+    instance._old_owners = None
+    if instance.pk:
+        old = Machine.objects.filter(pk=instance.pk).values_list(
+            'serial_number', 'client_id', 'service_company_id'
+        ).first()
+        if old:
+            instance._old_serial_number = old[0]
+            instance._old_owners = old[1:]
+
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+def invalidate_guest_search_machine(sender, instance, **kwargs):
+    # Как у реестра справочников (раздел 2): сразу и после коммита — гостевой запрос
+    # до коммита мог снова закэшировать прежнюю строку, и она жила бы до конца TTL
+    serial_numbers = (instance.serial_number, getattr(instance, '_old_serial_number', None))
+    guest_search_cache.invalidate(*serial_numbers)
+    transaction.on_commit(lambda: guest_search_cache.invalidate(*serial_numbers))
+
+
+def invalidate_guest_search_handbook(sender, instance, **kwargs):
+    guest_search_cache.invalidate_all()
+    transaction.on_commit(guest_search_cache.invalidate_all)
+
+
+for handbook in GUEST_HANDBOOKS:
+    post_save.connect(invalidate_guest_search_handbook, sender=handbook)
+    post_delete.connect(invalidate_guest_search_handbook, sender=handbook)
+
+
+# -------------------------------------------------------------------------
+# 2. Инвалидация реестра справочников
+# -------------------------------------------------------------------------
+
+def invalidate_handbook_registry(sender, instance, **kwargs):
+    # Сразу — для текущего процесса, и после коммита — чтобы другие процессы
+    # не успели перечитать незакоммиченное состояние под новой версией
+    handbook_registry.invalidate()
+    transaction.on_commit(handbook_registry.invalidate)
+
+
+for handbook in HANDBOOKS.values():
+    post_save.connect(invalidate_handbook_registry, sender=handbook)
+    post_delete.connect(invalidate_handbook_registry, sender=handbook)
+
+
+# -------------------------------------------------------------------------
+# 3. Сводки надежности
+# -------------------------------------------------------------------------
+
+@receiver(pre_save, sender=Complaint)
+def remember_old_complaint_machine(sender, instance, **kwargs):
+    """Если рекламацию перенесли на другую машину, пересчитать нужно обе."""
+    instance._old_machine_id = None
+    if instance.pk:
+        instance._old_machine_id = (
+            Complaint._base_manager.filter(pk=instance.pk).values_list('machine_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Complaint)
+@receiver(post_delete, sender=Complaint)
+def update_reliability_on_complaint(sender, instance, **kwargs):
+    machine_ids = {instance.machine_id, getattr(instance, '_old_machine_id', None)}
+    refresh_reliability(machine_ids - {None})
+
+
+@receiver(post_save, sender=Machine)
+def update_reliability_on_machine(sender, instance, created, **kwargs):
+    # Смена клиента/сервиса/модели меняет продублированные в сводке поля
+    if not created:
+        refresh_reliability([instance.pk])
+
+
+# -------------------------------------------------------------------------
+# 4. Версии для условных GET-запросов
+# -------------------------------------------------------------------------
+
+@receiver(post_save, sender=Machine)
+@receiver(post_delete, sender=Machine)
+def bump_machine_versions(sender, instance, **kwargs):
+    # От машины зависят и списки ТО/рекламаций (видимость, заводской номер)
+    owners = {(instance.client_id, instance.service_company_id)}
+    if getattr(instance, '_old_owners', None):
+        owners.add(instance._old_owners)
+    bump_after_commit(change_versions.bump_machines, [], owners=owners)
+
+
+@receiver(pre_save, sender=Maintenance)
+def remember_old_maintenance_machine(sender, instance, **kwargs):
+    instance._old_machine_id = None
+    if instance.pk:
+        instance._old_machine_id = (
+            Maintenance.objects.filter(pk=instance.pk).values_list('machine_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Maintenance)
+@receiver(post_delete, sender=Maintenance)
+def bump_maintenance_versions(sender, instance, **kwargs):
+    machine_ids = [instance.machine_id, getattr(instance, '_old_machine_id', None)]
+    bump_after_commit(change_versions.bump_machines, machine_ids, ['maintenance'])
+
+
+@receiver(post_save, sender=Complaint)
+@receiver(post_delete, sender=Complaint)
+def bump_complaint_versions(sender, instance, **kwargs):
+    # _old_machine_id запоминается в разделе 3
+    machine_ids = [instance.machine_id, getattr(instance, '_old_machine_id', None)]
+    bump_after_commit(change_versions.bump_machines, machine_ids, ['complaint'])
+
+
+def bump_all_versions(sender, instance, **kwargs):
+    # Названия справочников и логины пользователей есть во всех списках
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_after_commit(change_versions.bump_all)
+
+
+for model in list(HANDBOOKS.values()) + [User]:
+    post_save.connect(bump_all_versions, sender=model)
+    post_delete.connect(bump_all_versions, sender=model)
+
+
+# -------------------------------------------------------------------------
+# 5. Кэш токенов
+# -------------------------------------------------------------------------
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # Деактивация, смена роли и прочие изменения пользователя должны быть видны сразу
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate(*Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+# -------------------------------------------------------------------------
+# 6. Прогноз ТО
+# -------------------------------------------------------------------------
+
+@receiver(post_save, sender=Maintenance)
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_save, sender=Complaint)
+@receiver(post_delete, sender=Complaint)
+def update_forecasts_on_reading(sender, instance, **kwargs):
+    # Новое показание счетчика меняет наработку в сутки, ТО — еще и точку отсчета интервала
+    refresh_after_commit([instance.machine_id, getattr(instance, '_old_machine_id', None)])
+
+
+@receiver(post_save, sender=Machine)
+def update_forecasts_on_machine(sender, instance, **kwargs):
+    # Дата отгрузки — первое показание, клиент и сервис продублированы в прогнозе
+    refresh_after_commit([instance.pk])
+
+
+@receiver(post_save, sender=ServiceType)
+@receiver(post_delete, sender=ServiceType)
+def rebuild_forecasts_on_service_type(sender, instance, **kwargs):
+    # Периодичность вида ТО влияет на весь парк
+    cache.delete(PARAMETERS_KEY)
+    transaction.on_commit(rebuild_forecasts)
+
+
+# -------------------------------------------------------------------------
+# 7. Журнал изменений для синхронизации
+# -------------------------------------------------------------------------
+
+def revoked_owners(old, new):
+    """Стороны, потерявшие доступ: прежний клиент и (или) сервис, если они сменились."""
+    revoked = tuple(old_id if old_id != new_id else None for old_id, new_id in zip(old, new))
+    return revoked if any(revoked) else None
+
+
+@receiver(post_save, sender=Machine)
+def log_machine_change(sender, instance, **kwargs):
+    new = (instance.client_id, instance.service_company_id)
+    revoked = revoked_owners(instance._old_owners, new) if getattr(instance, '_old_owners', None) else None
+    if revoked:
+        # Вместе с машиной прежним сторонам пропадает, а новым появляется и ее история
+        history = (list(Maintenance.objects.filter(machine=instance).only('id'))
+                   + list(Complaint.objects.filter(machine=instance).only('id')))
+        log_changes([instance, *history], Change.Action.REVOKE, owners=revoked)
+        log_changes(history, owners=new)
+    log_changes([instance])
+
+
+@receiver(post_delete, sender=Machine)
+def log_machine_delete(sender, instance, **kwargs):
+    log_changes([instance], Change.Action.DELETE)
+
+
+@receiver(post_save, sender=Maintenance)
+@receiver(post_save, sender=Complaint)
+def log_history_change(sender, instance, **kwargs):
+    # _old_machine_id запоминается в разделах 3 и 4
+    old_machine_id = getattr(instance, '_old_machine_id', None)
+    if old_machine_id and old_machine_id != instance.machine_id:
+        old = Machine.objects.filter(pk=old_machine_id).values_list('client_id', 'service_company_id').first()
+        revoked = revoked_owners(old, owners_of(instance)) if old else None
+        if revoked:
+            log_changes([instance], Change.Action.REVOKE, owners=revoked)
+    log_changes([instance])
+
+
+@receiver(post_delete, sender=Maintenance)
+@receiver(post_delete, sender=Complaint)
+def log_history_delete(sender, instance, origin=None, **kwargs):
+    # При удалении машины каскадом владельцы берутся из нее, без запроса на каждую запись
+    if isinstance(origin, Machine) and origin.pk == instance.machine_id:
+        log_changes([instance], Change.Action.DELETE, owners=owners_of(origin))
+    else:
+        log_changes([instance], Change.Action.DELETE)
+
+
+# -------------------------------------------------------------------------
+# 8. Триггеры поиска после миграций
+# -------------------------------------------------------------------------
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using='default', **kwargs):
+    # SQLite пересоздает main_machine при многих изменениях схемы и теряет триггеры FTS5;
+    # восстанавливаем после каждого migrate, а не в каждой такой миграции
+    if sender.name == 'main':
+        restore_fts_triggers(using)
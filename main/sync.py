@@ -0,0 +1,171 @@
+import base64
+import json
+
+from django.db import transaction
+from django.db.models import F, Q, Min, Max
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+
+from .models import Change, ChangeSequence, Machine, Maintenance, Complaint, User
+
+
+# -------------------------------------------------------------------------
+# 1. Запись журнала
+# -------------------------------------------------------------------------
+#
+# Записи журнала вставляются в транзакции изменения, но без номера: номера присваивает
+# публикация после коммита под блокировкой строки ChangeSequence. Публикации идут строго
+# друг за другом, поэтому запись с номером N становится видна только вместе со всеми меньшими —
+# клиент, продвинувший курсор до N, ничего не пропустит, даже если транзакции коммитятся
+# не в том порядке, в каком начинались.
+
+RESOURCES = {
+    'machine': Machine,
+    'maintenance': Maintenance,
+    'complaint': Complaint,
+}
+RESOURCE_NAMES = {model: name for name, model in RESOURCES.items()}
+
+
+def owners_of(obj):
+    """(клиент, сервис) — стороны, которым объект виден (видимость ТО и рекламаций — по машине)."""
+    if isinstance(obj, Machine):
+        return obj.client_id, obj.service_company_id
+    return obj.machine.client_id, obj.machine.service_company_id
+
+
+def log_changes(objs, action=Change.Action.UPSERT, owners=None):
+    """
+    Записывает изменения объектов в журнал текущей транзакции.
+    owners — стороны изменения, если это не текущие владельцы объекта (revoke, удаление каскадом).
+    """
+    entries = []
+    for obj in objs:
+        client_id, service_id = owners or owners_of(obj)
+        entries.append(Change(
+            resource=RESOURCE_NAMES[type(obj)], object_id=obj.pk, action=action,
+            client_id=client_id, service_company_id=service_id,
+        ))
+    if entries:
+        Change.objects.bulk_create(entries, batch_size=1000)
+        # Первая публикация после коммита нумерует все записи транзакции, остальные ничего не находят
+        transaction.on_commit(publish_changes)
+
+
+def publish_changes():
+    """
+    Номера всем закоммиченным записям без номера — одним UPDATE: seq = id + сдвиг,
+    порядок вставки сохраняется, новые номера больше всех выданных раньше.
+    """
+    with transaction.atomic():
+        sequence, _ = ChangeSequence.objects.select_for_update().get_or_create(pk=1)
+        bounds = Change.objects.filter(seq__isnull=True).aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return
+        offset = sequence.value + 1 - bounds['first']
+        Change.objects.filter(seq__isnull=True, id__gte=bounds['first'], id__lte=bounds['last']).update(
+            seq=F('id') + offset
+        )
+        sequence.value = bounds['last'] + offset
+        sequence.save(update_fields=['value'])
+
+
+# -------------------------------------------------------------------------
+# 2. Лента изменений
+# -------------------------------------------------------------------------
+
+def encode_cursor(seq):
+    return base64.urlsafe_b64encode(json.dumps({'seq': seq}).encode('ascii')).decode('ascii')
+
+
+def decode_cursor(value, message='Неверный курсор'):
+    if not value:
+        return 0
+    try:
+        seq = int(json.loads(base64.urlsafe_b64decode(force_str(value).encode('ascii')))['seq'])
+    except (TypeError, ValueError, KeyError):
+        raise NotFound(message)
+    if seq < 0:
+        raise NotFound(message)
+    return seq
+
+
+def journal_scope(user):
+    """Записи журнала, видимые пользователю. Менеджер видит все объекты — потеря доступа его не касается."""
+    if user.role == User.Role.MANAGER:
+        return ~Q(action=Change.Action.REVOKE)
+    if user.role == User.Role.CLIENT:
+        return Q(client=user)
+    if user.role == User.Role.SERVICE:
+        return Q(service_company=user)
+    return None
+
+
+def visible_objects(user, resource):
+    """Объекты ресурса в области видимости пользователя — как у списков API."""
+    model = RESOURCES[resource]
+    prefix = '' if model is Machine else 'machine__'
+    queryset = model.objects.order_by()
+    if user.role == User.Role.CLIENT:
+        return queryset.filter(**{f'{prefix}client': user})
+    if user.role == User.Role.SERVICE:
+        return queryset.filter(**{f'{prefix}service_company': user})
+    return queryset
+
+
+def read_changes(user, after, limit, resources=RESOURCES):
+    """
+    Страница ленты после номера after: (записи, последний номер страницы, есть ли продолжение).
+    Из нескольких записей одного объекта на странице остается последняя.
+    """
+    scope = journal_scope(user)
+    if scope is None:
+        return [], after, False
+    entries = list(
+        Change.objects.filter(scope, seq__gt=after, resource__in=resources)
+        .order_by('seq').values('seq', 'resource', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    last_seq = entries[-1]['seq'] if entries else after
+
+    latest = {}
+    for entry in entries:
+        key = entry['resource'], entry['object_id']
+        latest.pop(key, None)
+        latest[key] = entry
+    return list(latest.values()), last_seq, has_more
+
+
+def attach_data(user, entries, fields):
+    """
+    Текущее состояние объектов для записей upsert (fields: {ресурс: {ключ ответа: lookup}}),
+    по одному запросу на ресурс. Объект, которого уже нет или который больше не виден,
+    пропускается: дальше в ленте для него есть delete или revoke.
+    """
+    wanted = {}
+    for entry in entries:
+        if entry['action'] == Change.Action.UPSERT:
+            wanted.setdefault(entry['resource'], set()).add(entry['object_id'])
+    rows = {}
+    for resource, ids in wanted.items():
+        lookups = list(dict.fromkeys(['id', *fields[resource].values()]))
+        for row in visible_objects(user, resource).filter(id__in=ids).values(*lookups):
+            rows[resource, row['id']] = {key: row[lookup] for key, lookup in fields[resource].items()}
+
+    changes = []
+    for entry in entries:
+        change = {
+            'seq': entry['seq'],
+            'resource': entry['resource'],
+            'id': entry['object_id'],
+            # Для клиента потеря доступа — такое же удаление
+            'action': Change.Action.DELETE if entry['action'] == Change.Action.REVOKE else entry['action'],
+        }
+        if entry['action'] == Change.Action.UPSERT:
+            data = rows.get((entry['resource'], entry['object_id']))
+            if data is None:
+                continue
+            change['data'] = data
+        changes.append(change)
+    return changes
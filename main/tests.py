@@ -1,7 +1,84 @@
+import base64
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipIf
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import User, Machine, TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+from silantservice.urls import router
+from . import async_views
+from .authentication import token_cache
+from .cache import GuestSearchCache, guest_search_cache
+from .compression import brotli, choose_encoding
+from .renderers import ORJSONRenderer
+from .openapi import schema_artifact
+from .conditional import change_versions, bump_after_commit
+from .search import FTS_TABLE, fts_triggers
+from .pagination import HybridPagination
+from .sync import publish_changes
+from .metrics import metrics_registry
+from .analytics import rebuild_reliability
+from .forecast import rebuild_forecasts, refresh_forecasts
+from .handbooks import handbook_registry
+from .views import MachineViewSet, MaintenanceViewSet, ComplaintViewSet
+from .models import (
+    User, Machine, Maintenance, Complaint, TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel,
+    SteeringAxleModel, ServiceType, FailureNode, RecoveryMethod, MachineReliability, MaintenanceForecast, Change
+)
+
+
+# -------------------------------------------------------------------------
+# Общие данные тестов
+# -------------------------------------------------------------------------
+
+MACHINE_HANDBOOKS = {
+    'technique_model': (TechniqueModel, "Tech1"),
+    'engine_model': (EngineModel, "Eng1"),
+    'transmission_model': (TransmissionModel, "Trans1"),
+    'drive_axle_model': (DriveAxleModel, "Drive1"),
+    'steering_axle_model': (SteeringAxleModel, "Steer1"),
+}
+
+
+def create_handbooks(**names):
+    """Модели узлов для машин {поле Machine: запись справочника}; names — свое название или готовая запись."""
+    handbooks = {}
+    for field, (model, default) in MACHINE_HANDBOOKS.items():
+        value = names.get(field, default)
+        handbooks[field] = value if isinstance(value, model) else model.objects.create(name=value)
+    return handbooks
+
+
+def create_machine(serial_number, client, service_company, handbooks, **fields):
+    """Машина с заполненными обязательными полями; fields заменяют значения по умолчанию."""
+    values = dict(
+        engine_number="1", transmission_number="1", drive_axle_number="1", steering_axle_number="1",
+        supply_contract_num_date="C", shipment_date="2023-01-01", consignee="C", delivery_address="A",
+    )
+    values.update(fields)
+    return Machine.objects.create(
+        serial_number=serial_number, client=client, service_company=service_company, **handbooks, **values
+    )
 
 
 class AccessTests(APITestCase):
@@ -60,4 +137,1835 @@ class AccessTests(APITestCase):
         url = reverse('machine-list')
         response = self.client.get(url)
 
-        self.assertEqual(len(response.data['results']), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 1)
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.handbooks = create_handbooks()
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+
+        # Несколько машин с одинаковой датой отгрузки — проверка разрешения "ничьих" по id
+        dates = ["2023-01-01", "2023-01-01", "2023-01-01", "2023-02-01", "2023-03-01", "2023-03-01", "2023-04-01"]
+        for i, shipment_date in enumerate(dates):
+            create_machine(f"{i:04d}", self.client_1, self.service, self.handbooks, shipment_date=shipment_date)
+        create_machine("foreign", self.client_2, self.service, self.handbooks, shipment_date="2023-01-15")
+
+    def _walk(self, params):
+        response = self.client.get(reverse('machine-list'), params)
+        pages = [response]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response)
+        return pages
+
+    def test_cursor_walks_all_rows_without_gaps(self):
+        """Проход курсором отдает все машины клиента ровно один раз в порядке отгрузки"""
+        self.client.force_authenticate(user=self.client_1)
+        pages = self._walk({'pagination': 'cursor', 'page_size': 3})
+
+        serials = [row['serial_number'] for page in pages for row in page.data['results']]
+        self.assertEqual(serials, [f"{i:04d}" for i in range(7)])
+        self.assertNotIn('count', pages[0].data)
+
+    def test_cursor_descending_and_previous(self):
+        """Обратная сортировка и переход на предыдущую страницу"""
+        self.client.force_authenticate(user=self.client_1)
+        pages = self._walk({'pagination': 'cursor', 'page_size': 2, 'ordering': '-shipment_date'})
+        dates = [row['shipment_date'] for page in pages for row in page.data['results']]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+        previous = self.client.get(pages[1].data['previous'])
+        self.assertEqual(previous.data['results'], pages[0].data['results'])
+        self.assertIsNone(previous.data['previous'])
+
+    def test_page_size_is_capped(self):
+        """?page_size больше max_page_size урезается до него во всех режимах (предел занижен под 8 машин)"""
+        self.client.force_authenticate(user=self.service)
+        with mock.patch.object(HybridPagination, 'max_page_size', 3):
+            for params in ({}, {'pagination': 'cursor'}, {'pagination': 'nocount'}):
+                response = self.client.get(reverse('machine-list'), {'page_size': 1000, **params})
+                self.assertEqual(len(response.data['results']), 3)
+                self.assertIsNotNone(response.data['next'])
+        self.assertEqual(response.data['has_next'], True)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.client_1)
+        response = self.client.get(reverse('machine-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Структура верная, но значения не того типа, что у поля сортировки
+        for payload in ({'o': 'shipment_date', 'v': 'zzz', 'pk': 1, 'r': 0},
+                        {'o': 'shipment_date', 'v': '2023-01-01', 'pk': 'x', 'r': 0},
+                        {'o': 'shipment_date', 'v': None, 'pk': 1, 'r': 0},
+                        {'o': 'shipment_date', 'v': '2023-01-01', 'pk': None, 'r': 0}):
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            response = self.client.get(reverse('machine-list'), {'cursor': cursor, 'ordering': 'shipment_date'})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class NoCountPaginationTests(APITestCase):
+    """?pagination=nocount и общее число строк по запросу (данные — как в CursorPaginationTests)"""
+    _walk = CursorPaginationTests._walk
+
+    def setUp(self):
+        CursorPaginationTests.setUp(self)
+        cache.clear()
+
+    def test_pages_without_count(self):
+        self.client.force_authenticate(user=self.client_1)
+        with self.assertNumQueries(1):  # только страница, без COUNT(*)
+            response = self.client.get(reverse('machine-list'), {'pagination': 'nocount', 'page_size': 3})
+        self.assertTrue(response.data['has_next'])
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+        pages = self._walk({'pagination': 'nocount', 'page_size': 3})
+        serials = [row['serial_number'] for page in pages for row in page.data['results']]
+        self.assertEqual(serials, [f"{i:04d}" for i in range(7)])
+        self.assertFalse(pages[-1].data['has_next'])
+        self.assertIn('page=2', pages[-1].data['previous'])
+
+        response = self.client.get(reverse('machine-list'), {'pagination': 'nocount', 'page': 9})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_exact_count_on_request(self):
+        self.client.force_authenticate(user=self.client_1)
+        response = self.client.get(reverse('machine-list'), {'pagination': 'nocount', 'count': 'exact'})
+        self.assertEqual(response.data['count'], 7)
+        response = self.client.get(reverse('machine-list'), {'pagination': 'cursor', 'count': 'exact'})
+        self.assertEqual(response.data['count'], 7)
+
+    def test_estimated_count_is_cached_until_change(self):
+        self.client.force_authenticate(user=self.client_1)
+        params = {'pagination': 'nocount', 'count': 'estimate', 'technique_model__name__icontains': ''}
+        self.assertEqual(self.client.get(reverse('machine-list'), params).data['estimated_count'], 7)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('machine-list'), params)
+        self.assertEqual(response.data['estimated_count'], 7)
+
+        # Новая машина клиента меняет версию данных — кэш больше не используется
+        create_machine("new", self.client_1, self.service, self.handbooks, shipment_date="2023-05-01")
+        self.assertEqual(self.client.get(reverse('machine-list'), params).data['estimated_count'], 8)
+
+        # С фильтром на SQLite оценки нет
+        params['technique_model__name__icontains'] = 'Tech'
+        self.assertIsNone(self.client.get(reverse('machine-list'), params).data['estimated_count'])
+
+    def test_planner_estimate_on_postgresql(self):
+        self.client.force_authenticate(user=self.client_1)
+        plan = json.dumps([{'Plan': {'Plan Rows': 1234}}])
+        with mock.patch('main.pagination.connections', {'default': mock.Mock(vendor='postgresql')}), \
+                mock.patch('django.db.models.QuerySet.explain', return_value=plan):
+            response = self.client.get(reverse('machine-list'), {
+                'pagination': 'nocount', 'count': 'estimate', 'technique_model__name__icontains': 'Tech'
+            })
+        self.assertEqual(response.data['estimated_count'], 1234)
+
+
+class GuestSearchCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tech = TechniqueModel.objects.create(name="Tech1")
+        client = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.machine = create_machine("0001", client, client, create_handbooks(technique_model=self.tech))
+        self.url = reverse('guest_search')
+
+    def test_repeated_lookup_does_not_touch_db(self):
+        with self.assertNumQueries(1):
+            first = self.client.get(self.url, {'serial_number': '0001'})
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {'serial_number': '0001'})
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data['technique_model'], 'Tech1')
+        self.assertEqual(guest_search_cache.stats()['hits'], 1)
+        self.assertEqual(guest_search_cache.stats()['misses'], 1)
+
+    def test_missing_serial_is_cached(self):
+        self.assertEqual(self.client.get(self.url, {'serial_number': 'nope'}).status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'serial_number': 'nope'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalidation_on_machine_and_handbook_change(self):
+        self.client.get(self.url, {'serial_number': '0001'})
+        self.tech.name = "Tech2"
+        self.tech.save()
+        self.assertEqual(self.client.get(self.url, {'serial_number': '0001'}).data['technique_model'], 'Tech2')
+
+        self.machine.serial_number = "0002"
+        self.machine.save()
+        self.assertEqual(self.client.get(self.url, {'serial_number': '0001'}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'serial_number': '0002'}).status_code, 200)
+
+    def test_entry_cached_before_commit_is_dropped_after_commit(self):
+        stale = self.client.get(self.url, {'serial_number': '0001'}).data
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machine.engine_number = "E-2"
+            self.machine.save()
+            # Параллельный гостевой запрос до коммита видит прежнюю строку и кэширует ее
+            guest_search_cache.set('0001', stale)
+        response = self.client.get(self.url, {'serial_number': '0001'})
+        self.assertEqual((response['X-Cache'], response.data['engine_number']), ('MISS', 'E-2'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tech.name = "Tech2"
+            self.tech.save()
+            guest_search_cache.set('0001', stale)
+        self.assertEqual(self.client.get(self.url, {'serial_number': '0001'}).data['technique_model'], 'Tech2')
+
+
+class HandbookRegistryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.tech = TechniqueModel.objects.create(name="Силант-1")
+        TechniqueModel.objects.create(name="Другая")
+        self.handbooks = create_handbooks(technique_model=self.tech)
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        create_machine("0001", self.client_1, self.service, self.handbooks)
+
+    def test_name_filters_use_registry(self):
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('machine-list')
+        self.assertEqual(self.client.get(url, {'technique_model__name': 'Силант-1'}).data['count'], 1)
+        self.assertEqual(self.client.get(url, {'technique_model__name__icontains': 'силант'}).data['count'], 1)
+        self.assertEqual(self.client.get(url, {'technique_model__name': 'Другая'}).data['count'], 0)
+        self.assertEqual(self.client.get(url, {'engine_model__name__icontains': 'nothing'}).data['count'], 0)
+
+    def test_slug_validation_and_invalidation(self):
+        from .serializers import MachineSerializer
+        data = {
+            'serial_number': '0002', 'technique_model': 'Силант-1', 'engine_model': 'Eng1',
+            'engine_number': '1', 'transmission_model': 'Trans1', 'transmission_number': '1',
+            'drive_axle_model': 'Drive1', 'drive_axle_number': '1', 'steering_axle_model': 'Steer1',
+            'steering_axle_number': '1', 'supply_contract_num_date': 'C', 'shipment_date': '2023-01-01',
+            'consignee': 'C', 'delivery_address': 'A', 'client': 'client1', 'service_company': 'service',
+        }
+        serializer = MachineSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['technique_model'].pk, self.tech.pk)
+
+        self.tech.name = "Силант-2"
+        self.tech.save()
+        serializer = MachineSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('technique_model', serializer.errors)
+
+    def test_bundle_etag(self):
+        self.client.force_authenticate(user=self.client_1)
+        url = reverse('handbooks')
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['technique_models']), 2)
+        self.assertEqual(response.data['failure_nodes'], [])
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        FailureNode.objects.create(name="Двигатель")
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertEqual(changed.data['failure_nodes'][0]['name'], "Двигатель")
+
+
+class BulkCreateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        client = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        ServiceType.objects.create(name="ТО-1")
+        FailureNode.objects.create(name="Двигатель")
+        RecoveryMethod.objects.create(name="Ремонт")
+        self.handbooks = create_handbooks()
+        for serial in ("0001", "0002"):
+            create_machine(serial, client, self.service, self.handbooks)
+        self.client.force_authenticate(user=self.service)
+
+    def _maintenance(self, serial, order_number, hours=100):
+        return {
+            'machine': serial, 'service_type': 'ТО-1', 'event_date': '2024-01-10', 'operating_hours': hours,
+            'order_number': order_number, 'order_date': '2024-01-09', 'service_company': 'service',
+        }
+
+    def test_bulk_create_query_count_does_not_grow(self):
+        url = reverse('maintenance-bulk')
+        self.client.post(url, [self._maintenance("0001", "warmup")], format='json')
+
+        with self.assertNumQueries(7) as small:  # + запись журнала изменений
+            self.client.post(url, [self._maintenance("0001", f"A{i}") for i in range(2)], format='json')
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.post(
+                url, [self._maintenance(f"000{i % 2 + 1}", f"B{i}") for i in range(50)], format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Maintenance.objects.count(), 53)
+
+    def test_per_row_errors_and_nothing_written(self):
+        rows = [
+            {'machine': '0001', 'failure_date': '2024-01-10', 'operating_hours': 10, 'failure_node': 'Двигатель',
+             'failure_description': 'D', 'recovery_method': 'Ремонт', 'restoration_date': '2024-01-12',
+             'service_company': 'service'},
+            {'machine': '0001', 'failure_date': '2024-01-10', 'operating_hours': 10, 'failure_node': 'Двигатель',
+             'failure_description': 'D', 'recovery_method': 'Ремонт', 'restoration_date': '2024-01-05',
+             'service_company': 'service'},
+            {'machine': '9999', 'failure_date': '2999-01-10', 'operating_hours': 10, 'failure_node': 'Нет',
+             'failure_description': 'D', 'recovery_method': 'Ремонт', 'restoration_date': '2999-01-12',
+             'service_company': 'service'},
+        ]
+        response = self.client.post(reverse('complaint-bulk'), rows, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()
+        self.assertEqual(set(errors), {'1', '2'})
+        self.assertIn('non_field_errors', errors['1'])
+        self.assertEqual(
+            set(errors['2']), {'machine', 'failure_date', 'failure_node', 'restoration_date'}
+        )
+        self.assertEqual(Complaint.objects.count(), 0)
+
+    def test_maintenance_upsert(self):
+        url = reverse('maintenance-bulk')
+        self.client.post(url, [self._maintenance("0001", "N1"), self._maintenance("0002", "N1")], format='json')
+
+        response = self.client.post(
+            url + '?upsert=1',
+            [self._maintenance("0001", "N1", hours=500), self._maintenance("0001", "N2")],
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Maintenance.objects.count(), 3)
+        self.assertEqual(Maintenance.objects.get(machine__serial_number="0001", order_number="N1").operating_hours, 500)
+        self.assertEqual(Maintenance.objects.get(machine__serial_number="0002", order_number="N1").operating_hours, 100)
+
+        duplicate = self.client.post(
+            url + '?upsert=1', [self._maintenance("0001", "N3"), self._maintenance("0001", "N3")], format='json'
+        )
+        self.assertEqual(duplicate.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(duplicate.json(), {'1': {'order_number': ['Повторяющаяся запись в пакете.']}})
+
+    def test_upsert_does_not_touch_foreign_rows(self):
+        other = User.objects.create_user(username='service2', password='123', role=User.Role.SERVICE)
+        client = User.objects.get(username='client1')
+        create_machine("0003", client, other, self.handbooks)
+        self.client.force_authenticate(user=other)
+        self.client.post(reverse('maintenance-bulk'), [dict(self._maintenance("0003", "F1"), service_company='service2')],
+                         format='json')
+        foreign = Maintenance.objects.get(order_number="F1")
+        self.assertEqual(foreign.service_company, other)
+
+        self.client.force_authenticate(user=self.service)
+        self.assertEqual(self.client.patch(reverse('maintenance-detail', args=[foreign.pk]),
+                                           {'operating_hours': 999}).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            reverse('maintenance-bulk') + '?upsert=1',
+            [self._maintenance("0001", "N1"), self._maintenance("0003", "F1", hours=999)], format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'1': {'order_number': ['Нет доступа к записи с таким ключом.']}})
+        foreign.refresh_from_db()
+        self.assertEqual((foreign.operating_hours, foreign.service_company), (100, other))
+        self.assertEqual(Maintenance.objects.count(), 1)
+
+
+class ImportMachinesCommandTests(APITestCase):
+    header = (
+        'Зав. № машины;technique_model;engine_model;engine_number;transmission_model;transmission_number;'
+        'drive_axle_model;drive_axle_number;steering_axle_model;steering_axle_number;supply_contract_num_date;'
+        'shipment_date;consignee;delivery_address;equipment_options;client;service_company\n'
+    )
+
+    def setUp(self):
+        cache.clear()
+        TechniqueModel.objects.create(name="ПД1,5")
+        User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+
+    def _write(self, lines):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.header + ''.join(lines))
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _row(self, serial, client='client1', shipment_date='01.02.2023'):
+        return (
+            f'{serial};ПД1,5;Kubota;E1;10VA;T1;20VA;D1;30VA;S1;Договор №1;{shipment_date};'
+            f'ООО Ромашка;Москва;;{client};service\n'
+        )
+
+    def _run(self, path, **options):
+        call_command('import_machines', path, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import_creates_machines_and_handbooks(self):
+        path = self._write([self._row(f'{i:04d}') for i in range(5)] + [self._row('bad', client='nobody')])
+        self._run(path, batch_size=2)
+
+        self.assertEqual(Machine.objects.count(), 5)
+        self.assertEqual(TechniqueModel.objects.count(), 1)
+        self.assertEqual(EngineModel.objects.get().name, 'Kubota')
+        self.assertEqual(str(Machine.objects.get(serial_number='0003').shipment_date), '2023-02-01')
+
+        # Повторный запуск не создает дублей
+        self._run(path)
+        self.assertEqual(Machine.objects.count(), 5)
+
+    def test_invalid_rows_are_reported_not_written(self):
+        path = self._write([self._row('0001'), self._row('X' * 101), self._row('0002').replace('Kubota', 'K' * 256)])
+        stderr = StringIO()
+        call_command('import_machines', path, stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(list(Machine.objects.values_list('serial_number', flat=True)), ['0001'])
+        self.assertIn('Строка 2: поле serial_number', stderr.getvalue())
+        self.assertIn('Строка 3: поле engine_model', stderr.getvalue())
+
+    def test_dry_run_writes_nothing(self):
+        path = self._write([self._row('0001')])
+        self._run(path, dry_run=True)
+        self.assertEqual(Machine.objects.count(), 0)
+        self.assertEqual(EngineModel.objects.count(), 0)
+
+    def test_resume_skips_committed_rows(self):
+        path = self._write([self._row('0001'), self._row('0002')])
+        with open(path + '.import-state', 'w') as f:
+            f.write('{"rows_done": 1}')
+        self._run(path, resume=True)
+        self.assertEqual(list(Machine.objects.values_list('serial_number', flat=True)), ['0002'])
+        self.assertFalse(os.path.exists(path + '.import-state'))
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        handbooks = create_handbooks(technique_model="Силант")
+        node = FailureNode.objects.create(name="Двигатель")
+        method = RecoveryMethod.objects.create(name="Ремонт")
+        for serial, owner in (("0001", self.client_1), ("0002", self.client_1), ("0003", client_2)):
+            machine = create_machine(serial, owner, service, handbooks)
+            Complaint.objects.create(
+                machine=machine, failure_date="2024-01-10", operating_hours=10, failure_node=node,
+                failure_description="Стук", recovery_method=method, restoration_date="2024-01-13",
+                service_company=service
+            )
+        self.client.force_authenticate(user=self.client_1)
+
+    def test_csv_export_is_role_scoped(self):
+        response = self.client.get(reverse('machine-export'))
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'serial_number', 'technique_model'])
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['0001', '0002'])
+        self.assertEqual(lines[1].split(',')[2], 'Силант')
+
+    def test_ndjson_export_with_filters_and_downtime(self):
+        response = self.client.get(reverse('complaint-export'), {'output': 'ndjson', 'ordering': '-id'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual([row['machine'] for row in rows], ['0002', '0001'])
+        self.assertEqual(rows[0]['downtime'], 3)
+        self.assertEqual(rows[0]['failure_date'], '2024-01-10')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('maintenance-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MachinePassportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        self.machine = create_machine("0001", self.client_1, self.service, create_handbooks())
+        self.service_type = ServiceType.objects.create(name="ТО-1")
+        self.node = FailureNode.objects.create(name="Двигатель")
+        self.method = RecoveryMethod.objects.create(name="Ремонт")
+
+    def _add_history(self, count):
+        for i in range(count):
+            Maintenance.objects.create(
+                machine=self.machine, service_type=self.service_type, event_date="2024-01-10",
+                operating_hours=i, order_number=str(i), order_date="2024-01-10", service_company=self.service
+            )
+            Complaint.objects.create(
+                machine=self.machine, failure_date="2024-01-10", operating_hours=i, failure_node=self.node,
+                failure_description="D", recovery_method=self.method, restoration_date="2024-01-12",
+                service_company=self.service
+            )
+
+    def test_passport_query_count_is_fixed(self):
+        self.client.force_authenticate(user=self.client_1)
+        url = reverse('machine-passport', args=[self.machine.pk])
+        self._add_history(1)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        self._add_history(20)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+
+        self.assertEqual(response.data['serial_number'], "0001")
+        self.assertEqual(len(response.data['maintenances']), 21)
+        self.assertEqual(response.data['complaints'][0]['machine'], "0001")
+        self.assertEqual(response.data['complaints'][0]['downtime'], 2)
+
+    def test_passport_is_role_scoped(self):
+        self.client.force_authenticate(user=self.client_2)
+        response = self.client.get(reverse('machine-passport', args=[self.machine.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ComplaintDowntimeTests(APITestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        client = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        handbooks = create_handbooks()
+        node = FailureNode.objects.create(name="Двигатель")
+        method = RecoveryMethod.objects.create(name="Ремонт")
+        machines = {serial: create_machine(serial, client, self.manager, handbooks) for serial in ("0001", "0002")}
+        # (машина, дата восстановления): простой 2, 10 и 5 дней
+        for serial, restoration_date in (("0001", "2024-01-12"), ("0001", "2024-01-20"), ("0002", "2024-01-15")):
+            machine = machines[serial]
+            Complaint.objects.create(
+                machine=machine, failure_date="2024-01-10", operating_hours=10, failure_node=node,
+                failure_description="D", recovery_method=method, restoration_date=restoration_date,
+                service_company=self.manager
+            )
+        self.client.force_authenticate(user=self.manager)
+
+    def test_order_and_filter_by_downtime(self):
+        url = reverse('complaint-list')
+        response = self.client.get(url, {'ordering': '-downtime', 'page_size': 10})
+        self.assertEqual([row['downtime'] for row in response.data['results']], [10, 5, 2])
+
+        response = self.client.get(url, {'downtime_min': 3, 'downtime_max': 9})
+        self.assertEqual([row['downtime'] for row in response.data['results']], [5])
+
+        # Курсор по псевдониму downtime: значение берется из выборки values()
+        response = self.client.get(url, {'ordering': '-downtime', 'pagination': 'cursor', 'page_size': 2})
+        following = self.client.get(response.data['next'])
+        self.assertEqual([row['downtime'] for row in following.data['results']], [2])
+
+    def test_instance_keeps_sql_and_computed_downtime(self):
+        complaint = Complaint.objects.order_by('-downtime').first()
+        self.assertEqual(complaint.downtime_days, 10)
+        complaint.restoration_date = date(2024, 1, 11)
+        self.assertEqual(complaint.downtime, 1)
+
+    def test_total_downtime_per_machine_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('complaint-downtime'))
+        self.assertEqual(response.data, [
+            {'machine': '0001', 'complaints': 2, 'total_downtime': 12},
+            {'machine': '0002', 'complaints': 1, 'total_downtime': 5},
+        ])
+
+
+class ReliabilityAnalyticsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        handbooks = create_handbooks()
+        self.engine = FailureNode.objects.create(name="Двигатель")
+        self.hydraulics = FailureNode.objects.create(name="Гидравлика")
+        self.method = RecoveryMethod.objects.create(name="Ремонт")
+        self.machines = [
+            create_machine(serial, owner, self.service, handbooks)
+            for serial, owner in (("0001", self.client_1), ("0002", client_2))
+        ]
+
+    def _complaint(self, machine, node, hours, restoration_date="2024-01-12"):
+        return Complaint.objects.create(
+            machine=machine, failure_date="2024-01-10", operating_hours=hours, failure_node=node,
+            failure_description="D", recovery_method=self.method, restoration_date=restoration_date,
+            service_company=self.service
+        )
+
+    def _report(self, user, group_by):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('reliability'), {'group_by': group_by})
+        return {row['name']: row for row in response.data['results']}
+
+    def test_summaries_follow_complaint_changes(self):
+        self._complaint(self.machines[0], self.engine, 100)
+        second = self._complaint(self.machines[0], self.engine, 300, restoration_date="2024-01-20")
+        self._complaint(self.machines[1], self.hydraulics, 500)
+
+        report = self._report(self.manager, 'failure_node')
+        self.assertEqual(report['Двигатель']['failures'], 2)
+        self.assertEqual(report['Двигатель']['mean_downtime'], 6)
+        self.assertEqual(report['Двигатель']['mtbf'], 400)  # (300 + 500) / 2
+
+        second.delete()
+        report = self._report(self.manager, 'technique_model')
+        self.assertEqual(report['Tech1']['failures'], 2)
+        self.assertEqual(report['Tech1']['mtbf'], 300)  # (100 + 500) / 2
+
+    def test_report_is_role_scoped(self):
+        self._complaint(self.machines[0], self.engine, 100)
+        self._complaint(self.machines[1], self.hydraulics, 500)
+
+        self.assertEqual(list(self._report(self.client_1, 'failure_node')), ['Двигатель'])
+        self.assertEqual(self._report(self.service, 'service_company')['service']['failures'], 2)
+
+    def test_rebuild_command(self):
+        self._complaint(self.machines[0], self.engine, 100)
+        MachineReliability.objects.all().delete()
+        call_command('rebuild_reliability', stdout=StringIO())
+        self.assertEqual(self._report(self.manager, 'engine_model')['Eng1']['failures'], 1)
+
+
+class MaintenanceForecastTests(APITestCase):
+    """Прогноз ТО: наработка в сутки по показаниям, периодичность из справочника или истории, видимость по роли."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        handbooks = create_handbooks()
+        self.to1 = ServiceType.objects.create(name="ТО-1", interval_hours=500)
+        self.to2 = ServiceType.objects.create(name="ТО-2")  # периодичность — из истории
+        self.shipped = date.today() - timedelta(days=100)
+        self.machines = [
+            create_machine(serial, owner, self.service, handbooks, shipment_date=self.shipped)
+            for serial, owner in (("0001", self.client_1), ("0002", client_2))
+        ]
+        # 0001: 8 м/час в сутки, 0002: 10 м/час в сутки, ТО-2 каждые 250 м/час
+        self._maintenance(self.machines[0], self.to1, 60, 480)
+        self._maintenance(self.machines[0], self.to1, 90, 720)
+        self._maintenance(self.machines[1], self.to2, 10, 100)
+        self._maintenance(self.machines[1], self.to2, 35, 350)
+        rebuild_forecasts()
+
+    def _maintenance(self, machine, service_type, day, hours):
+        return Maintenance.objects.create(
+            machine=machine, service_type=service_type, event_date=self.shipped + timedelta(days=day),
+            operating_hours=hours, order_number=f'{machine.serial_number}-{day}',
+            order_date=self.shipped + timedelta(days=day), service_company=self.service
+        )
+
+    def _forecasts(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('maintenance_forecast-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['machine'], row['service_type']) for row in response.data['results']], response
+
+    def test_fleet_forecast(self):
+        rows = {
+            (row.machine.serial_number, row.service_type.name): row
+            for row in MaintenanceForecast.objects.select_related('machine', 'service_type')
+        }
+        self.assertEqual(len(rows), 4)
+        first = rows['0001', 'ТО-1']
+        self.assertEqual((first.hours_per_day, first.readings, first.last_reading_hours), (8.0, 2, 720))
+        self.assertEqual((first.interval_hours, first.due_hours), (500, 1220))
+        self.assertEqual(first.due_date, self.shipped + timedelta(days=90 + 63))  # 500 / 8 = 62.5 суток
+        # ТО-2 на 0001 не проводилось: срок — отметка 250 м/час, давно пройденная
+        self.assertEqual(rows['0001', 'ТО-2'].interval_hours, 250)
+        self.assertEqual(rows['0001', 'ТО-2'].due_date, self.shipped + timedelta(days=90 - 58))
+        self.assertEqual(rows['0002', 'ТО-1'].due_date, self.shipped + timedelta(days=35 + 15))
+        self.assertEqual(rows['0002', 'ТО-2'].last_service_hours, 350)
+        self.assertEqual(rows['0002', 'ТО-2'].due_hours, 600)
+
+    def test_endpoint_is_sorted_filtered_and_role_scoped(self):
+        order, response = self._forecasts(self.manager, page_size=10)
+        self.assertEqual(order, [('0001', 'ТО-2'), ('0002', 'ТО-1'), ('0002', 'ТО-2'), ('0001', 'ТО-1')])
+        last = response.data['results'][-1]
+        self.assertEqual((last['days_left'], last['overdue']), (53, False))
+
+        order, _ = self._forecasts(self.manager, ordering='-hours_per_day', page_size=10)
+        self.assertEqual([machine for machine, _ in order], ['0002', '0002', '0001', '0001'])
+        order, _ = self._forecasts(self.manager, overdue='false')
+        self.assertEqual(order, [('0001', 'ТО-1')])
+        order, _ = self._forecasts(self.manager, service_type__name='ТО-2', pagination='cursor')
+        self.assertEqual(order, [('0001', 'ТО-2'), ('0002', 'ТО-2')])
+
+        order, _ = self._forecasts(self.client_1, page_size=10)
+        self.assertEqual(order, [('0001', 'ТО-2'), ('0001', 'ТО-1')])
+        order, _ = self._forecasts(self.service, due_within=0, page_size=10)
+        self.assertEqual(len(order), 3)
+
+    def test_incremental_refresh(self):
+        untouched = set(MaintenanceForecast.objects.filter(machine=self.machines[1]).values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._maintenance(self.machines[0], self.to1, 95, 800)
+        forecast = MaintenanceForecast.objects.get(machine=self.machines[0], service_type=self.to1)
+        self.assertEqual((forecast.last_service_hours, forecast.due_hours), (800, 1300))
+        self.assertEqual(
+            set(MaintenanceForecast.objects.filter(machine=self.machines[1]).values_list('id', flat=True)), untouched
+        )
+
+        # Каскадное удаление ТО вместе с машиной не оставляет прогнозов удаленной машины
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machines[1].delete()
+        self.assertFalse(MaintenanceForecast.objects.filter(machine_id=self.machines[1].pk).exists())
+
+    def test_refresh_does_not_compute_fleet_parameters(self):
+        cache.clear()
+        with mock.patch('main.forecast.compute_parameters', side_effect=AssertionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._maintenance(self.machines[0], self.to1, 95, 800)
+        # Без параметров в кэше — только периодичность из справочника (ТО-2 выводится из истории)
+        forecasts = MaintenanceForecast.objects.filter(machine=self.machines[0])
+        self.assertEqual([forecast.service_type for forecast in forecasts], [self.to1])
+        self.assertEqual(forecasts.get().due_hours, 1300)
+
+        rebuild_forecasts()
+        self.assertEqual(MaintenanceForecast.objects.filter(machine=self.machines[0]).count(), 2)
+
+    def test_rebuild_command(self):
+        MaintenanceForecast.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_forecasts', stdout=out)
+        self.assertIn('4', out.getvalue())
+        self.assertEqual(MaintenanceForecast.objects.count(), 4)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Регрессионные тесты планов запросов: списки по ролям должны идти по индексам,
+    без полного просмотра таблиц машин/ТО/рекламаций.
+    Данных достаточно, чтобы после ANALYZE планировщик не выбирал полный просмотр.
+    """
+    machines_count = 3000
+    clients_count = 30
+    main_tables = ('main_machine', 'main_maintenance', 'main_complaint')
+
+    @classmethod
+    def setUpTestData(cls):
+        # Справочники реального размера: с таблицами из одной строки планировщик SQLite
+        # выбирает другой порядок соединений, чем на настоящих данных
+        handbooks = {
+            field: model.objects.bulk_create([model(name=f'{field}{i}') for i in range(20)])
+            for field, model in (
+                ('technique_model', TechniqueModel), ('engine_model', EngineModel),
+                ('transmission_model', TransmissionModel), ('drive_axle_model', DriveAxleModel),
+                ('steering_axle_model', SteeringAxleModel),
+            )
+        }
+        cls.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        clients = User.objects.bulk_create([
+            User(username=f'client{i}', role=User.Role.CLIENT) for i in range(cls.clients_count)
+        ])
+        services = User.objects.bulk_create([
+            User(username=f'service{i}', role=User.Role.SERVICE) for i in range(cls.clients_count)
+        ])
+        cls.client_user, cls.service_user = clients[0], services[0]
+
+        machines = Machine.objects.bulk_create([
+            Machine(
+                serial_number=f'{i:06d}', engine_number="1", transmission_number="1",
+                drive_axle_number="1", steering_axle_number="1", supply_contract_num_date="C",
+                shipment_date=date(2020, 1, 1) + timedelta(days=i % 1000), consignee="C", delivery_address="A",
+                client=clients[i % cls.clients_count], service_company=services[i % cls.clients_count],
+                **{field: items[i % len(items)] for field, items in handbooks.items()}
+            )
+            for i in range(cls.machines_count)
+        ])
+        service_type = ServiceType.objects.create(name="ТО-1")
+        node = FailureNode.objects.create(name="Двигатель")
+        method = RecoveryMethod.objects.create(name="Ремонт")
+        Maintenance.objects.bulk_create([
+            Maintenance(
+                machine=machine, service_type=service_type, event_date=date(2023, 1, 1) + timedelta(days=i % 300),
+                operating_hours=i, order_number=str(i), order_date=date(2023, 1, 1),
+                service_company=machine.service_company
+            )
+            for i, machine in enumerate(machines * 2)
+        ])
+        Complaint.objects.bulk_create([
+            Complaint(
+                machine=machine, failure_date=date(2023, 1, 1) + timedelta(days=i % 300), operating_hours=i,
+                failure_node=node, failure_description="D", recovery_method=method,
+                restoration_date=date(2023, 12, 1), service_company=machine.service_company
+            )
+            for i, machine in enumerate(machines)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def list_queryset(self, viewset_class, user, params=None):
+        """Запрос первой страницы списка так, как его отправляет viewset: values() из ValuesReadMixin."""
+        request = Request(APIRequestFactory().get('/', params or {}))
+        request.user = user
+        view = viewset_class(request=request, action='list', format_kwarg=None)
+        queryset = view.get_read_queryset()
+        if request.query_params.get('pagination') == 'cursor':
+            view.paginator.paginate_queryset(queryset, request, view)
+            next_request = Request(APIRequestFactory().get(view.paginator.get_next_link()))
+            next_request.user = user
+            return view.paginator.get_keyset_queryset(queryset, next_request, view)
+        return queryset[:view.paginator.page_size]
+
+    def plan_lines(self, queryset):
+        """(план, [(полный просмотр, сортировка)] по строкам плана)."""
+        plan = queryset.explain()
+        lines = []
+        for line in plan.splitlines():
+            if connection.vendor == 'sqlite':
+                full_scan = any(re.search(rf'\bSCAN {table}$', line) for table in self.main_tables)
+                sort = 'USE TEMP B-TREE FOR ORDER BY' in line
+            else:
+                full_scan = any(f'Seq Scan on {table} ' in line + ' ' for table in self.main_tables)
+                sort = re.search(r'\bSort\b', line) is not None
+            lines.append((full_scan, sort))
+        return plan, lines
+
+    def assertUsesIndexes(self, queryset):
+        """Строки и порядок — из индекса: ни полного просмотра, ни сортировки."""
+        plan, lines = self.plan_lines(queryset)
+        self.assertFalse(any(full_scan for full_scan, _ in lines), f'Полный просмотр таблицы:\n{plan}')
+        self.assertFalse(any(sort for _, sort in lines), f'Сортировка без индекса:\n{plan}')
+
+    def assertFiltersByIndex(self, queryset):
+        """
+        Только отбор по индексам. ТО и рекламации роли фильтруются через JOIN с машинами
+        (machine__client / machine__service_company): индекс выбирает машины стороны и их историю,
+        но порядок по дате из него не получить — история одной стороны сортируется (см. README).
+        """
+        plan, lines = self.plan_lines(queryset)
+        self.assertFalse(any(full_scan for full_scan, _ in lines), f'Полный просмотр таблицы:\n{plan}')
+
+    def test_machine_lists(self):
+        self.assertUsesIndexes(self.list_queryset(MachineViewSet, self.manager))
+        self.assertUsesIndexes(self.list_queryset(MachineViewSet, self.client_user))
+        self.assertUsesIndexes(self.list_queryset(MachineViewSet, self.service_user))
+
+    def test_machine_cursor_page(self):
+        self.assertUsesIndexes(self.list_queryset(MachineViewSet, self.manager, {'pagination': 'cursor'}))
+        self.assertUsesIndexes(self.list_queryset(MachineViewSet, self.client_user, {'pagination': 'cursor'}))
+
+    def test_maintenance_lists(self):
+        self.assertUsesIndexes(self.list_queryset(MaintenanceViewSet, self.manager))
+        self.assertFiltersByIndex(self.list_queryset(MaintenanceViewSet, self.client_user))
+        self.assertFiltersByIndex(self.list_queryset(MaintenanceViewSet, self.service_user))
+
+    def test_complaint_lists(self):
+        self.assertUsesIndexes(self.list_queryset(ComplaintViewSet, self.manager))
+        self.assertFiltersByIndex(self.list_queryset(ComplaintViewSet, self.client_user))
+        self.assertFiltersByIndex(self.list_queryset(ComplaintViewSet, self.service_user))
+
+
+class MachineSearchTests(APITestCase):
+    def setUp(self):
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        handbooks = create_handbooks(technique_model="ПД3,0", engine_model="Kubota V3300")
+        rows = (
+            ("0001", "ENG-7781", "ООО Ромашка", self.client_1),
+            ("0002", "ENG-1000", "АО Лютик", self.client_1),
+            ("0003", "ENG-7782", "ООО Ромашка-Юг", client_2),
+        )
+        for serial, engine_number, consignee, owner in rows:
+            create_machine(
+                serial, owner, self.service, handbooks, engine_number=engine_number, transmission_number="T1",
+                drive_axle_number="D1", steering_axle_number="S1", consignee=consignee,
+                delivery_address="г. Чебоксары",
+            )
+
+    def _search(self, user, q):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(reverse('machine-search'), {'q': q})
+        return [row['serial_number'] for row in response.data]
+
+    def test_search_by_component_serial_and_consignee(self):
+        self.assertEqual(self._search(self.service, 'ENG-778'), ['0001', '0003'])
+        self.assertEqual(sorted(self._search(self.service, 'ромашка')), ['0001', '0003'])
+        self.assertEqual(len(self._search(self.service, 'чебоксары')), 3)
+
+    def test_search_is_role_scoped(self):
+        self.assertEqual(self._search(self.client_1, 'ромашка'), ['0001'])
+
+    def test_search_by_model_name_and_short_query(self):
+        self.assertEqual(len(self._search(self.client_1, 'kubota')), 2)
+        self.assertEqual(self._search(self.client_1, '02'), ['0002'])
+
+    def test_index_follows_updates(self):
+        Machine.objects.filter(serial_number="0002").update(consignee="ООО Ромашка-Север")
+        self.assertEqual(sorted(self._search(self.client_1, 'ромашка')), ['0001', '0002'])
+        self.assertIn('0002', self._search(self.client_1, 'север'))
+        Machine.objects.filter(serial_number="0002").delete()
+        self.assertEqual(self._search(self.client_1, 'север'), [])
+
+    @skipIf(connection.vendor != 'sqlite', 'триггеры FTS5 есть только в SQLite')
+    def test_triggers_survive_migrate(self):
+        # Тестовая БД создана migrate: триггеры на месте, даже если миграция пересоздала main_machine
+        triggers = {f'{FTS_TABLE}_{suffix}' for suffix in ('ai', 'ad', 'au')}
+        self.assertEqual(fts_triggers(), triggers)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {FTS_TABLE}_ai')
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(fts_triggers(), triggers)
+        Machine.objects.filter(serial_number="0002").update(consignee="ООО Ромашка-Север")
+        self.assertIn('0002', self._search(self.client_1, 'север'))
+
+
+class ValuesReadTests(APITestCase):
+    """Чтение через values() должно совпадать с ответом сериализаторов байт в байт."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='сервис', password='123', role=User.Role.SERVICE)
+        handbooks = create_handbooks(technique_model="Силант ПД1,5", engine_model="Eng \"1\"")
+        service_type = ServiceType.objects.create(name="ТО-1")
+        node = FailureNode.objects.create(name="Двигатель")
+        method = RecoveryMethod.objects.create(name="Ремонт")
+        for i, owner in enumerate((self.client_1, self.client_1, client_2, self.client_1)):
+            machine = create_machine(
+                f"000{i}", owner, self.service, handbooks, engine_number=f"E{i}", transmission_number="T",
+                drive_axle_number="D", steering_axle_number="S", supply_contract_num_date="№1, 01.01.2023",
+                shipment_date=date(2023, 1, 1) + timedelta(days=i % 2), consignee="ООО «Ромашка»",
+                delivery_address="г. Чебоксары", equipment_options="" if i else "Кабина\nотопитель",
+            )
+            Maintenance.objects.create(
+                machine=machine, service_type=service_type, event_date="2024-02-01", operating_hours=100 + i,
+                order_number=f"З-{i}", order_date="2024-02-01", service_company=self.service
+            )
+            Complaint.objects.create(
+                machine=machine, failure_date="2024-01-10", operating_hours=10 + i, failure_node=node,
+                failure_description="Стук", recovery_method=method, restoration_date=date(2024, 1, 11 + i),
+                service_company=self.service
+            )
+
+    def assertSameAsSerializer(self, viewset, url, params=None):
+        response = self.client.get(url, params)
+        with mock.patch.object(viewset, 'values_read_actions', ()):
+            expected = self.client.get(url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_lists_match_serializers(self):
+        for user in (self.client_1, self.service):
+            self.client.force_authenticate(user=user)
+            for viewset, name in ((MachineViewSet, 'machine'), (MaintenanceViewSet, 'maintenance'),
+                                  (ComplaintViewSet, 'complaint')):
+                for params in ({}, {'page': 2}, {'ordering': '-id', 'page_size': 10}):
+                    self.assertSameAsSerializer(viewset, reverse(f'{name}-list'), params)
+
+    def test_cursor_pages_and_filters_match_serializers(self):
+        self.client.force_authenticate(user=self.service)
+        response = self.assertSameAsSerializer(
+            ComplaintViewSet, reverse('complaint-list'), {'pagination': 'cursor', 'ordering': '-downtime'}
+        )
+        self.assertSameAsSerializer(ComplaintViewSet, response.data['next'])
+        self.assertSameAsSerializer(
+            MachineViewSet, reverse('machine-list'), {'technique_model__name': 'Силант ПД1,5', 'page_size': 10}
+        )
+
+    def test_retrieve_matches_serializers(self):
+        self.client.force_authenticate(user=self.client_1)
+        machine = Machine.objects.get(serial_number='0000')
+        self.assertSameAsSerializer(MachineViewSet, reverse('machine-detail', args=[machine.pk]))
+        self.assertSameAsSerializer(MaintenanceViewSet, reverse('maintenance-detail', args=[machine.maintenances.get().pk]))
+        self.assertSameAsSerializer(ComplaintViewSet, reverse('complaint-detail', args=[machine.complaints.get().pk]))
+
+        other = Machine.objects.get(serial_number='0002')
+        response = self.assertSameAsSerializer(MachineViewSet, reverse('machine-detail', args=[other.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CONDITIONAL_GET=True)
+    def test_malformed_pk_is_not_found(self):
+        self.client.force_authenticate(user=self.client_1)
+        for basename in ('machine', 'maintenance', 'complaint'):
+            response = self.client.get(reverse(f'{basename}-detail', args=['abc']))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_is_one_query_per_page(self):
+        self.client.force_authenticate(user=self.service)
+        with self.assertNumQueries(2):  # COUNT + страница
+            self.client.get(reverse('machine-list'), {'page_size': 10})
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        owner = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.tech = TechniqueModel.objects.create(name="ПД3,0", description="Вилочный погрузчик")
+        handbooks = create_handbooks(technique_model=self.tech)
+        for i in range(3):
+            create_machine(
+                f"000{i}", owner, self.service, handbooks, shipment_date=date(2023, 1, 1 + i),
+                equipment_options="Длинное описание комплектации",
+            )
+        self.client.force_authenticate(user=self.service)
+
+    def get_with_sql(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('machine-list'), params)
+        return response, queries[-1]['sql']
+
+    def test_fields_shrink_payload_and_query(self):
+        response, sql = self.get_with_sql({'fields': 'serial_number,shipment_date', 'page_size': 10})
+
+        self.assertEqual(response.data['results'][0], {'serial_number': '0000', 'shipment_date': '2023-01-01'})
+        self.assertNotIn('equipment_options', sql)
+        self.assertNotIn('main_techniquemodel', sql)
+
+    def test_expand_handbook_description(self):
+        response, sql = self.get_with_sql({'fields': 'serial_number', 'expand': 'technique_model'})
+
+        self.assertEqual(response.data['results'][0], {
+            'serial_number': '0000',
+            'technique_model': {'id': self.tech.pk, 'name': "ПД3,0", 'description': "Вилочный погрузчик"},
+        })
+        self.assertIn('main_techniquemodel', sql)
+        self.assertNotIn('main_enginemodel', sql)
+
+    def test_cursor_works_without_ordering_field(self):
+        response = self.client.get(reverse('machine-list'), {'fields': 'serial_number', 'pagination': 'cursor'})
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual([row['serial_number'] for row in next_page.data['results']], ['0002'])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('complaint-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('maintenance-list'), {'expand': 'machine'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CONDITIONAL_GET=True)
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        self.tech = TechniqueModel.objects.create(name="Tech1")
+        handbooks = create_handbooks(technique_model=self.tech)
+        self.service_type = ServiceType.objects.create(name="ТО-1")
+        self.machines = [
+            create_machine(f"000{i}", owner, self.service, handbooks)
+            for i, owner in enumerate((self.client_1, self.client_2))
+        ]
+
+    def get(self, user, url, **headers):
+        self.client.force_authenticate(user=user)
+        return self.client.get(url, headers=headers)
+
+    def test_unchanged_list_and_detail_return_304_without_queries(self):
+        for url in (reverse('machine-list'), reverse('machine-detail', args=[self.machines[0].pk])):
+            first = self.get(self.client_1, url)
+            self.assertEqual(first.status_code, status.HTTP_200_OK)
+            with self.assertNumQueries(0):
+                second = self.get(self.client_1, url, if_none_match=first['ETag'])
+            self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+            # Last-Modified отдается, когда секунда изменения уже прошла
+            self.assertNotIn('Last-Modified', first)
+            with mock.patch('main.conditional.time.time', return_value=time.time() + 2):
+                first = self.get(self.client_1, url)
+                second = self.get(self.client_1, url, if_modified_since=first['Last-Modified'])
+            self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_in_same_second_is_not_masked_by_if_modified_since(self):
+        url = reverse('machine-list')
+        self.get(self.client_1, url)
+        self.machines[0].consignee = "Новый"
+        self.machines[0].save()
+        version, _ = change_versions.get('machine', f'client:{self.client_1.pk}')
+        # If-Modified-Since с точностью до секунды — той же, в которой была запись
+        since = http_date(version // 10 ** 9)
+        with mock.patch('main.conditional.time.time', return_value=time.time() + 2):
+            response = self.get(self.client_1, url, if_modified_since=since)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # С If-None-Match решает ETag, If-Modified-Since не учитывается
+            stale = self.get(self.client_1, url, if_none_match='"old"', if_modified_since=response['Last-Modified'])
+            self.assertEqual(stale.status_code, status.HTTP_200_OK)
+
+    def test_changes_reset_only_affected_scopes(self):
+        url = reverse('maintenance-list')
+        etags = {user: self.get(user, url)['ETag'] for user in (self.client_1, self.client_2, self.service)}
+
+        Maintenance.objects.create(
+            machine=self.machines[0], service_type=self.service_type, event_date="2024-01-01",
+            operating_hours=1, order_number="1", order_date="2024-01-01", service_company=self.service
+        )
+        self.assertEqual(self.get(self.client_1, url, if_none_match=etags[self.client_1]).status_code, 200)
+        self.assertEqual(self.get(self.service, url, if_none_match=etags[self.service]).status_code, 200)
+        self.assertEqual(self.get(self.client_2, url, if_none_match=etags[self.client_2]).status_code, 304)
+
+        # Машина сменила владельца: списки меняются у прежнего и нового клиента
+        etag = self.get(self.client_2, reverse('machine-list'))['ETag']
+        self.machines[0].client = self.client_2
+        self.machines[0].save()
+        self.assertEqual(self.get(self.client_2, reverse('machine-list'), if_none_match=etag).status_code, 200)
+        self.assertEqual(self.get(self.client_2, url, if_none_match=etags[self.client_2]).status_code, 200)
+
+    def test_handbook_change_and_query_string_change_etag(self):
+        url = reverse('machine-list')
+        etag = self.get(self.client_1, url)['ETag']
+        self.client.force_authenticate(user=self.client_1)
+        self.assertNotEqual(self.client.get(url, {'page_size': 5})['ETag'], etag)
+
+        self.tech.name = "Tech2"
+        self.tech.save()
+        response = self.get(self.client_1, url, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['technique_model'], "Tech2")
+
+    def test_bulk_create_resets_version(self):
+        url = reverse('maintenance-list')
+        etag = self.get(self.client_1, url)['ETag']
+        self.client.force_authenticate(user=self.service)
+        self.client.post(reverse('maintenance-bulk'), [{
+            'machine': '0000', 'service_type': 'ТО-1', 'event_date': '2024-01-01', 'operating_hours': 1,
+            'order_number': '1', 'order_date': '2024-01-01', 'service_company': 'service',
+        }], format='json')
+        self.assertEqual(self.get(self.client_1, url, if_none_match=etag).status_code, 200)
+
+    def test_after_commit_bump_does_not_query(self):
+        scope_key = change_versions._key('maintenance', f'client:{self.client_1.pk}')
+        with self.captureOnCommitCallbacks() as callbacks:
+            bump_after_commit(change_versions.bump_machines, [self.machines[0].pk], ['maintenance'])
+        version = cache.get(scope_key)
+        with self.assertNumQueries(0):
+            callbacks[0]()
+        self.assertGreater(cache.get(scope_key), version)
+
+    def test_disabled_without_shared_cache(self):
+        # По умолчанию (LocMemCache) версии не видят изменений из других процессов
+        url = reverse('machine-list')
+        etag = self.get(self.client_1, url)['ETag']
+        with override_settings(CONDITIONAL_GET=False):
+            response = self.get(self.client_1, url, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_guest_search_etag(self):
+        url = reverse('guest_search')
+        first = self.client.get(url, {'serial_number': '0000'})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'serial_number': '0000'}, headers={'if_none_match': first['ETag']})
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.machines[0].engine_number = "2"
+        self.machines[0].save()
+        third = self.client.get(url, {'serial_number': '0000'}, headers={'if_none_match': first['ETag']})
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+
+
+@override_settings(AUTH_TOKEN_CACHE_TTL=300)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.token = Token.objects.create(user=self.user)
+        self.url = reverse('handbooks')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_do_not_touch_db(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_deactivation_and_token_deletion(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.client.get(self.url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_is_visible_immediately(self):
+        self.client.get(self.url)
+        self.assertEqual(token_cache.get(self.token.key)[0].role, User.Role.CLIENT)
+        self.user.role = User.Role.MANAGER
+        self.user.save()
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.client.get(self.url)
+        self.assertEqual(token_cache.get(self.token.key)[0].role, User.Role.MANAGER)
+
+    def test_basic_auth_can_be_disabled_for_api(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'client1:123').decode())
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        with override_settings(API_BASIC_AUTH=False):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncReadViewsTests(APITestCase):
+    """Асинхронные представления отдают то же, что и синхронные DRF-версии."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.token = Token.objects.create(user=self.user)
+        for name in ("ТО-1", "ТО-2", "ТО-3"):
+            ServiceType.objects.create(name=name, description=f"Описание {name}")
+        create_machine("0001", self.user, self.user, create_handbooks())
+        self.factory = APIRequestFactory()
+
+    def call(self, view, url, params=None, HTTP_IF_NONE_MATCH=None, **kwargs):
+        headers = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        if HTTP_IF_NONE_MATCH:
+            headers['HTTP_IF_NONE_MATCH'] = HTTP_IF_NONE_MATCH
+        request = self.factory.get(url, params, **headers)
+        return async_to_sync(view.as_view())(request, **kwargs)
+
+    def test_guest_search_matches_sync(self):
+        url = reverse('guest_search')
+        for serial in ("0001", "0001", "nope", "nope"):
+            expected = self.client.get(url, {'serial_number': serial})
+            cache.clear()
+            response = self.call(async_views.AsyncGuestMachineSearchView, url, {'serial_number': serial})
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        self.call(async_views.AsyncGuestMachineSearchView, url, {'serial_number': '0001'})
+        hit = self.call(async_views.AsyncGuestMachineSearchView, url, {'serial_number': '0001'})
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        not_modified = self.call(async_views.AsyncGuestMachineSearchView, url, {'serial_number': '0001'},
+                                 HTTP_IF_NONE_MATCH=hit['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_handbook_list_and_detail_match_sync(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        url = reverse('service_type-list')
+        cursor = self.client.get(url, {'pagination': 'cursor', 'page_size': 2}).data['next']
+        for params in ({}, {'page': 2}, {'page_size': 10}, {'page': 9}, {'page': 'last', 'page_size': 2},
+                       {'pagination': 'cursor', 'page_size': 2}, {'cursor': cursor.split('cursor=')[1]},
+                       {'cursor': 'garbage'}, {'pagination': 'nocount', 'page_size': 2, 'count': 'exact'},
+                       {'pagination': 'nocount', 'page': 2, 'page_size': 2, 'count': 'estimate'}):
+            expected = self.client.get(url, params)
+            response = self.call(async_views.AsyncServiceTypeView, url, params)
+            self.assertEqual(response.status_code, expected.status_code, params)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content), params)
+
+        pk = ServiceType.objects.get(name="ТО-2").pk
+        for key in (pk, 999):
+            detail_url = reverse('service_type-detail', args=[key])
+            expected = self.client.get(detail_url)
+            response = self.call(async_views.AsyncServiceTypeView, detail_url, pk=key)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_handbook_list_reads_rows_without_sync_paginator(self):
+        url = reverse('service_type-list')
+        with mock.patch.object(HybridPagination, 'paginate_queryset', side_effect=AssertionError):
+            for params in ({}, {'pagination': 'cursor', 'page_size': 2}, {'pagination': 'nocount'}):
+                response = self.call(async_views.AsyncServiceTypeView, url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, params)
+
+    def test_guest_cache_uses_native_async_backend(self):
+        calls = []
+
+        class NativeAsyncCache(LocMemCache):
+            async def aget(self, key, default=None, version=None):
+                calls.append('aget')
+                return self.get(key, default, version)
+
+            async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+                calls.append('aset')
+                self.set(key, value, timeout, version)
+
+        native = GuestSearchCache(NativeAsyncCache('native-async-test', {}))
+        self.assertTrue(native.native_async)
+        self.assertFalse(guest_search_cache.native_async)
+        entry = async_to_sync(native.aset)('0001', {'serial_number': '0001'})
+        self.assertEqual(async_to_sync(native.aget)('0001'), entry)
+        self.assertEqual(native.get('0001'), entry)
+        self.assertEqual(set(calls), {'aget', 'aset'})
+
+    def test_handbooks_require_authentication(self):
+        request = self.factory.get(reverse('service_type-list'))
+        response = async_to_sync(async_views.AsyncServiceTypeView.as_view())(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class DatabaseStatsTests(APITestCase):
+    def test_manager_only(self):
+        manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        client = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+
+        self.client.force_authenticate(user=client)
+        self.assertEqual(self.client.get(reverse('db_stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=manager)
+        response = self.client.get(reverse('db_stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['vendor'], connection.vendor)
+        self.assertIsNone(response.data['pool'])
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        self.client_user = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+
+    def test_access(self):
+        external = {'REMOTE_ADDR': '203.0.113.5'}
+        self.assertIn(self.client.get(reverse('metrics'), **external).status_code,
+                      (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+        self.client.force_authenticate(user=self.client_user)
+        self.assertEqual(self.client.get(reverse('metrics'), **external).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get(reverse('metrics'), **external).status_code, status.HTTP_200_OK)
+
+        # Внутренний адрес (тестовый клиент — 127.0.0.1) без входа
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_request_metrics(self):
+        self.client.force_authenticate(user=self.manager)
+        self.client.get(reverse('machine-list'))
+        self.client.get(reverse('guest_search'), {'serial_number': 'NONE'})
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('silant_http_requests_total{view="machine-list",method="GET",status="200"} 1', text)
+        self.assertIn('silant_http_requests_total{view="guest_search",method="GET",status="404"} 1', text)
+        self.assertIn('silant_http_request_duration_seconds_count{view="machine-list",method="GET"} 1', text)
+        self.assertIn('silant_http_response_size_bytes_bucket{view="machine-list",le="+Inf"} 1', text)
+        self.assertRegex(text, r'silant_db_queries_per_request_sum\{view="machine-list"\} [1-9]')
+        self.assertIn('silant_db_time_seconds_count{view="machine-list"} 1', text)
+        self.assertIn('silant_cache_hit_ratio{cache="guest_search"}', text)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=300)
+    def test_token_cache_ratio(self):
+        token = Token.objects.create(user=self.manager)
+        for _ in range(3):
+            self.client.get(reverse('service_type-list'), HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('silant_cache_requests_total{cache="auth_token",result="hit"} 2', text)
+        self.assertIn('silant_cache_requests_total{cache="auth_token",result="miss"} 1', text)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_query_log(self):
+        self.client.force_authenticate(user=self.manager)
+        with self.assertLogs('main.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('machine-list'))
+        self.assertIn('представление machine-list', logs.output[0])
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertRegex(text, r'silant_slow_queries_total\{view="machine-list"\} [1-9]')
+
+
+class FleetBenchmarkTests(APITestCase):
+    def _generate(self, **options):
+        call_command('generate_fleet', stdout=StringIO(), clients=3, service_companies=2, handbook_size=3,
+                     maintenances=4, complaints=2, **options)
+
+    def test_generate_fleet(self):
+        self._generate(machines=12, batch_size=5)
+        self.assertEqual(Machine.objects.count(), 12)
+        self.assertEqual(Maintenance.objects.count(), 48)
+        self.assertEqual(Complaint.objects.count(), 24)
+        self.assertEqual(MachineReliability.objects.count(), 12)
+
+        # Наработка растет вместе с датой, события — после отгрузки
+        machine = Machine.objects.order_by('id').first()
+        events = sorted(
+            [(m.event_date, m.operating_hours) for m in machine.maintenances.all()]
+            + [(c.failure_date, c.operating_hours) for c in machine.complaints.all()]
+        )
+        self.assertEqual([hours for _, hours in events], sorted(hours for _, hours in events))
+        self.assertGreater(events[0][0], machine.shipment_date)
+
+        # Повторный запуск досоздает только новые машины, с теми же данными
+        self._generate(machines=15)
+        self.assertEqual(Machine.objects.count(), 15)
+        self.assertEqual(Machine.objects.order_by('id').first().shipment_date, machine.shipment_date)
+
+        self._generate(machines=1, clear=True)
+        self.assertFalse(Machine.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='syn_').exists())
+
+    def test_benchmark_report(self):
+        self._generate(machines=5)
+        counts = (Machine.objects.count(), Maintenance.objects.count(), Complaint.objects.count())
+        path = tempfile.mktemp(suffix='.json')
+        self.addCleanup(lambda: os.path.exists(path) and os.remove(path))
+
+        call_command('benchmark_api', stdout=StringIO(), requests=2, warmup=1, writes=True, json_path=path)
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['meta']['dataset']['machines'], 5)
+        rows = {(row['role'], row['scenario']): row for row in report['results']}
+        for scenario in ('machine.list', 'machine.passport', 'machine.search', 'complaint.downtime',
+                         'maintenance.export', 'service_type.retrieve'):
+            self.assertEqual(rows[('client', scenario)]['status'], '200')
+        self.assertEqual(rows[('guest', 'guest_search')]['queries'], 0)
+        self.assertEqual(rows[('manager', 'machine.create')]['status'], '201')
+        self.assertEqual(rows[('client', 'machine.create')]['status'], '403')
+        # Записи откатываются
+        self.assertEqual((Machine.objects.count(), Maintenance.objects.count(), Complaint.objects.count()), counts)
+
+
+# Бюджет запросов к БД на маршрут: число для всех ролей или {роль: число}.
+# Запросы аутентификации не входят (force_authenticate), кэши прогреты.
+QUERY_BUDGETS = {
+    'machine-list': 2,  # COUNT + страница
+    'machine-detail': 1,
+    'machine-export': 1,
+    'machine-passport': 3,  # машина, ТО, рекламации
+    'machine-search': 2,  # FTS + машины
+    'maintenance-list': 2,
+    'maintenance-detail': 1,
+    'maintenance-export': 1,
+    'complaint-list': 2,
+    'complaint-detail': 1,
+    'complaint-downtime': 1,
+    'complaint-export': 1,
+    'service_type-list': 2,
+    'service_type-detail': 1,
+    'failure_node-list': 2,
+    'failure_node-detail': 1,
+    'recovery_method-list': 2,
+    'recovery_method-detail': 1,
+    'maintenance_forecast-list': 2,
+    'maintenance_forecast-detail': 1,
+}
+
+
+class QueryBudgetTests(APITestCase):
+    """
+    Каждый маршрут роутера для каждой роли: число запросов к БД не зависит от числа строк
+    (1 и 500 машин, ТО, рекламаций и записей справочников) и не превышает бюджета.
+    """
+    sizes = (1, 500)
+    page_size = 100
+    action_params = {
+        'search': {'q': 'QB0', 'limit': 100},
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            User.Role.MANAGER: User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER),
+            User.Role.CLIENT: User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT),
+            User.Role.SERVICE: User.objects.create_user(username='service1', password='123', role=User.Role.SERVICE),
+        }
+
+    def grow(self, size):
+        """Доводит число записей каждого справочника, машин, ТО и рекламаций до size."""
+        start = Machine.objects.count()
+        indexes = range(start, size)
+        handbooks = {}
+        for model in (TechniqueModel, EngineModel, TransmissionModel, DriveAxleModel, SteeringAxleModel,
+                      ServiceType, FailureNode, RecoveryMethod):
+            model.objects.bulk_create([model(name=f'{model.__name__} {i}') for i in indexes])
+            handbooks[model] = list(model.objects.order_by('id').values_list('id', flat=True))
+
+        client, service = self.users[User.Role.CLIENT], self.users[User.Role.SERVICE]
+        Machine.objects.bulk_create([
+            Machine(
+                serial_number=f'QB{i:04d}', engine_number=f'E{i}', transmission_number=f'T{i}',
+                drive_axle_number=f'D{i}', steering_axle_number=f'S{i}', supply_contract_num_date='C',
+                shipment_date=date(2023, 1, 1) + timedelta(days=i), consignee='C', delivery_address='A',
+                client=client, service_company=service,
+                technique_model_id=handbooks[TechniqueModel][i], engine_model_id=handbooks[EngineModel][i],
+                transmission_model_id=handbooks[TransmissionModel][i],
+                drive_axle_model_id=handbooks[DriveAxleModel][i],
+                steering_axle_model_id=handbooks[SteeringAxleModel][i],
+            )
+            for i in indexes
+        ])
+        # История копится на первой машине — так растет и паспорт
+        first = Machine.objects.order_by('id').first()
+        Maintenance.objects.bulk_create([
+            Maintenance(machine=first, service_type_id=handbooks[ServiceType][i], event_date=date(2024, 1, 1),
+                        operating_hours=i, order_number=f'Z{i}', order_date=date(2024, 1, 1),
+                        service_company=service)
+            for i in indexes
+        ])
+        Complaint.objects.bulk_create([
+            Complaint(machine=first, failure_date=date(2024, 1, 1), operating_hours=i,
+                      failure_node_id=handbooks[FailureNode][i], failure_description='F',
+                      recovery_method_id=handbooks[RecoveryMethod][i], restoration_date=date(2024, 1, 5),
+                      service_company=service)
+            for i in indexes
+        ])
+        rebuild_reliability()
+        # Прогноз — по первому виду ТО: таблица растет вместе с числом машин
+        ServiceType.objects.filter(id=handbooks[ServiceType][0]).update(interval_hours=250)
+        rebuild_forecasts()
+        handbook_registry.invalidate()
+        guest_search_cache.invalidate_all()
+
+    def routes(self):
+        """(имя маршрута, адрес, параметры) для list, retrieve и GET-действий роутера."""
+        routes = []
+        for _, viewset, basename in router.registry:
+            pk = viewset.serializer_class.Meta.model.objects.order_by('id').values_list('id', flat=True).first()
+            routes.append((f'{basename}-list', reverse(f'{basename}-list'), {'page_size': self.page_size}))
+            routes.append((f'{basename}-detail', reverse(f'{basename}-detail', args=[pk]), {}))
+            for extra in viewset.get_extra_actions():
+                if 'get' not in extra.mapping:
+                    continue
+                name = f'{basename}-{extra.url_name}'
+                path = reverse(name, args=[pk]) if extra.detail else reverse(name)
+                routes.append((name, path, self.action_params.get(extra.url_name, {})))
+        return routes
+
+    def measure(self):
+        counts = {}
+        for role, user in self.users.items():
+            self.client.force_authenticate(user=user)
+            for name, path, params in self.routes():
+                # Первый запрос прогревает кэши (реестр справочников, версии ETag)
+                self.client.get(path, params)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path, params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, f'{name} ({role})')
+                counts[name, role] = len(queries.captured_queries)
+        return counts
+
+    def test_query_count_does_not_grow(self):
+        measured = []
+        for size in self.sizes:
+            self.grow(size)
+            measured.append(self.measure())
+
+        small, large = measured
+        for (name, role), count in large.items():
+            with self.subTest(route=name, role=role):
+                self.assertIn(name, QUERY_BUDGETS, 'маршрут без бюджета запросов')
+                budget = QUERY_BUDGETS[name]
+                if isinstance(budget, dict):
+                    budget = budget[role]
+                self.assertEqual(count, small[name, role], 'число запросов растет вместе с данными (N+1)')
+                self.assertLessEqual(count, budget, 'превышен бюджет запросов')
+
+    def test_admin_changelists(self):
+        admin = User.objects.create_superuser(username='admin', password='123', role=User.Role.MANAGER)
+        self.client.force_login(admin)
+        measured = []
+        for size in self.sizes:
+            self.grow(size)
+            counts = {}
+            for model in ('machine', 'maintenance', 'complaint'):
+                path = reverse(f'admin:main_{model}_changelist')
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                counts[model] = len(queries.captured_queries)
+            measured.append(counts)
+        self.assertEqual(measured[0], measured[1])
+
+
+class RenderingCompressionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        ServiceType.objects.bulk_create([
+            ServiceType(name=f'ТО-{i}', description='Плановое техническое обслуживание ' * 5) for i in range(50)
+        ])
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('service_type-list')
+        self.params = {'page_size': 50}
+
+    def test_orjson_output_matches_drf_json(self):
+        data = {'name': 'Двигатель\u2028', 'items': [1, 2.5, None, True], 'nested': {'a': 'б'}}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        # Отступы (Browsable API, Accept: ...; indent=) — стандартный рендерер
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+        response = self.client.get(self.url, self.params)
+        self.assertIn('ТО-1'.encode(), response.content)
+        self.assertEqual(json.loads(response.content), response.data)
+
+    def test_orjson_parser(self):
+        response = self.client.post(reverse('maintenance-bulk'), data='[{"machine": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+    @override_settings(CONDITIONAL_GET=True)
+    def test_gzip_above_threshold(self):
+        plain = self.client.get(self.url, self.params)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+        response = self.client.get(self.url, self.params, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+        # Ответ меньше порога не сжимается
+        with override_settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.client.get(self.url, self.params, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=10)
+    def test_compressed_handbook_bundle_revalidates(self):
+        # Сжатый ответ несет слабый ETag — браузер возвращает именно его
+        url = reverse('handbooks')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertTrue(response.has_header('Content-Encoding'))
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        not_modified = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @skipIf(brotli is None, 'brotli не установлен')
+    def test_brotli_negotiation(self):
+        plain = self.client.get(self.url, self.params)
+        response = self.client.get(self.url, self.params, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5'), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, *'), 'gzip')
+        self.assertIsNone(choose_encoding('identity'))
+
+    def test_streaming_export_is_compressed(self):
+        plain = b''.join(self.client.get(reverse('maintenance-export')).streaming_content)
+        response = self.client.get(reverse('maintenance-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+
+class OpenAPISchemaTests(APITestCase):
+    """Схема OpenAPI строится один раз и отдается с ETag и долгим кэшем по версионированному адресу."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'openapi.json')
+        override = override_settings(OPENAPI_SCHEMA_PATH=self.path)
+        override.enable()
+        self.addCleanup(override.disable)
+        schema_artifact.reset()
+        self.addCleanup(schema_artifact.reset)
+
+    def test_command_writes_artifact(self):
+        out = StringIO()
+        call_command('generate_openapi_schema', stdout=out)
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        schema = json.loads(content)
+        self.assertIn('/api/machines/', schema['paths'])
+        self.assertIn(schema_artifact.version, out.getvalue())
+
+        # Воркер читает файл, а не генерирует схему заново
+        schema_artifact.reset()
+        with mock.patch.object(schema_artifact, 'build') as build:
+            response = self.client.get(reverse('openapi_schema'))
+        build.assert_not_called()
+        self.assertEqual(response.content, content)
+
+    def test_schema_etag_and_cache_headers(self):
+        with mock.patch.object(schema_artifact, 'build', wraps=schema_artifact.build) as build:
+            response = self.client.get(reverse('openapi_schema'))
+            self.client.get(reverse('openapi_schema'))
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{schema_artifact.version}"')
+
+        response = self.client.get(reverse('openapi_schema'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        # Старый адрес swagger/?format=openapi отдает тот же файл
+        response = self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})
+        self.assertEqual(response['ETag'], etag)
+
+    def test_versioned_url(self):
+        _, version = schema_artifact.load()
+        url = reverse('openapi_schema_version', args=[version])
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertIn('paths', json.loads(response.content))
+
+        response = self.client.get(reverse('openapi_schema_version', args=['0' * 16]))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+
+        # Swagger UI ссылается на версионированный адрес
+        response = self.client.get(reverse('schema-swagger-ui'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(url.encode(), response.content)
+
+
+class SyncFeedTests(APITestCase):
+    """Лента изменений: номера по возрастанию, удаления и потеря доступа, курсор, видимость по роли."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(username='manager', password='123', role=User.Role.MANAGER)
+        self.client_1 = User.objects.create_user(username='client1', password='123', role=User.Role.CLIENT)
+        self.client_2 = User.objects.create_user(username='client2', password='123', role=User.Role.CLIENT)
+        self.service = User.objects.create_user(username='service', password='123', role=User.Role.SERVICE)
+        self.service_type = ServiceType.objects.create(name="ТО-1")
+        self.handbooks = create_handbooks()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machines = [self._machine(serial, owner) for serial, owner in
+                             (("0001", self.client_1), ("0002", self.client_2))]
+
+    def _machine(self, serial, owner):
+        return create_machine(serial, owner, self.service, self.handbooks)
+
+    def _maintenance(self, machine, order_number):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Maintenance.objects.create(
+                machine=machine, service_type=self.service_type, event_date="2024-01-10", operating_hours=100,
+                order_number=order_number, order_date="2024-01-09", service_company=self.service
+            )
+
+    def _sync(self, user, cursor=None, **params):
+        self.client.force_authenticate(user=user)
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @staticmethod
+    def _summary(data):
+        return [(change['resource'], change['action'], change.get('data', {}).get('serial_number')
+                 or change.get('data', {}).get('order_number')) for change in data['changes']]
+
+    def test_initial_sync_then_deltas(self):
+        data = self._sync(self.manager)
+        self.assertEqual(self._summary(data), [('machine', 'upsert', '0001'), ('machine', 'upsert', '0002')])
+        self.assertEqual(data['changes'][0]['data']['technique_model'], 'Tech1')
+        self.assertFalse(data['has_more'])
+        cursors = {user: self._sync(user)['cursor'] for user in (self.manager, self.client_1, self.client_2)}
+
+        self.assertEqual(self._sync(self.manager, cursors[self.manager])['changes'], [])
+        maintenance = self._maintenance(self.machines[0], 'Z1')
+        self.assertEqual(self._summary(self._sync(self.client_1, cursors[self.client_1])),
+                         [('maintenance', 'upsert', 'Z1')])
+        self.assertEqual(self._sync(self.client_2, cursors[self.client_2])['changes'], [])
+
+        maintenance_id = maintenance.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            maintenance.delete()
+        data = self._sync(self.client_1, cursors[self.client_1])
+        # Объект удален до синхронизации: остается только tombstone
+        self.assertEqual(data['changes'], [
+            {'seq': data['changes'][0]['seq'], 'resource': 'maintenance', 'id': maintenance_id, 'action': 'delete'}
+        ])
+
+    def test_pages_and_latest_state(self):
+        cursor = self._sync(self.manager)['cursor']
+        for consignee in ('B', 'C', 'D'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.machines[0].consignee = consignee
+                self.machines[0].save()
+        data = self._sync(self.manager, cursor)
+        self.assertEqual(len(data['changes']), 1)
+        self.assertEqual(data['changes'][0]['data']['consignee'], 'D')
+
+        seen = []
+        cursor = None
+        while True:
+            data = self._sync(self.manager, cursor, limit=1)
+            seen += [change['seq'] for change in data['changes']]
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, sorted(seen))
+        # Схлопываются записи одной страницы; по одной записи на страницу видны все пять
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 5)
+
+    def test_owner_change_revokes_access(self):
+        self._maintenance(self.machines[0], 'Z1')
+        cursors = {user: self._sync(user)['cursor'] for user in (self.manager, self.client_1, self.client_2, self.service)}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machines[0].client = self.client_2
+            self.machines[0].save()
+
+        self.assertEqual(self._summary(self._sync(self.client_1, cursors[self.client_1])),
+                         [('machine', 'delete', None), ('maintenance', 'delete', None)])
+        self.assertEqual(sorted(self._summary(self._sync(self.client_2, cursors[self.client_2]))),
+                         [('machine', 'upsert', '0001'), ('maintenance', 'upsert', 'Z1')])
+        # Сервис и менеджер доступ не теряли — для них только upsert
+        for user in (self.service, self.manager):
+            actions = {change['action'] for change in self._sync(user, cursors[user])['changes']}
+            self.assertEqual(actions, {'upsert'})
+
+    def test_tombstones_survive_user_delete(self):
+        cursor = self._sync(self.manager)['cursor']
+        machine_id = self.machines[1].pk
+        client_3 = User.objects.create_user(username='client3', password='123', role=User.Role.CLIENT)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.machines[1].delete()
+            # У прежнего клиента переданной машины остаются только строки revoke
+            self.machines[0].client = client_3
+            self.machines[0].save()
+        revokes = Change.objects.filter(action=Change.Action.REVOKE).count()
+
+        self.client_1.delete()
+        self.client_2.delete()
+        self.assertEqual(Change.objects.filter(action=Change.Action.REVOKE).count(), revokes)
+        changes = self._sync(self.manager, cursor)['changes']
+        self.assertIn(('machine', machine_id, 'delete'),
+                      [(change['resource'], change['id'], change['action']) for change in changes])
+
+    def test_write_and_journal_commit_together(self):
+        self.client.force_authenticate(user=self.manager)
+        machine = self.machines[0]
+        # Сбой записи журнала откатывает и само изменение: в базе нет правок, которых нет в ленте
+        with mock.patch('main.signals.log_changes', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(reverse('machine-detail', args=[machine.pk]), {'consignee': 'Новый'})
+        machine.refresh_from_db()
+        self.assertEqual(machine.consignee, 'C')
+
+    def test_publish_assigns_increasing_numbers(self):
+        last = Change.objects.order_by('-seq').values_list('seq', flat=True).first()
+        # Запись транзакции, закоммиченной позже, получает номер следующей публикацией
+        Change.objects.create(resource='machine', object_id=self.machines[1].pk, action='upsert',
+                              client=self.client_2, service_company=self.service)
+        publish_changes()
+        published = Change.objects.order_by('-seq').values_list('seq', flat=True).first()
+        self.assertGreater(published, last)
+        self.assertFalse(Change.objects.filter(seq__isnull=True).exists())
+
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get(reverse('sync'), {'cursor': 'bad'}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('sync'), {'resources': 'users'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow(self):
+        cursor = self._sync(self.manager)['cursor']
+        self._maintenance(self.machines[0], 'Z0')
+        self.client.force_authenticate(user=self.manager)
+        with self.assertNumQueries(3) as small:  # журнал, машины, ТО
+            self.client.get(reverse('sync'))
+        for i in range(20):
+            self._maintenance(self.machines[i % 2], f'Z{i + 1}')
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(reverse('sync'))
+        self.assertEqual(len(response.data['changes']), 23)
+        self.assertEqual(len(self._sync(self.manager, cursor, resources='maintenance')['changes']), 21)
@@ -1,18 +1,34 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, Count, Sum
 from rest_framework.filters import OrderingFilter
 
 
-from .models import Machine, Maintenance, Complaint, User, ServiceType, FailureNode, RecoveryMethod
+from .models import (
+    Machine, Maintenance, Complaint, User, ServiceType, FailureNode, RecoveryMethod,
+    TechniqueModel, EngineModel, MaintenanceForecast
+)
 from .serializers import (
     MachineSerializer, MachineShortSerializer,
     MaintenanceSerializer, ComplaintSerializer, ServiceTypeSerializer, FailureNodeSerializer,
-    RecoveryMethodSerializer
+    RecoveryMethodSerializer, MaintenanceForecastSerializer
 )
-from .permissions import IsManager, IsService, IsClient
+from .permissions import IsManager, IsService, IsClient, IsInternalNetwork
+from .mixins import AtomicWriteMixin, BulkCreateMixin, ExportMixin, ValuesReadMixin, ScopedQuerysetMixin
+from .cache import guest_search_cache
+from .filters import MachineFilter, ComplaintFilter, MaintenanceForecastFilter
+from .handbooks import handbook_registry
+from .analytics import GROUPINGS, reliability_report, scope_for
+from .search import search_machines
+from .conditional import ConditionalGetMixin, etag_matches
+from .dbstats import connection_stats
+from .sync import read_changes, attach_data, encode_cursor, decode_cursor
+from .metrics import PrometheusRenderer, render_prometheus, worker_snapshots
 
 
 # -------------------------------------------------------------------------
@@ -23,49 +39,115 @@ class GuestMachineSearchView(APIView):
     """
     Позволяет любому пользователю найти машину по заводскому номеру
     и получить ограниченные данные (поля 1-10).
+    Ответы (включая 404) кэшируются, см. main/cache.py.
+    ETag хранится в той же записи кэша: 304 отдается без обращения к БД.
     """
     permission_classes = [permissions.AllowAny]
+    not_found_message = 'No Machine matches the given query.'
 
     def get(self, request):
         serial_number = request.query_params.get('serial_number')
         if not serial_number:
             return Response({"error": "Введите заводской номер"}, status=status.HTTP_400_BAD_REQUEST)
 
-        machine = get_object_or_404(Machine, serial_number=serial_number)
+        entry = guest_search_cache.get(serial_number)
+        if entry is not None:
+            if not entry['found']:
+                raise Http404(self.not_found_message)
+            headers = {'X-Cache': 'HIT', 'ETag': entry['etag']}
+            if etag_matches(request, entry['etag']):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            return Response(entry['data'], headers=headers)
+
+        queryset = Machine.objects.select_related(
+            'technique_model', 'engine_model', 'transmission_model',
+            'drive_axle_model', 'steering_axle_model'
+        )
+        try:
+            machine = get_object_or_404(queryset, serial_number=serial_number)
+        except Http404:
+            guest_search_cache.set_missing(serial_number)
+            raise
 
         serializer = MachineShortSerializer(machine)
-        return Response(serializer.data)
+        entry = guest_search_cache.set(serial_number, serializer.data)
+        if etag_matches(request, entry['etag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'X-Cache': 'MISS', 'ETag': entry['etag']})
+        return Response(serializer.data, headers={'X-Cache': 'MISS', 'ETag': entry['etag']})
 
 
 # -------------------------------------------------------------------------
 # 2. API для Машин (Авторизованные)
 # -------------------------------------------------------------------------
 
-class MachineViewSet(viewsets.ModelViewSet):
+class MachineViewSet(AtomicWriteMixin, ScopedQuerysetMixin, ConditionalGetMixin, ValuesReadMixin, ExportMixin,
+                     viewsets.ModelViewSet):
     """
     CRUD для машин.
     - Менеджер: видит все, может создавать/редактировать.
     - Клиент: видит только свои (read-only).
     - Сервис: видит только машины, которые обслуживает (read-only).
+    - Список и карточка читаются через values() без сериализатора (ValuesReadMixin),
+      ?fields= — только нужные поля, ?expand=<справочник> — с описанием.
+    - ETag / Last-Modified: повторный запрос без изменений — 304 без обращения к списку.
+    - GET export/ — потоковая выгрузка CSV/NDJSON с теми же фильтрами.
+    - GET {id}/passport/ — машина с полной историей ТО и рекламаций.
+    - GET find/?q= — поиск по номерам агрегатов, грузополучателю, адресу и моделям.
     """
     serializer_class = MachineSerializer
+    conditional_resource = 'machine'
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = {
-        'technique_model__name': ['exact', 'icontains'],
-        'engine_model__name': ['exact', 'icontains'],
-        'transmission_model__name': ['exact', 'icontains'],
-        'drive_axle_model__name': ['exact', 'icontains'],
-        'steering_axle_model__name': ['exact', 'icontains'],
+    # Фильтры по названиям справочников (exact/icontains) без JOIN, см. main/filters.py
+    filterset_class = MachineFilter
+    # Только скалярные NOT NULL поля: по ним работает keyset-курсор (с id для уникальности)
+    ordering_fields = [
+        'id', 'serial_number', 'shipment_date', 'engine_number', 'transmission_number',
+        'drive_axle_number', 'steering_axle_number', 'consignee', 'delivery_address',
+    ]
+    export_fields = {
+        'id': 'id',
+        'serial_number': 'serial_number',
+        'technique_model': 'technique_model__name',
+        'engine_model': 'engine_model__name',
+        'engine_number': 'engine_number',
+        'transmission_model': 'transmission_model__name',
+        'transmission_number': 'transmission_number',
+        'drive_axle_model': 'drive_axle_model__name',
+        'drive_axle_number': 'drive_axle_number',
+        'steering_axle_model': 'steering_axle_model__name',
+        'steering_axle_number': 'steering_axle_number',
+        'supply_contract_num_date': 'supply_contract_num_date',
+        'shipment_date': 'shipment_date',
+        'consignee': 'consignee',
+        'delivery_address': 'delivery_address',
+        'equipment_options': 'equipment_options',
+        'client': 'client__username',
+        'service_company': 'service_company__username',
+    }
+    expandable_fields = {
+        'technique_model': 'technique_model',
+        'engine_model': 'engine_model',
+        'transmission_model': 'transmission_model',
+        'drive_axle_model': 'drive_axle_model',
+        'steering_axle_model': 'steering_axle_model',
     }
-    ordering_fields = '__all__'
 
-    def get_queryset(self):
+    def get_scoped_queryset(self):
         user = self.request.user
 
         qs = Machine.objects.select_related(
             'technique_model', 'engine_model', 'transmission_model',
             'drive_axle_model', 'steering_axle_model', 'client', 'service_company'
         )
+        if self.action == 'passport':
+            qs = qs.prefetch_related(
+                Prefetch('maintenances', queryset=Maintenance.objects.select_related(
+                    'service_type', 'service_company'
+                )),
+                Prefetch('complaints', queryset=Complaint.objects.select_related(
+                    'failure_node', 'recovery_method', 'service_company'
+                )),
+            )
 
         if user.role == User.Role.MANAGER:
             return qs.all()
@@ -76,6 +158,42 @@ class MachineViewSet(viewsets.ModelViewSet):
 
         return qs.none()
 
+    search_max_results = 100
+
+    # machines/search/ уже занят гостевым поиском по заводскому номеру
+    @action(detail=False, methods=['get'], url_path='find')
+    def search(self, request):
+        """
+        Ранжированный поиск в пределах видимых пользователю машин (индексы — см. main/search.py).
+        ?q= — строка поиска, ?limit= — число результатов (по умолчанию 20).
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Введите строку поиска"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.search_max_results)
+        except ValueError:
+            limit = 20
+
+        machines = search_machines(self.get_queryset(), request.user, query, max(limit, 1))
+        data = self.get_serializer(machines, many=True).data
+        for item, machine in zip(data, machines):
+            item['rank'] = machine.search_rank
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def passport(self, request, pk=None):
+        """
+        Сервисная книжка машины: данные машины + все ТО + все рекламации.
+        Фиксированное число запросов (машина, ТО, рекламации) независимо от длины истории.
+        """
+        machine = self.get_object()
+        context = self.get_serializer_context()
+        data = MachineSerializer(machine, context=context).data
+        data['maintenances'] = MaintenanceSerializer(machine.maintenances.all(), many=True, context=context).data
+        data['complaints'] = ComplaintSerializer(machine.complaints.all(), many=True, context=context).data
+        return Response(data)
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [IsManager]
@@ -88,19 +206,33 @@ class MachineViewSet(viewsets.ModelViewSet):
 # 3. API для ТО
 # -------------------------------------------------------------------------
 
-class MaintenanceViewSet(viewsets.ModelViewSet):
+class MaintenanceViewSet(AtomicWriteMixin, ScopedQuerysetMixin, ConditionalGetMixin, ValuesReadMixin, BulkCreateMixin,
+                         ExportMixin, viewsets.ModelViewSet):
     """
     - Менеджер: всё.
     - Клиент: просмотр ТО своих машин.
     - Сервис: просмотр и создание ТО для своих машин.
+    - POST bulk/ — пакетная загрузка, ?upsert=1 — по ключу (машина, № заказ-наряда).
+    - Список и карточка — через values() и с ETag, как у машин.
     """
     serializer_class = MaintenanceSerializer
+    conditional_resource = 'maintenance'
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['service_type', 'machine__serial_number', 'service_company']
-    ordering_fields = '__all__'
-
+    ordering_fields = ['id', 'event_date', 'operating_hours', 'order_number', 'order_date']
+    export_fields = {
+        'id': 'id',
+        'machine': 'machine__serial_number',
+        'service_type': 'service_type__name',
+        'event_date': 'event_date',
+        'operating_hours': 'operating_hours',
+        'order_number': 'order_number',
+        'order_date': 'order_date',
+        'service_company': 'service_company__username',
+    }
+    expandable_fields = {'service_type': 'service_type'}
 
-    def get_queryset(self):
+    def get_scoped_queryset(self):
         user = self.request.user
         qs = Maintenance.objects.select_related('machine', 'service_type', 'service_company')
 
@@ -114,7 +246,7 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
         return qs.none()
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'bulk', 'update', 'partial_update']:
             permission_classes = [IsManager | IsService]
         elif self.action == 'destroy':
             permission_classes = [IsManager]
@@ -127,16 +259,34 @@ class MaintenanceViewSet(viewsets.ModelViewSet):
 # 4. API для Рекламаций
 # -------------------------------------------------------------------------
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(AtomicWriteMixin, ScopedQuerysetMixin, ConditionalGetMixin, ValuesReadMixin, BulkCreateMixin,
+                       ExportMixin, viewsets.ModelViewSet):
     """
-    Логика аналогична ТО.
+    Логика аналогична ТО (включая пакетную загрузку bulk/ без upsert, чтение через values() и ETag).
+    - downtime считается в SQL: ?ordering=-downtime, ?downtime_min=&downtime_max=.
+    - GET downtime/ — суммарный простой по машинам одним запросом.
     """
     serializer_class = ComplaintSerializer
+    conditional_resource = 'complaint'
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['failure_node', 'recovery_method', 'service_company']
-    ordering_fields = '__all__'
+    filterset_class = ComplaintFilter
+    ordering_fields = ['id', 'failure_date', 'operating_hours', 'restoration_date', 'downtime']
+    export_fields = {
+        'id': 'id',
+        'machine': 'machine__serial_number',
+        'failure_date': 'failure_date',
+        'operating_hours': 'operating_hours',
+        'failure_node': 'failure_node__name',
+        'failure_description': 'failure_description',
+        'recovery_method': 'recovery_method__name',
+        'spare_parts_used': 'spare_parts_used',
+        'restoration_date': 'restoration_date',
+        'service_company': 'service_company__username',
+        'downtime': 'downtime_days',
+    }
+    expandable_fields = {'failure_node': 'failure_node', 'recovery_method': 'recovery_method'}
 
-    def get_queryset(self):
+    def get_scoped_queryset(self):
         user = self.request.user
         qs = Complaint.objects.select_related('machine', 'failure_node', 'recovery_method', 'service_company')
 
@@ -149,8 +299,27 @@ class ComplaintViewSet(viewsets.ModelViewSet):
 
         return qs.none()
 
+    @action(detail=False, methods=['get'])
+    def downtime(self, request):
+        """Суммарный простой и число рекламаций по каждой машине (с учетом фильтров)."""
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .order_by()
+            .values('machine__serial_number')
+            .annotate(complaints=Count('id'), total_downtime=Sum('downtime'))
+            .order_by('-total_downtime', 'machine__serial_number')
+        )
+        return Response([
+            {
+                'machine': row['machine__serial_number'],
+                'complaints': row['complaints'],
+                'total_downtime': row['total_downtime'],
+            }
+            for row in rows
+        ])
+
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'bulk', 'update', 'partial_update']:
             permission_classes = [IsManager | IsService]
         elif self.action == 'destroy':
             permission_classes = [IsManager]
@@ -162,22 +331,199 @@ class ComplaintViewSet(viewsets.ModelViewSet):
 # -------------------------------------------------------------------------
 # 5. API для Справочников
 # -------------------------------------------------------------------------
-class ServiceTypeViewSet(viewsets.ReadOnlyModelViewSet):
+
+class HandbookBundleView(APIView):
+    """
+    Все справочники одним ответом (из реестра в памяти).
+    Поддерживает ETag / If-None-Match: неизменившиеся справочники отдаются как 304.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        etag = handbook_registry.etag()
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        # Слабое сравнение: CompressionMiddleware отдает сжатый ответ с W/"..."
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(handbook_registry.bundle(), headers=headers)
+
+
+class HandbookConditionalMixin(ConditionalGetMixin):
+    """Справочники одинаковы для всех ролей; их изменение сбрасывает общую версию."""
+    conditional_resource = 'handbooks'
+
+    def get_version_scope(self):
+        return 'all'
+
+
+class ServiceTypeViewSet(HandbookConditionalMixin, viewsets.ReadOnlyModelViewSet):
     """
     Справочник видов ТО (только чтение).
     """
-    queryset = ServiceType.objects.all()
+    queryset = ServiceType.objects.order_by('id')
     serializer_class = ServiceTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class FailureNodeViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = FailureNode.objects.all()
+class FailureNodeViewSet(HandbookConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = FailureNode.objects.order_by('id')
     serializer_class = FailureNodeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class RecoveryMethodViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = RecoveryMethod.objects.all()
+class RecoveryMethodViewSet(HandbookConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = RecoveryMethod.objects.order_by('id')
     serializer_class = RecoveryMethodSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+
+# -------------------------------------------------------------------------
+# 6. Аналитика
+# -------------------------------------------------------------------------
+
+class ReliabilityView(APIView):
+    """
+    Показатели надежности парка: число отказов, средний простой и наработка на отказ (MTBF)
+    в разрезе ?group_by=failure_node|technique_model|engine_model|service_company.
+    Считается по сводкам (main/analytics.py), видимость — как у ComplaintViewSet.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    group_models = {
+        'failure_node': FailureNode,
+        'technique_model': TechniqueModel,
+        'engine_model': EngineModel,
+    }
+
+    def get(self, request):
+        group_by = request.query_params.get('group_by', 'failure_node')
+        if group_by not in GROUPINGS:
+            return Response(
+                {"error": f"group_by: одно из {', '.join(GROUPINGS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = reliability_report(request.user, group_by)
+        if group_by == 'service_company':
+            names = dict(User.objects.filter(id__in=[row['id'] for row in rows]).values_list('id', 'username'))
+        else:
+            model = self.group_models[group_by]
+            names = {row['id']: handbook_registry.name_for(model, row['id']) for row in rows}
+        for row in rows:
+            row['name'] = names.get(row['id'])
+        return Response({'group_by': group_by, 'results': rows})
+
+
+
+class MaintenanceForecastViewSet(ScopedQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Прогноз следующего ТО по машинам и видам ТО (таблица main/forecast.py, видимость — как у машин).
+    - Сортировка ?ordering=: по умолчанию due_date — ближайшие и просроченные сверху.
+    - ?overdue=true — просроченные, ?due_within=<дней>, ?due_date_after=&due_date_before=,
+      ?service_type= / ?service_type__name=, ?machine__serial_number=.
+    """
+    serializer_class = MaintenanceForecastSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = MaintenanceForecastFilter
+    # Только NOT NULL поля: по ним работает keyset-курсор
+    ordering_fields = ['id', 'due_date', 'due_hours', 'hours_per_day', 'interval_hours', 'last_reading_date']
+
+    def get_scoped_queryset(self):
+        scope = scope_for(self.request.user)
+        if scope is None:
+            return MaintenanceForecast.objects.none()
+        return MaintenanceForecast.objects.filter(**scope).select_related('machine', 'service_type')
+
+# -------------------------------------------------------------------------
+# 7. Синхронизация
+# -------------------------------------------------------------------------
+
+class SyncView(APIView):
+    """
+    Лента изменений машин, ТО и рекламаций для синхронизации (main/sync.py).
+    GET ?cursor=<cursor из прошлого ответа>&limit=&resources=machine,maintenance,complaint
+
+    Без курсора лента начинается с начала журнала (первая синхронизация — все видимые объекты).
+    Записи: upsert с текущим состоянием объекта (поля как в списках API) или delete — объект удален
+    или больше не виден пользователю. Пока has_more — запрашивать следующую страницу с новым cursor.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 500
+    max_limit = 1000
+    fields = {
+        'machine': MachineViewSet.export_fields,
+        'maintenance': MaintenanceViewSet.export_fields,
+        'complaint': ComplaintViewSet.export_fields,
+    }
+
+    def get(self, request):
+        after = decode_cursor(request.query_params.get('cursor'))
+        try:
+            limit = min(int(request.query_params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({"error": "limit: целое число больше 0"}, status=status.HTTP_400_BAD_REQUEST)
+        resources = [name.strip() for name in request.query_params.get('resources', '').split(',') if name.strip()]
+        unknown = set(resources) - set(self.fields)
+        if unknown:
+            return Response(
+                {"error": f"resources: {', '.join(sorted(unknown))} — ожидается {', '.join(self.fields)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        entries, last_seq, has_more = read_changes(request.user, after, limit, resources or list(self.fields))
+        return Response({
+            'changes': attach_data(request.user, entries, self.fields),
+            'cursor': encode_cursor(last_seq),
+            'has_more': has_more,
+        })
+
+
+# -------------------------------------------------------------------------
+# 8. Служебное
+# -------------------------------------------------------------------------
+
+class DatabaseStatsView(APIView):
+    """
+    Настройки соединений с БД и метрики пула (только менеджер).
+    Значения относятся к воркеру, обработавшему запрос.
+    """
+    permission_classes = [IsManager]
+
+    def get(self, request):
+        return Response(connection_stats())
+
+
+class MetricsView(APIView):
+    """
+    Метрики в текстовом формате Prometheus: менеджеру или с внутренних адресов
+    (METRICS_ALLOWED_NETWORKS). Счетчики суммируются по всем воркерам (см. main/metrics.py),
+    показатели пула соединений — только воркера, обработавшего запрос.
+    """
+    permission_classes = [IsManager | IsInternalNetwork]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        snapshot, workers = worker_snapshots.collect()
+        guest = guest_search_cache.stats()
+        ratios = [((('cache', 'guest_search'),), guest['hit_ratio'])]
+        requests = {}
+        for (name, labels), value in snapshot['counters'].items():
+            if name == 'silant_cache_requests_total':
+                cache_name, result = dict(labels)['cache'], dict(labels)['result']
+                requests.setdefault(cache_name, {'hit': 0, 'miss': 0})[result] += value
+        for cache_name, counts in sorted(requests.items()):
+            total = counts['hit'] + counts['miss']
+            ratios.append(((('cache', cache_name),), counts['hit'] / total if total else 0.0))
+
+        gauges = [
+            ('silant_metrics_workers', 'Воркеры, чьи снимки вошли в ответ', [((), workers)]),
+            ('silant_cache_hit_ratio', 'Доля попаданий в кэш', ratios),
+            ('silant_guest_search_cache_requests', 'Обращения к кэшу гостевого поиска (общий счетчик)',
+             [((('result', 'hit'),), guest['hits']), ((('result', 'miss'),), guest['misses'])]),
+        ]
+        pool = connection_stats()['pool']
+        if pool:
+            gauges.append(('silant_db_pool', 'Статистика пула psycopg текущего воркера',
+                           [((('stat', key),), value) for key, value in sorted(pool.items())]))
+        return Response(render_prometheus(snapshot, gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
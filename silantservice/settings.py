@@ -59,6 +59,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым: время ответа включает остальные middleware
+    'main.metrics.MetricsMiddleware',
+    # brotli/gzip по Accept-Encoding — до middleware, которые читают или меняют тело ответа
+    'main.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -107,7 +111,103 @@ if os.environ.get('POSTGRES_DB'):
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('POSTGRES_HOST'),
         'PORT': os.environ.get('POSTGRES_PORT'),
+        # Постоянные соединения (сек., 0 — новое соединение на каждый запрос)
+        # и проверка соединения перед повторным использованием
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv('POSTGRES_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {},
     }
+    # Пул соединений psycopg (нужен psycopg[pool]); с постоянными соединениями несовместим.
+    # Метрики пула: /api/system/db/ (main/dbstats.py)
+    if os.getenv('POSTGRES_POOL', '0') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('POSTGRES_POOL_MAX_IDLE', 10 * 60)),
+            'max_lifetime': float(os.getenv('POSTGRES_POOL_MAX_LIFETIME', 60 * 60)),
+        }
+    # Подключение через pgbouncer в режиме transaction: без серверных курсоров
+    # и без подготовленных выражений (они живут в сессии, а сессия у pgbouncer общая)
+    if os.getenv('POSTGRES_PGBOUNCER', '0') == '1':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+# Общий кэш для всех воркеров gunicorn. Кэши, которые сбрасываются сигналами (версии ETag,
+# токены, гостевой поиск), без него не видят изменений из других процессов (воркеры,
+# import_machines, generate_fleet): такие кэши тогда выключены или живут недолго
+SHARED_CACHE = bool(os.environ.get('REDIS_URL'))
+if SHARED_CACHE:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL'),
+    }
+
+# Время жизни кэша гостевого поиска (сек.): найденная машина / "не найдено"
+GUEST_SEARCH_CACHE_TTL = int(os.getenv('GUEST_SEARCH_CACHE_TTL', 60 * 60 if SHARED_CACHE else 60))
+GUEST_SEARCH_MISS_TTL = int(os.getenv('GUEST_SEARCH_MISS_TTL', 60))
+
+# Максимальный возраст снимка справочников в памяти процесса (сек.), см. main/handbooks.py
+HANDBOOK_REGISTRY_TTL = int(os.getenv('HANDBOOK_REGISTRY_TTL', 60))
+
+# Авторизация: время жизни кэша токенов (сек., 0 — без кэша) и Basic-авторизация для /api/
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 5 * 60 if SHARED_CACHE else 0))
+API_BASIC_AUTH = os.getenv('API_BASIC_AUTH', '1') == '1'
+
+# Асинхронные представления для гостевого поиска и справочников (включать при запуске под ASGI)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', '0') == '1'
+
+# Версии данных для ETag / Last-Modified (main/conditional.py); без общего кэша условные GET
+# выключены — иначе после изменения в другом процессе сервер отвечал бы устаревшим 304
+CONDITIONAL_GET = os.getenv('CONDITIONAL_GET', '1' if SHARED_CACHE else '0') == '1'
+CONDITIONAL_VERSION_TTL = int(os.getenv('CONDITIONAL_VERSION_TTL', 60 * 60))
+
+# Кэш числа строк для ?pagination=nocount&count=estimate без фильтров (сек.), см. main/pagination.py
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 5 * 60))
+
+# Прогноз ТО (main/forecast.py): наработка в сутки для машин без своей оценки (если оценки нет
+# ни у одной машины или параметры парка еще не посчитаны rebuild_forecasts)
+FORECAST_DEFAULT_HOURS_PER_DAY = float(os.getenv('FORECAST_DEFAULT_HOURS_PER_DAY', 8))
+
+# Сжатие ответов (main/compression.py): минимальный размер тела (байт) и уровень brotli
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+
+# Схема OpenAPI (main/openapi.py): файл, который пишет generate_openapi_schema при деплое,
+# и max-age для swagger/schema.json (версионированный адрес кэшируется на год)
+OPENAPI_SCHEMA_PATH = os.getenv('OPENAPI_SCHEMA_PATH', os.path.join(BASE_DIR, 'openapi.json'))
+OPENAPI_SCHEMA_MAX_AGE = int(os.getenv('OPENAPI_SCHEMA_MAX_AGE', 5 * 60))
+
+# Метрики (main/metrics.py, /metrics): сбор, период сброса снимка воркера в кэш (сек.),
+# сети, которым /metrics доступен без входа, и порог медленного запроса к БД (мс)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 15))
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(',')
+    if network.strip()
+]
+SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 500))
+
+# Журнал медленных запросов (logger main.slow_queries) — в stderr рядом с логами сервера
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'main.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,14 +258,26 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        # Токен -> пользователь из кэша, Basic можно отключить для /api/ (см. main/authentication.py)
+        'main.authentication.CachedTokenAuthentication',
+        'main.authentication.ApiBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # JSON через orjson (см. main/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'main.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'main.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # page=N по умолчанию, ?pagination=cursor — keyset-режим (см. main/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'main.pagination.HybridPagination',
     'PAGE_SIZE': 2,
 }
\ No newline at end of file
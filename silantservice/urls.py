@@ -14,40 +14,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include, re_path
-from rest_framework import permissions
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken import views as token_views
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
 from main.views import (
     MachineViewSet,
     MaintenanceViewSet,
     ComplaintViewSet,
     GuestMachineSearchView,
+    HandbookBundleView,
+    ReliabilityView,
+    DatabaseStatsView,
+    MetricsView,
+    SyncView,
     ServiceTypeViewSet,
     FailureNodeViewSet,
     RecoveryMethodViewSet,
+    MaintenanceForecastViewSet,
 )
-
-
-# Настройка мета-данных Swagger
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Service Poguze API",
-      default_version='v1',
-      description="API для сервиса обслуживания погрузчиков",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snippets.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
-
+from main.openapi import openapi_schema, swagger_ui
 
 
 router = DefaultRouter()
@@ -57,12 +45,39 @@ router.register(r'complaints', ComplaintViewSet, basename='complaint')
 router.register(r'service_types', ServiceTypeViewSet, basename='service_type')
 router.register(r'failure_nodes', FailureNodeViewSet, basename='failure_node')
 router.register(r'recovery_methods', RecoveryMethodViewSet, basename='recovery_method')
+router.register(r'maintenance_forecasts', MaintenanceForecastViewSet, basename='maintenance_forecast')
+
+# Под ASGI частые чтения (гостевой поиск, справочники) обслуживаются асинхронными
+# представлениями (main/async_views.py); синхронные остаются запасным вариантом.
+if settings.ASYNC_READ_VIEWS:
+    from main.async_views import (
+        AsyncGuestMachineSearchView, AsyncServiceTypeView, AsyncFailureNodeView, AsyncRecoveryMethodView
+    )
+
+    async_urlpatterns = [
+        path('api/machines/search/', AsyncGuestMachineSearchView.as_view(), name='guest_search'),
+    ]
+    for prefix, view in (('service_types', AsyncServiceTypeView), ('failure_nodes', AsyncFailureNodeView),
+                         ('recovery_methods', AsyncRecoveryMethodView)):
+        async_urlpatterns += [
+            path(f'api/{prefix}/', view.as_view()),
+            path(f'api/{prefix}/<int:pk>/', view.as_view()),
+        ]
+else:
+    async_urlpatterns = []
+
 
-urlpatterns = [
+urlpatterns = async_urlpatterns + [
     path('admin/', admin.site.urls),
 
     # 2. Кастомный путь для Гостя
     path('api/machines/search/', GuestMachineSearchView.as_view(), name='guest_search'),
+    path('api/handbooks/', HandbookBundleView.as_view(), name='handbooks'),
+    path('api/analytics/reliability/', ReliabilityView.as_view(), name='reliability'),
+    path('api/sync/', SyncView.as_view(), name='sync'),
+    path('api/system/db/', DatabaseStatsView.as_view(), name='db_stats'),
+    # Для Prometheus; nginx фронтенда проксирует только /api/, /admin/ и /swagger/
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
     # 3. Основные маршруты API (автоматически сгенерированные роутером)
     path('api/', include(router.urls)),
@@ -73,5 +88,8 @@ urlpatterns = [
     # 5. Получение токена
     path('api/auth/token/', token_views.obtain_auth_token),
 
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    # 6. Документация: схема генерируется один раз (generate_openapi_schema при деплое)
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('swagger/schema.json', openapi_schema, name='openapi_schema'),
+    path('swagger/schema.<str:version>.json', openapi_schema, name='openapi_schema_version'),
 ]